@@ -0,0 +1,133 @@
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from products.models import Product
+
+
+def get_bag_products(bag):
+    """
+    Resolve every product in the bag with a single query
+        - returns dictionary of {item_id: product}
+        - raises Http404 if a product no longer exists
+          (same behaviour as get_object_or_404 per item)
+    """
+    if not bag:
+        return {}
+
+    # in_bulk = one 'WHERE id IN (...)' query for the whole bag
+    # returned dictionary is keyed by the integer primary key
+    products = Product.objects.in_bulk(list(bag.keys()))
+
+    bag_products = {}
+    for item_id in bag.keys():
+        product = products.get(int(item_id))
+        if product is None:
+            raise Http404(f'No Product matches the given query: {item_id}')
+        bag_products[item_id] = product
+
+    return bag_products
+
+
+class BagSummary:
+    """
+    Line items and totals for a session bag
+        - every value is worked out the first time it is read
+        - products are fetched with one query, shared by all values
+    """
+
+    def __init__(self, bag):
+        self.bag = bag
+
+    @cached_property
+    def products(self):
+        return get_bag_products(self.bag)
+
+    @cached_property
+    def bag_items(self):
+        bag_items = []
+
+        # for items/quantity in session 'bag'
+        for item_id, item_data in self.bag.items():
+            product = self.products[item_id]
+
+            # checking whether item_data = int
+            # if int = just quantity
+            # if not int = includes size (dictionary)
+            if isinstance(item_data, int):
+                bag_items.append({
+                    'item_id': item_id,
+                    'quantity': item_data,
+                    'product': product,
+                })
+            else:
+                # iterate through inner dict
+                # render sizes in template
+                for size, quantity in item_data['items_by_size'].items():
+                    bag_items.append({
+                        'item_id': item_id,
+                        'quantity': quantity,
+                        'product': product,
+                        'size': size,
+                    })
+
+        return bag_items
+
+    @cached_property
+    def total(self):
+        # add quantity to price for total
+        return sum(
+            (item['quantity'] * item['product'].price
+             for item in self.bag_items), 0)
+
+    @cached_property
+    def product_count(self):
+        return sum(item['quantity'] for item in self.bag_items)
+
+    @cached_property
+    def delivery(self):
+        if self.total < settings.FREE_DELIVERY_THRESHOLD:
+            return self.total * Decimal(
+                settings.STANDARD_DELIVERY_PERCENTAGE / 100)
+        return 0
+
+    @cached_property
+    def free_delivery_delta(self):
+        if self.total < settings.FREE_DELIVERY_THRESHOLD:
+            return settings.FREE_DELIVERY_THRESHOLD - self.total
+        return 0
+
+    @cached_property
+    def grand_total(self):
+        return self.delivery + self.total
+
+    # 'subtotal' reads better outside templates
+    @property
+    def subtotal(self):
+        return self.total
+
+
+def _bag_fingerprint(bag):
+    # views change the bag during a request (add, adjust, remove)
+    # so a cached summary is only reused for an identical bag
+    return json.dumps(bag, sort_keys=True)
+
+
+def get_bag_summary(request):
+    """
+    Return the bag summary for this request
+        - calculated once and attached to the request
+        - recalculated only if the session bag has changed
+    """
+    bag = request.session.get('bag', {})
+    fingerprint = _bag_fingerprint(bag)
+
+    summary = getattr(request, '_bag_summary', None)
+    if summary is None or summary[0] != fingerprint:
+        summary = (fingerprint, BagSummary(bag))
+        request._bag_summary = summary
+
+    return summary[1]
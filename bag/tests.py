@@ -1,3 +1,122 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import Product, Category
+from .contexts import bag_contents
+from .summary import get_bag_summary
+
+
+class BagContentsQueryTest(TestCase):
+    """
+    The bag context processor runs on every page,
+    so its query count must not grow with the bag
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='jeans', friendly_name='Jeans')
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                sku=f'sku{i}',
+                name=f'Product {i}',
+                description='A product',
+                price='10.00',
+                has_sizes=bool(i % 2),
+            )
+            for i in range(30)
+        ]
+
+    def _set_bag(self, products):
+        bag = {}
+        for product in products:
+            if product.has_sizes:
+                bag[str(product.id)] = {'items_by_size': {'s': 1, 'm': 2}}
+            else:
+                bag[str(product.id)] = 1
+        session = self.client.session
+        session['bag'] = bag
+        session.save()
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_view_bag_queries_are_constant(self):
+        self._set_bag(self.products[:1])
+        small_bag = self._count_queries(reverse('view_bag'))
+
+        self._set_bag(self.products)
+        large_bag = self._count_queries(reverse('view_bag'))
+
+        self.assertEqual(small_bag, large_bag)
+
+    def test_home_page_queries_are_constant(self):
+        self._set_bag(self.products[:1])
+        small_bag = self._count_queries(reverse('home'))
+
+        self._set_bag(self.products)
+        large_bag = self._count_queries(reverse('home'))
+
+        self.assertEqual(small_bag, large_bag)
+
+    def test_bag_totals(self):
+        self._set_bag(self.products[:2])
+        response = self.client.get(reverse('view_bag'))
+
+        # one unsized item + sized item with 3 units at $10
+        self.assertEqual(response.context['product_count'](), 4)
+        self.assertEqual(response.context['total'](), 40)
+
+    def test_missing_product_is_404(self):
+        session = self.client.session
+        session['bag'] = {'9999': 1}
+        session.save()
+        response = self.client.get(reverse('view_bag'))
+        self.assertEqual(response.status_code, 404)
+
+
+class BagSummaryTest(TestCase):
+    """
+    The bag summary is worked out once per request
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            sku='sku1', name='Product', description='A product',
+            price='60.00')
+
+    def _request(self, bag):
+        request = RequestFactory().get('/')
+        request.session = {'bag': bag}
+        return request
+
+    def test_summary_is_memoized_on_request(self):
+        request = self._request({str(self.product.id): 1})
+        summary = get_bag_summary(request)
+        with self.assertNumQueries(1):
+            summary.grand_total
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_bag_summary(request), summary)
+            bag_contents(request)['grand_total']()
+
+        # over the free delivery threshold
+        self.assertEqual(summary.subtotal, Decimal('60.00'))
+        self.assertEqual(summary.delivery, 0)
+        self.assertEqual(summary.free_delivery_delta, 0)
+
+    def test_summary_follows_bag_changes(self):
+        request = self._request({str(self.product.id): 1})
+        summary = get_bag_summary(request)
+        self.assertEqual(summary.product_count, 1)
+
+        request.session['bag'] = {str(self.product.id): 2}
+        self.assertEqual(get_bag_summary(request).product_count, 2)
@@ -0,0 +1,234 @@
+import json
+import random
+import re
+import threading
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from benchmarks.synthetic import NOUNS, SKU_PREFIX, generate_catalogue
+from benchmarks.utils import (
+    payment_intent_succeeded_event, sign_webhook_payload, summarize,
+)
+from checkout.models import Order
+from products.models import Category, Product
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+# funnel steps, in the order a shopper hits them
+STEPS = (
+    'products_sort', 'products_category', 'products_search',
+    'product_detail', 'add_to_bag', 'adjust_bag', 'view_bag',
+    'checkout', 'checkout_post', 'checkout_success', 'webhook',
+)
+
+CLIENT_SECRET_RE = re.compile(
+    r'name="client_secret" value="([^"]+)"|'
+    r'value="([^"]+)" name="client_secret"')
+
+ORDER_FORM = {
+    'full_name': 'Benchmark Customer',
+    'email': 'customer@example.com',
+    'phone_number': '0123456789',
+    'country': 'IE',
+    'postcode': 'D01',
+    'town_or_city': 'Dublin',
+    'street_address1': '1 Main Street',
+    'street_address2': '',
+    'county': 'Dublin',
+}
+
+
+def build_catalogue(products=500, categories=10, seed=0):
+    """
+    Synthetic catalogue (benchmarks.synthetic), and what the
+    sessions need of it: each product's (id, has_sizes)
+    and the category names
+    """
+    generate_catalogue(seed, categories, products)
+    return {
+        'products': list(Product.objects.filter(
+            sku__startswith=SKU_PREFIX).values_list('id', 'has_sizes')),
+        'categories': list(Category.objects.filter(
+            name__startswith=f'{SKU_PREFIX}_category_').values_list(
+            'name', flat=True)),
+    }
+
+
+class FunnelRecorder:
+    """
+    Latency, query count and status of every request,
+    by funnel step, shared by the worker threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {step: [] for step in STEPS}
+        self.errors = []
+
+    def record(self, step, latency, queries, status):
+        with self.lock:
+            self.samples[step].append((latency, queries, status))
+
+    def fail(self, message):
+        with self.lock:
+            self.errors.append(message)
+
+    def report(self, elapsed, sessions, concurrency):
+        """
+        Summary by step, in the format saved as a baseline
+        """
+        steps = {}
+        requests = 0
+        for step in STEPS:
+            samples = self.samples[step]
+            if not samples:
+                continue
+            requests += len(samples)
+            queries = [q for _, q, _ in samples]
+            statuses = {}
+            for _, _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            steps[step] = summarize([latency for latency, _, _ in samples])
+            steps[step].update({
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+                'statuses': statuses,
+            })
+        return {
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'elapsed_s': round(elapsed, 3),
+            'sessions_per_s': round(sessions / elapsed, 2) if elapsed else 0,
+            'requests_per_s': round(requests / elapsed, 2) if elapsed else 0,
+            'errors': self.errors[:20],
+            'error_count': len(self.errors),
+            'steps': steps,
+        }
+
+
+class FunnelSession:
+    """
+    One shopper walking the funnel with their own test client:
+    browse, view a product, fill and adjust the bag, check out,
+    then Stripe's webhook confirms the payment
+    """
+
+    def __init__(self, catalogue, recorder, rng, bag_lines=3):
+        self.client = Client()
+        self.catalogue = catalogue
+        self.recorder = recorder
+        self.rng = rng
+        self.bag_lines = bag_lines
+
+    def request(self, step, method, url, expect=(200, 302), **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, **kwargs)
+            latency = time.perf_counter() - start
+        if self.recorder:
+            self.recorder.record(
+                step, latency, len(queries), response.status_code)
+        if response.status_code not in expect:
+            raise AssertionError(
+                f'{step}: {method.upper()} {url} '
+                f'returned {response.status_code}')
+        return response
+
+    def run(self):
+        rng = self.rng
+        products_url = reverse('products')
+        self.request('products_sort', 'get', products_url, data={
+            'sort': rng.choice(('price', 'rating', 'name', 'category')),
+            'direction': rng.choice(('asc', 'desc')),
+        })
+        self.request('products_category', 'get', products_url, data={
+            'category': rng.choice(self.catalogue['categories'])})
+        self.request('products_search', 'get', products_url, data={
+            'q': rng.choice(NOUNS)})
+
+        picks = rng.sample(self.catalogue['products'], self.bag_lines)
+        added = []
+        for product_id, has_sizes in picks:
+            detail_url = reverse('product_detail', args=[product_id])
+            self.request('product_detail', 'get', detail_url)
+            data = {'quantity': rng.randint(1, 3), 'redirect_url': detail_url}
+            if has_sizes:
+                data['product_size'] = rng.choice(('s', 'm', 'l'))
+            self.request('add_to_bag', 'post',
+                         reverse('add_to_bag', args=[product_id]), data=data)
+            added.append((product_id, data.get('product_size')))
+
+        product_id, size = added[0]
+        data = {'quantity': 1}
+        if size:
+            data['product_size'] = size
+        self.request('adjust_bag', 'post',
+                     reverse('adjust_bag', args=[product_id]), data=data)
+        self.request('view_bag', 'get', reverse('view_bag'))
+
+        response = self.request('checkout', 'get', reverse('checkout'),
+                                expect=(200,))
+        match = CLIENT_SECRET_RE.search(response.content.decode())
+        client_secret = match.group(1) or match.group(2)
+        bag = self.client.session['bag']
+
+        response = self.request(
+            'checkout_post', 'post', reverse('checkout'), expect=(302,),
+            data=dict(ORDER_FORM, client_secret=client_secret))
+        self.request('checkout_success', 'get', response.url, expect=(200,))
+
+        # Stripe confirms the payment: a locally signed webhook
+        pid = client_secret.split('_secret')[0]
+        order = Order.objects.get(stripe_pid=pid)
+        payload = json.dumps(payment_intent_succeeded_event(
+            pid, bag, int(round(order.grand_total * 100))))
+        self.request(
+            'webhook', 'post', reverse('webhook'), expect=(200,),
+            data=payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign_webhook_payload(
+                payload, WEBHOOK_SECRET))
+
+
+def run_session(catalogue, recorder, seed, bag_lines=3):
+    try:
+        FunnelSession(catalogue, recorder, random.Random(seed),
+                      bag_lines).run()
+    except Exception as e:
+        if recorder:
+            recorder.fail(f'session {seed}: {e}')
+        else:
+            raise
+    finally:
+        # worker threads open their own connections
+        connection.close()
+
+
+def compare_reports(baseline, current, threshold=None):
+    """
+    Step by step changes against a saved baseline
+    Returns (lines, regressions): a p95 more than threshold
+    percent slower, or more queries than before, is a regression
+    """
+    lines = []
+    regressions = []
+    for step, now in current['steps'].items():
+        before = baseline.get('steps', {}).get(step)
+        if before is None:
+            lines.append(f'{step:18} new step')
+            continue
+        change = ((now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+                  if before['p95_ms'] else 0)
+        query_change = now['queries_max'] - before['queries_max']
+        lines.append(
+            f'{step:18} p95 {before["p95_ms"]:>8.2f} -> {now["p95_ms"]:>8.2f} '
+            f'ms ({change:+.1f}%)  queries {before["queries_max"]} -> '
+            f'{now["queries_max"]}')
+        if threshold is not None and change > threshold:
+            regressions.append(f'{step}: p95 {change:+.1f}%')
+        if query_change > 0:
+            regressions.append(f'{step}: {query_change} more queries')
+    return lines, regressions
@@ -0,0 +1,96 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from benchmarks.funnel import (
+    WEBHOOK_SECRET, FunnelRecorder, build_catalogue, compare_reports,
+    run_session,
+)
+from benchmarks.utils import benchmark_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the whole shopping funnel (listing, product page, bag, '
+        'checkout, success page and webhook) through the real URLs with '
+        'concurrent shoppers, and report throughput, latency percentiles '
+        'and query counts per step. Stripe is faked and the run uses a '
+        'throwaway database with a synthetic catalogue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100,
+                            help='Shoppers that go through the funnel')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--bag-lines', type=int, default=3)
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Sessions run first and not measured')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help='Write the report to a JSON file')
+        parser.add_argument('--baseline', metavar='PATH',
+                            help='Compare against a saved report')
+        parser.add_argument(
+            '--max-regression', type=float, metavar='PERCENT',
+            help='With --baseline, fail if any step\'s p95 is this much '
+                 'slower, or any step makes more queries')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        with benchmark_database(), override_settings(
+                STRIPE_BACKEND='checkout.stripe_fake.FakeStripeBackend',
+                STRIPE_PUBLIC_KEY='pk_test_benchmark',
+                STRIPE_WH_SECRET=WEBHOOK_SECRET,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            report = self._run(options)
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Baseline saved to {options["save_baseline"]}')
+
+        if baseline is not None:
+            lines, regressions = compare_reports(
+                baseline, report, options['max_regression'])
+            self.stdout.write('\n'.join(lines))
+            if regressions and options['max_regression'] is not None:
+                raise CommandError(
+                    'Regressions against the baseline: '
+                    + '; '.join(regressions))
+
+    def _run(self, options):
+        catalogue = build_catalogue(
+            options['products'], options['categories'], options['seed'])
+        bag_lines = min(options['bag_lines'], len(catalogue['products']))
+        # worker threads open their own connections
+        connection.close()
+
+        # warm the caches, unmeasured (errors here are real failures)
+        for i in range(options['warmup']):
+            run_session(catalogue, None, -1 - i, bag_lines)
+
+        recorder = FunnelRecorder()
+        seeds = range(options['seed'], options['seed'] + options['sessions'])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(
+                lambda seed: run_session(catalogue, recorder, seed, bag_lines),
+                seeds))
+        elapsed = time.perf_counter() - start
+
+        if recorder.errors and not any(recorder.samples.values()):
+            raise CommandError(recorder.errors[0])
+        return recorder.report(
+            elapsed, options['sessions'], options['concurrency'])
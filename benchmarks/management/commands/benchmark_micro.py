@@ -0,0 +1,85 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.micro.runner import (
+    DEFAULT_REPEAT, REGISTRY, compare_results, current_commit,
+    load_results, results_document, run_benchmarks, save_results,
+)
+from benchmarks.utils import benchmark_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the hot functions (bag contents, order totals, line item '
+        'saves, product listing queries, webhook handler) and count '
+        'their queries. Runs in a throwaway database. Results can be '
+        'saved per commit and compared against an earlier commit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help='Only run benchmarks whose names contain one of these')
+        parser.add_argument('--list', action='store_true',
+                            help='List the benchmarks and exit')
+        parser.add_argument('--number', type=int,
+                            help='Calls per round (default: enough for '
+                                 'a 0.2s round)')
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Save results as <commit>.json in BENCHMARK_RESULTS_DIR')
+        parser.add_argument(
+            '--baseline', metavar='COMMIT_OR_PATH',
+            help='Compare against saved results, fail on regressions')
+        parser.add_argument(
+            '--threshold', type=float, default=20, metavar='PERCENT',
+            help='Slowdown that counts as a regression (default 20%%)')
+
+    def handle(self, *args, **options):
+        directory = settings.BENCHMARK_RESULTS_DIR
+        if options['list']:
+            from benchmarks.micro import cases  # noqa: F401
+            self.stdout.write('\n'.join(sorted(REGISTRY)))
+            return
+
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = load_results(options['baseline'], directory)
+            except FileNotFoundError:
+                raise CommandError(
+                    f'No saved results for {options["baseline"]}')
+
+        def progress(name, result):
+            self.stdout.write(
+                f'{name:60} {result["min_ms"]:>10.4f} ms  '
+                f'{result["queries"]:>3} queries  '
+                f'({result["repeat"]} x {result["number"]} calls)')
+
+        with benchmark_database():
+            results = run_benchmarks(
+                options['names'], options['number'], options['repeat'],
+                progress)
+            document = results_document(results, current_commit())
+
+        if not results:
+            raise CommandError('No benchmarks matched')
+
+        if options['save']:
+            path = save_results(document, directory)
+            self.stdout.write(f'Saved {path}')
+        elif not baseline:
+            self.stdout.write(json.dumps(document, indent=2))
+
+        if baseline:
+            lines, regressions = compare_results(
+                baseline, document, options['threshold'])
+            self.stdout.write(f'\nAgainst {baseline["commit"]}:')
+            self.stdout.write('\n'.join(lines))
+            if regressions:
+                raise CommandError(
+                    'Regressions: ' + '; '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions'))
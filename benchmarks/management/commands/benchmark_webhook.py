@@ -0,0 +1,108 @@
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from benchmarks.utils import (
+    benchmark_database, payment_intent_succeeded_event,
+    sign_webhook_payload, summarize,
+)
+from checkout.models import Order
+from checkout.order_builder import create_order_lineitems
+from products.models import Product
+
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Send signed payment_intent.succeeded webhooks concurrently '
+        'and report latency percentiles. Runs in a throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--existing-ratio', type=float, default=0.5,
+            help='Share of deliveries whose order the checkout '
+                 'view has already created')
+        parser.add_argument('--bag-lines', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with benchmark_database(), override_settings(
+                STRIPE_WH_SECRET=WEBHOOK_SECRET,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            deliveries = self._prepare(options)
+            latencies, statuses, elapsed = self._deliver(
+                deliveries, options['concurrency'])
+
+        summary = summarize(latencies, elapsed)
+        summary['concurrency'] = options['concurrency']
+        summary['statuses'] = statuses
+        self.stdout.write(json.dumps(summary, indent=2))
+
+    def _prepare(self, options):
+        """
+        Build signed payloads, creating the order up front
+        for the 'checkout view won the race' share
+        """
+        products = [
+            Product.objects.create(
+                sku=f'bench{i}', name=f'Benchmark product {i}',
+                description='Benchmark product', price=Decimal('12.50'))
+            for i in range(options['bag_lines'])
+        ]
+        bag = {str(product.id): 1 for product in products}
+        amount = int(sum(p.price for p in products) * 100)
+
+        existing = int(options['deliveries'] * options['existing_ratio'])
+        deliveries = []
+        for i in range(options['deliveries']):
+            pid = f'pi_{uuid.uuid4().hex}'
+            if i < existing:
+                order = Order.objects.create(
+                    full_name='Benchmark Customer',
+                    email='customer@example.com', phone_number='0123456789',
+                    country='IE', town_or_city='Dublin',
+                    street_address1='1 Main Street',
+                    original_bag=json.dumps(bag), stripe_pid=pid)
+                create_order_lineitems(order, bag)
+            payload = json.dumps(
+                payment_intent_succeeded_event(pid, bag, amount))
+            deliveries.append(
+                (payload, sign_webhook_payload(payload, WEBHOOK_SECRET)))
+
+        # worker threads open their own connections
+        connection.close()
+        return deliveries
+
+    def _deliver(self, deliveries, concurrency):
+        url = reverse('webhook')
+
+        def deliver(delivery):
+            payload, signature = delivery
+            client = Client()
+            start = time.perf_counter()
+            response = client.post(
+                url, data=payload, content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=signature)
+            latency = time.perf_counter() - start
+            connection.close()
+            return latency, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(deliver, deliveries))
+        elapsed = time.perf_counter() - start
+
+        statuses = {}
+        for _, status in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return [latency for latency, _ in results], statuses, elapsed
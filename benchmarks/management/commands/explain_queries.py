@@ -0,0 +1,76 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from checkout.models import Order, OrderLineItem
+from products.models import Product, Category
+
+# full table scans as they appear in each database's plan output
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+def hot_queries():
+    """
+    The catalogue and order queries our busiest views run,
+    with placeholder values for their parameters
+    """
+    return {
+        'products: filter by category':
+            Product.objects.filter(category__name__in=['jeans']),
+        'products: current categories':
+            Category.objects.filter(name__in=['jeans']),
+        'products: product detail':
+            Product.objects.filter(pk=1),
+        'products: admin ordering by sku':
+            Product.objects.order_by('sku'),
+        'checkout: checkout_success / order_history':
+            Order.objects.filter(order_number='0' * 32),
+        'checkout: webhook order lookup':
+            Order.objects.filter(stripe_pid='pi_explain'),
+        'profiles: order history':
+            Order.objects.filter(user_profile_id=1).order_by('-date'),
+        'checkout: order line items':
+            OrderLineItem.objects.filter(order_id=1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN over the hot catalogue and order queries '
+        'and report any that do a full table scan.'
+    )
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'No plan checks for the {connection.vendor} database')
+
+        full_scans = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # small tables are cheaper to scan, so postgres would
+                # pick a seq scan regardless of indexes - turn seq scans
+                # off to check an index is available at all
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries().items():
+                plan = queryset.explain()
+                tables = pattern.findall(plan)
+                if tables:
+                    full_scans.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'FULL SCAN  {name} ({", ".join(tables)})'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'ok         {name}'))
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan)
+
+        if full_scans:
+            raise CommandError(
+                f'{len(full_scans)} hot queries do a full table scan')
@@ -0,0 +1,163 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils.dateparse import parse_date
+
+from benchmarks.synthetic import (
+    SKU_PREFIX, OrderGenerator, build_chunk, date_range,
+    delete_synthetic_data, generate_catalogue, generate_users, init_worker,
+)
+from checkout.models import Order, OrderLineItem
+from products.models import Product
+from profiles.models import UserProfile
+from reports.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large, deterministic dataset for scale testing: '
+        'categories, products, users with profiles, and orders with '
+        'line items, bulk inserted by parallel worker processes. '
+        'Meant for a development database, never production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread orders over this many days')
+        parser.add_argument('--until', type=parse_date,
+                            help='Last order date, YYYY-MM-DD (default '
+                                 'today); fix it for repeatable dates')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Worker processes for the orders, 0 to insert them '
+                 'in this process (always 0 on SQLite)')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Orders per worker task')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT for products and users')
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help="Don't rebuild the sales rollups at the end")
+
+    def handle(self, *args, **options):
+        if Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+            raise CommandError(
+                'Synthetic data is already in this database. '
+                'Generate into an empty or freshly migrated database.')
+
+        # orders get explicit ids from here on
+        first_pk = (Order.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        start = time.perf_counter()
+        try:
+            self.stdout.write('Catalogue and users...')
+            generate_catalogue(options['seed'], options['categories'],
+                               options['products'], options['batch_size'])
+            generate_users(options['seed'], options['users'],
+                           options['batch_size'])
+            orders, lines = self._generate_orders(options, first_pk)
+        except Exception as e:
+            # leave the database as it was, so the run can be repeated
+            self.stderr.write('Generation failed, removing partial data...')
+            delete_synthetic_data(first_pk)
+            raise CommandError(f'Generation failed: {e!r}') from e
+
+        if not options['skip_rollups'] and orders:
+            self.stdout.write('Rebuilding sales rollups...')
+            rebuild_rollups()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["products"]} products, {options["users"]} '
+            f'users, {orders} orders and {lines} line items in '
+            f'{time.perf_counter() - start:.1f}s'))
+
+    def _generate_orders(self, options, first_pk):
+        total = options['orders']
+        if not total:
+            return 0, 0
+
+        products = list(Product.objects.filter(
+            sku__startswith=SKU_PREFIX).order_by('id').values_list(
+            'id', 'name', 'price', 'has_sizes'))
+        profiles = [
+            (pk, {
+                'full_name': full_name, 'email': email,
+                'phone_number': phone, 'country': country,
+                'town_or_city': town, 'postcode': postcode,
+                'street_address1': street, 'street_address2': '',
+                'county': '',
+            })
+            for pk, full_name, email, phone, country, town, postcode, street
+            in UserProfile.objects.filter(
+                default_full_name__isnull=False).order_by('id').values_list(
+                'id', 'default_full_name', 'user__email',
+                'default_phone_number', 'default_country',
+                'default_town_or_city', 'default_postcode',
+                'default_street_address1')
+        ]
+        period_start, period_end = date_range(options['days'], options['until'])
+        generator = OrderGenerator(
+            options['seed'], products, profiles, period_start, period_end,
+            first_pk, total)
+
+        chunk_size = options['chunk_size']
+        chunks = [
+            (n, first_pk + offset, min(chunk_size, total - offset))
+            for n, offset in enumerate(range(0, total, chunk_size))
+        ]
+
+        workers = options['workers']
+        if workers > 0 and connection.vendor == 'sqlite':
+            # one writer at a time: parallel workers only
+            # fail with 'database is locked'
+            self.stdout.write('SQLite: inserting orders in this process')
+            workers = 0
+
+        start = time.perf_counter()
+        orders = lines = 0
+        if workers <= 0:
+            for chunk in chunks:
+                done = build_chunk(*chunk, generator=generator)
+                orders, lines = orders + done[0], lines + done[1]
+                self._progress(orders, lines, total, start)
+        else:
+            # forked workers must not share the parent's db connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker,
+                                     initargs=(generator,)) as executor:
+                futures = [executor.submit(build_chunk, *chunk)
+                           for chunk in chunks]
+                try:
+                    for future in futures:
+                        done = future.result()
+                        orders, lines = orders + done[0], lines + done[1]
+                        self._progress(orders, lines, total, start)
+                except Exception:
+                    # don't start the remaining chunks
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        # explicit ids leave Postgres sequences behind
+        sequence_sql = connection.ops.sequence_reset_sql(
+            no_style(), [Order, OrderLineItem])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+        return orders, lines
+
+    def _progress(self, orders, lines, total, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'  {orders}/{total} orders, {lines} line items '
+            f'({lines / elapsed if elapsed else 0:.0f} lines/s)')
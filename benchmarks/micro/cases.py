@@ -0,0 +1,155 @@
+import itertools
+import json
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import QueryDict
+from django.test import RequestFactory
+
+import stripe
+
+from bag.contexts import bag_contents
+from benchmarks.synthetic import SKU_PREFIX, category_name, generate_catalogue
+from benchmarks.utils import payment_intent_succeeded_event
+from checkout.models import Order, OrderLineItem
+from checkout.order_builder import create_order_lineitems
+from checkout.webhook_handler import StripeWH_Handler
+from products.models import Product
+from products.pagination import KeysetPaginator
+from products.views import product_listing
+from .runner import benchmark
+
+# catalogue seed, fixed so every run times the same products
+SEED = 1
+CATEGORIES = tuple(category_name(i) for i in range(4))
+
+
+def make_products(count):
+    """
+    count synthetic products (benchmarks.synthetic) over CATEGORIES
+    """
+    generate_catalogue(SEED, len(CATEGORIES), count, images=False)
+    return list(Product.objects.filter(
+        sku__startswith=SKU_PREFIX).order_by('pk'))
+
+
+def make_bag(products):
+    return {
+        str(product.id): {'items_by_size': {'m': 1, 'l': 2}}
+        if product.has_sizes else 2
+        for product in products
+    }
+
+
+def make_order(bag, **fields):
+    order = Order.objects.create(
+        full_name='Micro Customer', email='customer@example.com',
+        phone_number='0123456789', country='IE', town_or_city='Dublin',
+        street_address1='1 Main Street', original_bag=json.dumps(bag),
+        **fields)
+    create_order_lineitems(order, bag)
+    return order
+
+
+@benchmark('bag_contents[1 line]', lines=1)
+@benchmark('bag_contents[10 lines]', lines=10)
+@benchmark('bag_contents[100 lines]', lines=100)
+def bag_contents_values(lines):
+    """
+    The bag context processor, with every lazy value read
+    as a template would, for a new request each call
+    """
+    bag = make_bag(make_products(lines))
+    factory = RequestFactory()
+
+    def run():
+        request = factory.get('/')
+        request.session = {'bag': bag}
+        return {key: value() if callable(value) else value
+                for key, value in bag_contents(request).items()}
+    return run
+
+
+@benchmark('Order.update_total[5 lines]')
+def order_update_total():
+    order = make_order(make_bag(make_products(5)))
+    return order.update_total
+
+
+@benchmark('OrderLineItem.save')
+def lineitem_save():
+    """
+    A line item added to a 5 line order, through save()
+    and its update_total signal
+    """
+    products = make_products(5)
+    order = make_order(make_bag(products))
+
+    def run():
+        OrderLineItem(order=order, product=products[1], quantity=1).save()
+    return run
+
+
+def product_listing_page(params):
+    """
+    products.views.product_listing for one combination of GET
+    parameters, plus the first page query it leads to
+    """
+    make_products(200)
+    query = QueryDict(urlencode(params))
+
+    def run():
+        products, ordering, *_ = product_listing(query)
+        return list(KeysetPaginator(
+            products, ordering, settings.PRODUCTS_PER_PAGE).page())
+    return run
+
+
+SORTS = [{}] + [{'sort': sort, 'direction': direction}
+                for sort in ('price', 'rating', 'name', 'category')
+                for direction in ('asc', 'desc')]
+CATEGORY_FILTERS = [{}, {'category': CATEGORIES[0]},
+                    {'category': ','.join(CATEGORIES[:2])}]
+SEARCHES = [{}, {'q': 'shirt'}]
+
+for sort, category, search in itertools.product(
+        SORTS, CATEGORY_FILTERS, SEARCHES):
+    params = dict(sort, **category, **search)
+    label = ' '.join(f'{key}={value}' for key, value in params.items())
+    benchmark(f'product_listing[{label or "all"}]',
+              params=params)(product_listing_page)
+
+
+def _webhook_event(pid, bag, order_total):
+    return stripe.Event.construct_from(
+        payment_intent_succeeded_event(pid, bag, int(order_total * 100)),
+        'sk_test_micro')
+
+
+@benchmark('webhook_handler[order exists]')
+def webhook_existing_order():
+    """
+    payment_intent.succeeded for an order checkout already saved
+    """
+    bag = make_bag(make_products(3))
+    order = make_order(bag, stripe_pid='pi_micro_existing')
+    event = _webhook_event(order.stripe_pid, bag, order.grand_total)
+    handler = StripeWH_Handler(RequestFactory().post('/checkout/wh/'))
+    return lambda: handler.handle_payment_intent_succeeded(event)
+
+
+@benchmark('webhook_handler[new order]')
+def webhook_new_order():
+    """
+    payment_intent.succeeded that has to create the order,
+    a new payment intent each call
+    """
+    bag = make_bag(make_products(3))
+    handler = StripeWH_Handler(RequestFactory().post('/checkout/wh/'))
+    counter = itertools.count()
+
+    def run():
+        event = _webhook_event(f'pi_micro_{next(counter)}', bag, Decimal('10'))
+        return handler.handle_payment_intent_succeeded(event)
+    return run
@@ -0,0 +1,175 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+# name -> setup function, filled by @benchmark
+REGISTRY = {}
+
+# rounds timed per benchmark, and the shortest round when
+# the number of calls per round is worked out automatically
+DEFAULT_REPEAT = 5
+MIN_ROUND_SECONDS = 0.2
+MAX_NUMBER = 10000
+
+
+def benchmark(name, **params):
+    """
+    Register a benchmark: the decorated function does the setup
+    and returns the callable to time (called with params)
+    """
+    def register(setup):
+        if name in REGISTRY:
+            raise ValueError(f'Benchmark {name} is already registered')
+        REGISTRY[name] = lambda: setup(**params)
+        return setup
+    return register
+
+
+def _calibrate(func):
+    """
+    Calls per round so a round lasts MIN_ROUND_SECONDS,
+    in the 1, 2, 5, 10, 20, 50... steps timeit uses
+    """
+    number = 1
+    while number < MAX_NUMBER:
+        for factor in (1, 2, 5):
+            calls = number * factor
+            start = time.perf_counter()
+            for _ in range(calls):
+                func()
+            if time.perf_counter() - start >= MIN_ROUND_SECONDS:
+                return calls
+        number *= 10
+    return MAX_NUMBER
+
+
+def run_benchmark(name, number=None, repeat=DEFAULT_REPEAT):
+    """
+    Time one benchmark
+        - setup and every call run in a transaction that is rolled
+          back, so benchmarks don't see each other's rows
+        - one call is made first, to warm caches, and its queries
+          are counted on a second call
+        - min is the number to compare: noise only ever adds time
+    """
+    with transaction.atomic():
+        func = REGISTRY[name]()
+        func()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        number = number or _calibrate(func)
+
+        rounds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter() - start) / number)
+        transaction.set_rollback(True)
+
+    return {
+        'min_ms': round(min(rounds) * 1000, 4),
+        'median_ms': round(statistics.median(rounds) * 1000, 4),
+        'queries': len(queries),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(names=None, number=None, repeat=DEFAULT_REPEAT,
+                   progress=None):
+    # importing the cases registers them
+    from benchmarks.micro import cases  # noqa: F401
+
+    results = {}
+    for name in sorted(REGISTRY):
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = run_benchmark(name, number, repeat)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def current_commit():
+    """
+    Short hash of HEAD, '-dirty' if there are uncommitted changes
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def results_document(results, commit):
+    return {
+        'commit': commit,
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'benchmarks': results,
+    }
+
+
+def save_results(document, directory):
+    """
+    Write results to <directory>/<commit>.json, the file
+    later runs compare against
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{document["commit"]}.json')
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(baseline, directory):
+    """
+    Saved results by file path or by commit
+    """
+    path = baseline if os.path.exists(baseline) \
+        else os.path.join(directory, f'{baseline}.json')
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold):
+    """
+    (lines, regressions) of current results against a baseline
+    A regression is a min time more than threshold percent slower,
+    or any extra query
+    """
+    lines = []
+    regressions = []
+    for name, now in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            lines.append(f'{name:60} new')
+            continue
+        change = ((now['min_ms'] - before['min_ms']) / before['min_ms'] * 100
+                  if before['min_ms'] else 0)
+        lines.append(
+            f'{name:60} {before["min_ms"]:>10.4f} -> {now["min_ms"]:>10.4f} '
+            f'ms ({change:+6.1f}%)  queries {before["queries"]} -> '
+            f'{now["queries"]}')
+        if change > threshold:
+            regressions.append(f'{name}: {change:+.1f}% slower')
+        if now['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: {now["queries"] - before["queries"]} more queries')
+    return lines, regressions
@@ -0,0 +1,392 @@
+import datetime
+import json
+import os
+import random
+from decimal import Decimal
+from itertools import accumulate
+
+# Model imports are inside the functions: worker processes import
+# this module before django.setup() where they're spawned
+
+SKU_PREFIX = 'syn'
+USERNAME_PREFIX = 'synthetic'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# realistic-looking distributions, (value, weight)
+SIZES = (('xs', 5), ('s', 20), ('m', 35), ('l', 28), ('xl', 12))
+LINES_PER_ORDER = ((1, 40), (2, 25), (3, 14), (4, 8), (5, 5),
+                   (6, 3), (7, 2), (8, 2), (10, 1))
+QUANTITIES = ((1, 75), (2, 17), (3, 6), (4, 2))
+# share of orders placed by a logged in customer
+PROFILE_ORDER_SHARE = 0.6
+# product popularity falls off as 1 / rank ** ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.1
+
+ADJECTIVES = ('classic', 'vintage', 'slim', 'relaxed', 'striped', 'denim',
+              'linen', 'wool', 'leather', 'cotton', 'cropped', 'oversized')
+NOUNS = ('shirt', 'jacket', 'jeans', 'dress', 'shoes', 'hat', 'scarf',
+         'bag', 'belt', 'coat', 'skirt', 'jumper')
+FIRST_NAMES = ('Aoife', 'Sean', 'Maria', 'James', 'Priya', 'Tom', 'Li',
+               'Sarah', 'Omar', 'Anna', 'Luca', 'Niamh')
+LAST_NAMES = ('Murphy', 'Kelly', 'Smith', 'Garcia', 'Patel', 'Byrne',
+              'Chen', 'Walsh', 'Novak', 'Rossi', 'Brown', 'Doyle')
+TOWNS = (('IE', 'Dublin'), ('IE', 'Cork'), ('GB', 'London'),
+         ('GB', 'Leeds'), ('US', 'Boston'), ('DE', 'Berlin'),
+         ('FR', 'Lyon'), ('NL', 'Utrecht'))
+
+CENT = Decimal('0.01')
+
+
+def _cum_weights(pairs):
+    return [value for value, _ in pairs], list(
+        accumulate(weight for _, weight in pairs))
+
+
+def _choose(rng, distribution):
+    values, cum_weights = distribution
+    return rng.choices(values, cum_weights=cum_weights)[0]
+
+
+_SIZES = _cum_weights(SIZES)
+_LINES = _cum_weights(LINES_PER_ORDER)
+_QUANTITIES = _cum_weights(QUANTITIES)
+
+
+def _person(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    country, town = rng.choice(TOWNS)
+    return {
+        'full_name': f'{first} {last}',
+        'email': f'{first}.{last}{rng.randrange(10000)}@example.com'.lower(),
+        'phone_number': f'0{rng.randrange(10 ** 8, 10 ** 9)}',
+        'country': country,
+        'town_or_city': town,
+        'postcode': f'{rng.randrange(10000, 99999)}',
+        'street_address1': f'{rng.randrange(1, 200)} Main Street',
+        'street_address2': '',
+        'county': '',
+    }
+
+
+def media_images():
+    """
+    Image files already in MEDIA_ROOT, shared by the synthetic
+    products so no files have to be written
+    """
+    from django.conf import settings
+    try:
+        names = os.listdir(settings.MEDIA_ROOT)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def category_name(i):
+    return f'{SKU_PREFIX}_category_{i}'
+
+
+def generate_catalogue(seed, categories, products, batch_size=1000,
+                       images=True):
+    """
+    Categories and products, bulk created
+        - a third of products have sizes
+        - ratings 1-5, some products unrated
+        - images picked from the files in MEDIA_ROOT
+          (none with images=False)
+        - bulk_create skips the product signals, so the search
+          index and cached pages are refreshed once at the end
+    Used by generate_data and the benchmarks
+    """
+    from products.cache import bump_catalogue_version
+    from products.models import Category, Product
+    from products.search import get_search_backend
+
+    rng = random.Random(f'{seed}:catalogue')
+    Category.objects.bulk_create([
+        Category(name=category_name(i), friendly_name=f'Synthetic {i}')
+        for i in range(categories)
+    ])
+    category_ids = list(Category.objects.filter(
+        name__startswith=f'{SKU_PREFIX}_category_').values_list(
+        'id', flat=True))
+    images = media_images() if images else []
+
+    def product(i):
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        return Product(
+            sku=f'{SKU_PREFIX}{i:08d}',
+            name=f'{adjective.title()} {noun} {i}',
+            description=f'A {adjective} {noun}, made for scale testing.',
+            price=Decimal(rng.randrange(499, 19999)) / 100,
+            rating=(Decimal(rng.randrange(10, 51)) / 10
+                    if rng.random() < 0.9 else None),
+            has_sizes=rng.random() < 1 / 3,
+            category_id=rng.choice(category_ids),
+            image=rng.choice(images) if images else None,
+        )
+
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create([
+            product(i) for i in range(start, min(products, start + batch_size))
+        ])
+
+    get_search_backend().rebuild()
+    bump_catalogue_version()
+
+
+def generate_users(seed, count, batch_size=1000):
+    """
+    Users with filled in UserProfiles, bulk created
+    (so the profile signal doesn't run) with one shared
+    password hash: 'synthetic'
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from profiles.models import UserProfile
+
+    rng = random.Random(f'{seed}:users')
+    password = make_password('synthetic')
+    people = []
+    for start in range(0, count, batch_size):
+        users = []
+        for i in range(start, min(count, start + batch_size)):
+            person = _person(rng)
+            people.append(person)
+            first, last = person['full_name'].split(' ')
+            users.append(User(
+                username=f'{USERNAME_PREFIX}{i:07d}', email=person['email'],
+                first_name=first, last_name=last, password=password))
+        User.objects.bulk_create(users)
+
+    user_ids = User.objects.filter(
+        username__startswith=USERNAME_PREFIX).order_by(
+        'username').values_list('id', flat=True)
+    profiles = [
+        UserProfile(
+            user_id=user_id,
+            default_full_name=person['full_name'],
+            default_phone_number=person['phone_number'],
+            default_country=person['country'],
+            default_town_or_city=person['town_or_city'],
+            default_postcode=person['postcode'],
+            default_street_address1=person['street_address1'],
+        )
+        for user_id, person in zip(user_ids, people)
+    ]
+    UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+
+
+# columns written for each generated row, in tuple order
+PERSON_FIELDS = ('full_name', 'email', 'phone_number', 'country',
+                 'town_or_city', 'postcode', 'street_address1',
+                 'street_address2', 'county')
+ORDER_FIELDS = ('id', 'order_number', 'user_profile', 'date',
+                'delivery_cost', 'order_total', 'grand_total',
+                'original_bag', 'stripe_pid', 'item_count',
+                'item_summary') + PERSON_FIELDS
+LINEITEM_FIELDS = ('order', 'product', 'product_size', 'quantity',
+                   'lineitem_total')
+
+
+def insert_rows(model, field_names, rows, connection=None):
+    """
+    Multi-row INSERTs of ready-made value tuples
+    bulk_create spends most of its time preparing each value
+    of each model instance; generated values are already in
+    database form, so they go straight into the SQL
+    """
+    from django.db import connection as default_connection
+
+    connection = connection or default_connection
+    fields = [model._meta.get_field(name) for name in field_names]
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(field.column) for field in fields)
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = max(1, connection.ops.bulk_batch_size(fields, rows))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {qn(model._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([placeholders] * len(batch))}',
+                [value for row in batch for value in row])
+
+
+class OrderGenerator:
+    """
+    Builds orders and their line items in memory, the way
+    checkout would, with the totals update_total would give
+        - bags: 1-10 products, popular products far more likely
+          (Zipf), mostly one of each, common sizes more likely
+        - chunk n always gives the same orders for a seed,
+          whichever process builds it
+        - orders get ids and dates in the same order, spread
+          evenly over the date range
+    """
+
+    def __init__(self, seed, products, profiles, start, end,
+                 first_pk, total_orders):
+        from django.conf import settings
+
+        self.seed = seed
+        # (id, name, price, has_sizes), most popular first
+        self.products = list(products)
+        random.Random(f'{seed}:popularity').shuffle(self.products)
+        self.product_weights = list(accumulate(
+            1 / (rank + 1) ** ZIPF_EXPONENT
+            for rank in range(len(self.products))))
+        # (id, person fields)
+        self.profiles = profiles
+        self.start = start
+        self.first_pk = first_pk
+        self.step = (end - start) / max(1, total_orders)
+        self.free_delivery = Decimal(settings.FREE_DELIVERY_THRESHOLD)
+        self.delivery_percentage = Decimal(
+            settings.STANDARD_DELIVERY_PERCENTAGE)
+
+    def bag(self, rng):
+        bag = {}
+        picks = rng.choices(self.products, cum_weights=self.product_weights,
+                            k=_choose(rng, _LINES))
+        for product_id, _, _, has_sizes in picks:
+            quantity = _choose(rng, _QUANTITIES)
+            key = str(product_id)
+            if has_sizes:
+                sizes = bag.setdefault(key, {'items_by_size': {}})[
+                    'items_by_size']
+                size = _choose(rng, _SIZES)
+                sizes[size] = sizes.get(size, 0) + quantity
+            else:
+                bag[key] = bag.get(key, 0) + quantity
+        return bag
+
+    def build(self, chunk, first_pk, count):
+        """
+        (order rows, line item rows) for order ids first_pk onwards,
+        as tuples of ORDER_FIELDS and LINEITEM_FIELDS values
+        """
+        from django.db import connection
+
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        by_id = {product[0]: product for product in self.products}
+        rng = random.Random(f'{self.seed}:orders:{chunk}')
+        orders = []
+        lineitems = []
+        for pk in range(first_pk, first_pk + count):
+            bag = self.bag(rng)
+            if self.profiles and rng.random() < PROFILE_ORDER_SHARE:
+                profile_id, person = rng.choice(self.profiles)
+            else:
+                profile_id, person = None, _person(rng)
+
+            order_total = Decimal('0')
+            item_count = 0
+            summary = []
+            for key, item in bag.items():
+                _, name, price, _ = by_id[int(key)]
+                sizes = {None: item} if isinstance(item, int) \
+                    else item['items_by_size']
+                for size, quantity in sizes.items():
+                    lineitems.append(
+                        (pk, int(key), size, quantity, price * quantity))
+                    order_total += price * quantity
+                    item_count += quantity
+                    summary.append(f'Size {size.upper()} {name} x{quantity}'
+                                   if size else f'{name} x{quantity}')
+
+            if order_total < self.free_delivery:
+                delivery = (order_total * self.delivery_percentage
+                            / 100).quantize(CENT)
+            else:
+                delivery = Decimal('0')
+
+            date = self.start + self.step * (pk - self.first_pk + rng.random())
+            orders.append((
+                pk, f'{rng.getrandbits(128):032X}', profile_id,
+                adapt_datetime(date), delivery, order_total,
+                order_total + delivery, json.dumps(bag),
+                f'pi_synthetic_{self.seed}_{pk}', item_count,
+                '\n'.join(summary),
+            ) + tuple(person[field] for field in PERSON_FIELDS))
+        return orders, lineitems
+
+
+# set in each worker process by init_worker
+_generator = None
+
+
+def init_worker(generator):
+    """
+    Process pool initializer: set up Django where workers are
+    spawned, and keep the generator for build_chunk
+    """
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    # forked workers must not reuse the parent's connection
+    connections.close_all()
+    global _generator
+    _generator = generator
+
+
+def build_chunk(chunk, first_pk, count, generator=None):
+    """
+    Build and insert one chunk of orders and line items
+    Rows are inserted directly, so no post_save signals are
+    sent and update_total never runs: totals are set up front
+    """
+    from django.db import transaction
+    from checkout.models import Order, OrderLineItem
+
+    generator = generator or _generator
+    orders, lineitems = generator.build(chunk, first_pk, count)
+    with transaction.atomic():
+        insert_rows(Order, ORDER_FIELDS, orders)
+        insert_rows(OrderLineItem, LINEITEM_FIELDS, lineitems)
+    return len(orders), len(lineitems)
+
+
+def delete_synthetic_data(first_order_pk):
+    """
+    Remove what a failed generate_data run left behind: its orders
+    (ids from first_order_pk), products, categories and users
+    Orders and line items go with raw DELETEs, as they came in,
+    so update_total doesn't run for every line item
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from checkout.models import Order, OrderLineItem
+    from products.models import Category, Product
+
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {qn(OrderLineItem._meta.db_table)} WHERE '
+                f'{qn(OrderLineItem._meta.get_field("order").column)} >= %s',
+                [first_order_pk])
+            cursor.execute(
+                f'DELETE FROM {qn(Order._meta.db_table)} WHERE '
+                f'{qn(Order._meta.pk.column)} >= %s', [first_order_pk])
+        Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+        Category.objects.filter(
+            name__startswith=f'{SKU_PREFIX}_category_').delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+
+def date_range(days, until=None):
+    """
+    (start, end) datetimes for orders over the given days,
+    ending at midnight after until (default today)
+    """
+    from django.utils import timezone
+
+    until = until or timezone.localdate()
+    end = timezone.make_aware(datetime.datetime.combine(
+        until + datetime.timedelta(days=1), datetime.time.min))
+    return end - datetime.timedelta(days=days), end
@@ -0,0 +1,236 @@
+import datetime
+import random
+import shutil
+import tempfile
+from concurrent.futures import Future
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+
+from benchmarks.funnel import (
+    STEPS, WEBHOOK_SECRET, FunnelRecorder, FunnelSession, build_catalogue,
+    compare_reports,
+)
+from benchmarks.micro.runner import (
+    compare_results, load_results, run_benchmarks, save_results,
+)
+from benchmarks import synthetic
+from benchmarks.synthetic import SKU_PREFIX, OrderGenerator, date_range
+from checkout.models import Order, OrderLineItem
+from products.models import Product
+from reports.models import DailyRevenue
+
+
+class ExplainQueriesTest(TestCase):
+    """
+    Hot catalogue and order queries must be able to use an index
+    """
+
+    def test_no_full_table_scans(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertNotIn('FULL SCAN', out.getvalue())
+
+
+@override_settings(
+    STRIPE_BACKEND='checkout.stripe_fake.FakeStripeBackend',
+    STRIPE_WH_SECRET=WEBHOOK_SECRET)
+class FunnelTest(TestCase):
+    """
+    The load test's shopper must get through every step
+    """
+
+    def test_session_completes_the_funnel(self):
+        catalogue = build_catalogue(products=20, categories=3)
+        recorder = FunnelRecorder()
+        FunnelSession(catalogue, recorder, random.Random(1)).run()
+
+        self.assertEqual(recorder.errors, [])
+        report = recorder.report(1.0, sessions=1, concurrency=1)
+        self.assertEqual(list(report['steps']), list(STEPS))
+        self.assertEqual(report['steps']['add_to_bag']['count'], 3)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_compare_reports_flags_regressions(self):
+        baseline = {'steps': {'view_bag': {'p95_ms': 10.0, 'queries_max': 4}}}
+        current = {'steps': {
+            'view_bag': {'p95_ms': 13.0, 'queries_max': 5},
+            'webhook': {'p95_ms': 5.0, 'queries_max': 4},
+        }}
+        lines, regressions = compare_reports(baseline, current, threshold=20)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(regressions, [
+            'view_bag: p95 +30.0%', 'view_bag: 1 more queries'])
+
+
+class GenerateDataTest(TestCase):
+    """
+    Generated orders look like checkout made them
+    """
+
+    def test_generates_consistent_orders(self):
+        call_command('generate_data', products=30, users=5, orders=50,
+                     workers=0, chunk_size=20, categories=3,
+                     until=datetime.date(2026, 1, 31), stdout=StringIO())
+
+        self.assertEqual(Order.objects.count(), 50)
+        self.assertTrue(Order.objects.filter(
+            user_profile__isnull=False).exists())
+        order = Order.objects.order_by('pk').last()
+        self.assertEqual(order.date.date(), datetime.date(2026, 1, 31))
+        generated = (order.order_total, order.delivery_cost,
+                     order.grand_total, order.item_count, order.item_summary)
+        order.update_total()
+        self.assertEqual(generated, (
+            order.order_total, order.delivery_cost, order.grand_total,
+            order.item_count, order.item_summary))
+        # rollups are rebuilt from the generated orders
+        self.assertEqual(sum(DailyRevenue.objects.values_list(
+            'orders', flat=True)), 50)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_data', orders=0, workers=0,
+                         stdout=StringIO())
+
+    def test_chunks_are_deterministic(self):
+        start, end = date_range(10, datetime.date(2026, 1, 31))
+        products = [(1, 'Shirt', Decimal('19.99'), True),
+                    (2, 'Hat', Decimal('5.00'), False)]
+
+        def build():
+            generator = OrderGenerator(7, products, [], start, end, 1, 100)
+            return generator.build(3, 61, 20)
+
+        self.assertEqual(build(), build())
+
+
+class InlineExecutor:
+    """
+    ProcessPoolExecutor stand-in running each task as it's
+    submitted, so the worker pool path runs inside a test
+    """
+
+    def __init__(self, max_workers, initializer, initargs):
+        self.max_workers = max_workers
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class GenerateDataWorkersTest(TestCase):
+    """
+    The worker pool path, SQLite's single writer,
+    and clean up after a failed chunk
+    """
+
+    options = dict(products=20, users=3, orders=40, categories=2,
+                   chunk_size=10, until=datetime.date(2026, 1, 31))
+
+    def setUp(self):
+        # the test database connection must stay open
+        patcher = mock.patch.object(connections, 'close_all')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, synthetic, '_generator', None)
+
+    def _generate(self, vendor='postgresql'):
+        with mock.patch.object(connection, 'vendor', vendor), \
+                mock.patch('benchmarks.management.commands.generate_data.'
+                           'ProcessPoolExecutor', InlineExecutor):
+            out = StringIO()
+            call_command('generate_data', workers=4, stdout=out,
+                         stderr=StringIO(), **self.options)
+        return out.getvalue()
+
+    def test_worker_pool(self):
+        self._generate()
+        self.assertEqual(Order.objects.count(), 40)
+        # init_worker gave the workers the generator
+        self.assertIsNotNone(synthetic._generator)
+
+    def test_sqlite_inserts_in_process(self):
+        with mock.patch('benchmarks.management.commands.generate_data.'
+                        'ProcessPoolExecutor') as pool:
+            out = StringIO()
+            call_command('generate_data', workers=4, stdout=out,
+                         **self.options)
+        pool.assert_not_called()
+        self.assertIn('SQLite', out.getvalue())
+        self.assertEqual(Order.objects.count(), 40)
+
+    def test_failed_chunk_removes_partial_data(self):
+        calls = []
+
+        def flaky_build_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError('database is locked')
+            return synthetic.build_chunk(*args, **kwargs)
+
+        with mock.patch('benchmarks.management.commands.generate_data.'
+                        'build_chunk', flaky_build_chunk):
+            with self.assertRaises(CommandError):
+                self._generate()
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderLineItem.objects.exists())
+        self.assertFalse(
+            Product.objects.filter(sku__startswith=SKU_PREFIX).exists())
+        self.assertFalse(User.objects.exists())
+
+        # and it can be run again
+        self._generate()
+        self.assertEqual(Order.objects.count(), 40)
+
+
+class MicroBenchmarkTest(TestCase):
+    """
+    Micro benchmarks run, count queries and catch regressions
+    """
+
+    def test_runs_and_counts_queries(self):
+        results = run_benchmarks(
+            ['bag_contents[10 lines]', 'webhook_handler'], number=1, repeat=1)
+
+        self.assertEqual(set(results), {
+            'bag_contents[10 lines]', 'webhook_handler[new order]',
+            'webhook_handler[order exists]'})
+        # one product query however many lines
+        self.assertEqual(results['bag_contents[10 lines]']['queries'], 1)
+        # rolled back: no benchmark rows left behind
+        self.assertFalse(Order.objects.exists())
+
+    def test_results_saved_per_commit_and_compared(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = {'commit': 'abc1234', 'benchmarks': {
+            'fast': {'min_ms': 1.0, 'queries': 1},
+            'steady': {'min_ms': 2.0, 'queries': 3},
+        }}
+        save_results(baseline, directory)
+        current = {'commit': 'def5678', 'benchmarks': {
+            'fast': {'min_ms': 1.5, 'queries': 2},
+            'steady': {'min_ms': 2.1, 'queries': 3},
+        }}
+
+        lines, regressions = compare_results(
+            load_results('abc1234', directory), current, threshold=20)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(regressions, [
+            'fast: +50.0% slower', 'fast: 1 more queries'])
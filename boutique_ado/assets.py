@@ -0,0 +1,255 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+
+from products.storage import IMMUTABLE_CACHE_CONTROL, is_content_hashed
+
+# collectstatic's hashed names, e.g. 'css/base.3f2a9c1d8e7b.css'
+STATIC_HASHED_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+# precompressed variants, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    """
+    {coding: q} from an Accept-Encoding header,
+    e.g. 'gzip, br;q=0' -> {'gzip': 1.0, 'br': 0.0}
+    """
+    accepted = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    # unreadable weight: don't use the coding
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class AssetServer:
+    """
+    WSGI middleware that serves static and media files
+    before requests reach Django
+        - full responses go out through wsgi.file_wrapper,
+          so gunicorn can use sendfile (zero-copy)
+        - ETag / If-None-Match and If-Modified-Since -> 304
+        - single Range requests -> 206
+        - precompressed .br/.gz static files for browsers
+          that accept them
+        - hashed names are cached for a year, others for
+          ASSET_MAX_AGE seconds
+    Anything that isn't a file under a root is passed to Django
+    """
+
+    def __init__(self, application, mounts=None):
+        self.application = application
+        if mounts is None:
+            mounts = [
+                (settings.STATIC_URL, settings.STATIC_ROOT, True),
+                (settings.MEDIA_URL, settings.MEDIA_ROOT, False),
+            ]
+        # (url prefix, directory, serve compressed variants)
+        self.mounts = [
+            (prefix, os.path.realpath(root), compressed)
+            for prefix, root, compressed in mounts if prefix and root
+        ]
+        self.max_age = getattr(settings, 'ASSET_MAX_AGE', 3600)
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            found = self.find_file(environ.get('PATH_INFO', ''))
+            if found:
+                return self.serve(environ, start_response, *found)
+        return self.application(environ, start_response)
+
+    def find_file(self, path):
+        """
+        (full path, url name, stat, compressed) for a request path,
+        None if it isn't a regular file inside one of the roots
+        """
+        for prefix, root, compressed in self.mounts:
+            if not path.startswith(prefix):
+                continue
+            name = path[len(prefix):]
+            full_path = os.path.realpath(os.path.join(root, name))
+            # no escaping the root with '..' or symlinks
+            if not full_path.startswith(root + os.sep):
+                return None
+            try:
+                file_stat = os.stat(full_path)
+            except OSError:
+                return None
+            if not stat.S_ISREG(file_stat.st_mode):
+                return None
+            if compressed and self._is_variant(full_path):
+                # only sent with Content-Encoding, for the original's url
+                return None
+            return full_path, name, file_stat, compressed
+        return None
+
+    def _cache_control(self, name):
+        if is_content_hashed(name) or STATIC_HASHED_RE.search(name):
+            return IMMUTABLE_CACHE_CONTROL
+        return f'public, max-age={self.max_age}'
+
+    def _is_variant(self, full_path):
+        for _, suffix in ENCODINGS:
+            if full_path.endswith(suffix) \
+                    and os.path.isfile(full_path[:-len(suffix)]):
+                return True
+        return False
+
+    def _choose_encoding(self, environ, full_path):
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        default = accepted.get('*', 0.0)
+        weights = [(accepted.get(encoding, default), encoding, suffix)
+                   for encoding, suffix in ENCODINGS]
+        # highest q first, ties in ENCODINGS order (sort is stable)
+        weights.sort(key=lambda weight: -weight[0])
+        for q, encoding, suffix in weights:
+            if q <= 0:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            return encoding, full_path + suffix, variant_stat
+        return None, full_path, None
+
+    def serve(self, environ, start_response, full_path, name, file_stat,
+              compressed):
+        content_type, _ = mimetypes.guess_type(name)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control', self._cache_control(name)),
+            ('Last-Modified', http_date(file_stat.st_mtime)),
+            ('Accept-Ranges', 'bytes'),
+        ]
+
+        encoding = None
+        range_header = environ.get('HTTP_RANGE')
+        if compressed:
+            headers.append(('Vary', 'Accept-Encoding'))
+            # ranges are always of the uncompressed file
+            if not range_header:
+                encoding, full_path, variant_stat = self._choose_encoding(
+                    environ, full_path)
+                if encoding:
+                    file_stat = variant_stat
+                    headers.append(('Content-Encoding', encoding))
+
+        etag = f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}'
+        etag += f'-{encoding}"' if encoding else '"'
+        headers.append(('ETag', etag))
+
+        if self._not_modified(environ, etag, file_stat):
+            start_response('304 Not Modified', [
+                h for h in headers if h[0] != 'Content-Type'])
+            return []
+
+        size = file_stat.st_size
+        start, end = 0, size - 1
+        status = '200 OK'
+        if range_header and self._range_applies(environ, etag, file_stat):
+            byte_range = self._parse_range(range_header, size)
+            if byte_range == 'unsatisfiable':
+                start_response('416 Range Not Satisfiable', [
+                    ('Content-Range', f'bytes */{size}'),
+                    ('Content-Length', '0'),
+                ])
+                return []
+            if byte_range:
+                start, end = byte_range
+                status = '206 Partial Content'
+                headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+
+        length = end - start + 1 if size else 0
+        headers.append(('Content-Length', str(length)))
+        start_response(status, headers)
+
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+
+        f = open(full_path, 'rb')
+        if status == '200 OK' and 'wsgi.file_wrapper' in environ:
+            return environ['wsgi.file_wrapper'](f, BLOCK_SIZE)
+        f.seek(start)
+        return _FileRange(f, length)
+
+    def _not_modified(self, environ, etag, file_stat):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            # weak comparison, as for GET/HEAD in RFC 7232
+            return '*' in tags or etag in [
+                t[2:] if t.startswith('W/') else t for t in tags]
+        since = parse_http_date_safe(environ.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and int(file_stat.st_mtime) <= since
+
+    def _range_applies(self, environ, etag, file_stat):
+        # If-Range: only send part of the file if it hasn't changed
+        if_range = environ.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith('"'):
+            return if_range == etag
+        since = parse_http_date_safe(if_range)
+        return since is not None and int(file_stat.st_mtime) <= since
+
+    def _parse_range(self, header, size):
+        """
+        (start, end) for a single 'bytes=' range,
+        'unsatisfiable', or None to send the whole file
+        (multiple ranges are answered with the whole file)
+        """
+        match = RANGE_RE.match(header.strip())
+        if not match or match.group(1) == match.group(2) == '':
+            return None
+        first, last = match.groups()
+        if first == '':
+            # suffix range: the last n bytes
+            length = int(last)
+            if length == 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or end < start:
+            return 'unsatisfiable'
+        return start, end
+
+
+class _FileRange:
+    """
+    Iterates length bytes of an open file, then closes it
+    """
+
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def __iter__(self):
+        while self.remaining > 0:
+            chunk = self.f.read(min(BLOCK_SIZE, self.remaining))
+            if not chunk:
+                break
+            self.remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.f.close()
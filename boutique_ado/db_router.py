@@ -0,0 +1,118 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'primary_pin'
+
+# per-thread: is this request (or command) reading from the primary,
+# and has it written a routed model
+_state = threading.local()
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+def reset_pin():
+    _state.pinned = False
+    _state.wrote = False
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def wrote_routed_model():
+    return getattr(_state, 'wrote', False)
+
+
+def _routed(model):
+    return model._meta.label_lower in settings.REPLICA_ROUTED_MODELS
+
+
+class ReplicaRouter:
+    """
+    Catalogue and order history reads go to the replica,
+    everything else (and every write) to the primary
+        - a write to a routed model pins the rest of the request
+          to the primary, and ReplicaPinMiddleware keeps the
+          session there for REPLICA_PIN_SECONDS, so e.g.
+          checkout_success sees the order checkout just saved
+        - reads inside a transaction stay on the primary
+        - without a 'replica' database nothing changes
+        - the replica must be kept in step by the database itself
+          (streaming replication), it is never migrated
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_ALIAS not in settings.DATABASES or not _routed(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from where their instance did
+            return instance._state.db
+        if is_pinned() or connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _routed(model):
+            pin_to_primary()
+            _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica is a copy of the primary
+        aliases = {'default', REPLICA_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema through replication
+        return db != REPLICA_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes for the replica router
+        - unsafe methods, the admin and the Stripe webhook
+          run entirely against the primary
+        - after a request writes a routed model, a short-lived
+          cookie keeps the session's reads on the primary until
+          the replica has caught up
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_pin()
+        if self._needs_primary(request):
+            pin_to_primary()
+        try:
+            response = self.get_response(request)
+            if wrote_routed_model():
+                self._set_pin_cookie(response)
+            return response
+        finally:
+            reset_pin()
+
+    def _needs_primary(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        if request.path.startswith(settings.REPLICA_PRIMARY_PATHS):
+            return True
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _set_pin_cookie(self, response):
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            PIN_COOKIE, str(round(time.time() + seconds, 3)),
+            max_age=seconds, httponly=True, samesite='Lax')
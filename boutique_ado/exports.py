@@ -0,0 +1,87 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# rows fetched from the database at a time
+# (a server-side cursor on postgres)
+CHUNK_SIZE = 2000
+# rows joined into each chunk of the response
+ROWS_PER_WRITE = 500
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class Echo:
+    """
+    File-like object for csv.writer that returns
+    each line instead of storing it
+    """
+
+    def write(self, value):
+        return value
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(queryset, columns):
+    """
+    Tuples of the export columns, streamed from the database
+    columns: (header, lookup) pairs, e.g. ('category', 'category__name')
+    """
+    lookups = [lookup for _, lookup in columns]
+    return queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(columns, rows):
+    headers = [header for header, _ in columns]
+    for row in rows:
+        yield json.dumps(
+            dict(zip(headers, map(_jsonable, row)))) + '\n'
+
+
+def export_response(queryset, columns, fmt, name):
+    """
+    Stream a queryset as a CSV or JSONL download
+    Only one chunk of rows is in memory at a time,
+    however many rows are exported
+    """
+    rows = iter_rows(queryset, columns)
+    lines = csv_lines(columns, rows) if fmt == 'csv' \
+        else jsonl_lines(columns, rows)
+    response = StreamingHttpResponse(
+        _batched(lines), content_type=FORMATS[fmt])
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    response['Content-Disposition'] = \
+        f'attachment; filename="{name}-{stamp}.{fmt}"'
+    return response
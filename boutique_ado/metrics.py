@@ -0,0 +1,374 @@
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# seconds
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# distinct SQL statements remembered per request for the slow log
+MAX_SQL_STATEMENTS = 100
+SLOW_LOG_STATEMENTS = 5
+
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram: cumulative bucket counts,
+    sum and count for each combination of label values
+    """
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def collect(self):
+        with self._lock:
+            return {key: {'buckets': list(s['buckets']), 'sum': s['sum'],
+                          'count': s['count']}
+                    for key, s in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        for values, series in sorted(self.collect().items()):
+            for bound, count in zip(self.buckets, series['buckets']):
+                labels = _format_labels(self.labels, values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labels, values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {series["count"]}')
+            labels = _format_labels(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {_number(series["sum"])}')
+            lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """
+    Prometheus-style counter for each combination of label values
+    """
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} counter']
+        for values, total in sorted(self.collect().items()):
+            labels = _format_labels(self.labels, values)
+            lines.append(f'{self.name}{labels} {_number(total)}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+REQUESTS = Counter(
+    'boutique_requests_total', 'Requests by view and status code',
+    ('view', 'status'))
+REQUEST_SECONDS = Histogram(
+    'boutique_request_seconds', 'Wall time of each request', ('view',))
+SQL_QUERIES = Histogram(
+    'boutique_request_sql_queries', 'SQL queries made by each request',
+    ('view',), QUERY_BUCKETS)
+SQL_SECONDS = Histogram(
+    'boutique_request_sql_seconds', 'Time each request spent in SQL',
+    ('view',))
+TEMPLATE_SECONDS = Histogram(
+    'boutique_request_template_seconds',
+    'Time each request spent rendering templates', ('view',))
+EXTERNAL_SECONDS = Histogram(
+    'boutique_request_external_seconds',
+    'Time each request spent waiting on an external service',
+    ('view', 'service'))
+EXTERNAL_CALL_SECONDS = Histogram(
+    'boutique_external_call_seconds',
+    'Duration of each call to an external service', ('service',))
+
+METRICS = (REQUESTS, REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS,
+           TEMPLATE_SECONDS, EXTERNAL_SECONDS, EXTERNAL_CALL_SECONDS)
+
+
+def reset_metrics():
+    for metric in METRICS:
+        metric.reset()
+
+
+class RequestTimings:
+    """
+    What one request spent its time on, collected by
+    the SQL wrapper, template backend and external_call
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.external = {}
+        # sql -> [count, seconds], repeats show up N+1 queries
+        self.statements = {}
+
+    def add_query(self, sql, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        stats = self.statements.get(sql)
+        if stats is None:
+            if len(self.statements) >= MAX_SQL_STATEMENTS:
+                return
+            stats = self.statements[sql] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+
+    def sample_statements(self, limit=SLOW_LOG_STATEMENTS):
+        """
+        The statements that took longest in total, with counts
+        """
+        ordered = sorted(self.statements.items(),
+                         key=lambda item: item[1][1], reverse=True)
+        return [{'sql': sql, 'count': count, 'ms': round(seconds * 1000, 2)}
+                for sql, (count, seconds) in ordered[:limit]]
+
+
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def external_call(service):
+    """
+    Time a call to an external service (Stripe, SMTP),
+    counted against the current request if there is one
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        EXTERNAL_CALL_SECONDS.observe(seconds, service)
+        timings = current_timings()
+        if timings is not None:
+            timings.external[service] = \
+                timings.external.get(service, 0.0) + seconds
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = current_timings()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.add_query(sql, time.perf_counter() - start)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return getattr(match.func, '__name__', match.view_name)
+
+
+class MetricsMiddleware:
+    """
+    Per-view timings for every request
+        - wall time
+        - SQL query count and time (connection.execute_wrapper)
+        - template render time (TimedDjangoTemplates)
+        - time in Stripe and SMTP calls (external_call)
+    Aggregated into histograms, served by the metrics view
+    Requests slower than METRICS_SLOW_REQUEST_SECONDS, or making
+    more than METRICS_SLOW_REQUEST_QUERIES queries, are logged
+    with their most expensive SQL
+    Metrics are kept per process: each worker reports its own
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _local.timings = RequestTimings()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        wall = time.perf_counter() - start
+
+        view = _view_name(request)
+        REQUESTS.inc(view, str(response.status_code))
+        REQUEST_SECONDS.observe(wall, view)
+        SQL_QUERIES.observe(timings.sql_count, view)
+        SQL_SECONDS.observe(timings.sql_seconds, view)
+        TEMPLATE_SECONDS.observe(timings.template_seconds, view)
+        for service, seconds in timings.external.items():
+            EXTERNAL_SECONDS.observe(seconds, view, service)
+
+        if (wall >= settings.METRICS_SLOW_REQUEST_SECONDS
+                or timings.sql_count > settings.METRICS_SLOW_REQUEST_QUERIES):
+            self.log_slow_request(request, response, view, wall, timings)
+        return response
+
+    def log_slow_request(self, request, response, view, wall, timings):
+        logger.warning('Slow request %s %s', request.method, json.dumps({
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'ms': round(wall * 1000, 2),
+            'sql_count': timings.sql_count,
+            'sql_ms': round(timings.sql_seconds * 1000, 2),
+            'template_ms': round(timings.template_seconds * 1000, 2),
+            'external_ms': {service: round(seconds * 1000, 2)
+                            for service, seconds in timings.external.items()},
+            'top_sql': timings.sample_statements(),
+        }))
+
+
+class TimedTemplate:
+    """
+    Wraps a backend template so its render time is
+    added to the current request (outermost render only)
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = current_timings()
+        if timings is None:
+            return self.template.render(context, request)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if timings.template_depth == 0:
+                timings.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with render timing for MetricsMiddleware
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedEmailBackend(BaseEmailBackend):
+    """
+    Sends through METRICS_EMAIL_BACKEND, timing each send
+    as an external 'smtp' call
+    """
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.backend = get_connection(
+            settings.METRICS_EMAIL_BACKEND, fail_silently=fail_silently,
+            **kwargs)
+
+    def open(self):
+        with external_call('smtp'):
+            return self.backend.open()
+
+    def close(self):
+        return self.backend.close()
+
+    def send_messages(self, email_messages):
+        with external_call('smtp'):
+            return self.backend.send_messages(email_messages)
+
+
+def render_metrics(gateway=None):
+    """
+    Every metric in the Prometheus text format, plus
+    the Stripe gateway's per-call counters
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    if gateway is not None:
+        calls = gateway.metrics.snapshot()
+        for suffix, field, documentation in (
+                ('calls_total', 'count', 'Stripe API calls'),
+                ('errors_total', 'errors', 'Failed Stripe API calls'),
+                ('seconds_total', 'total_seconds', 'Time in Stripe API calls')):
+            name = f'boutique_stripe_{suffix}'
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} counter')
+            for call, stats in sorted(calls.items()):
+                lines.append(
+                    f'{name}{{call="{_escape(call)}"}} '
+                    f'{_number(stats[field])}')
+    return '\n'.join(lines) + '\n'
@@ -48,6 +48,9 @@ INSTALLED_APPS = [
     'bag',
     'checkout',
     'profiles',
+    'benchmarks',
+    'reports',
+    'profiling',
 
 
     # Other
@@ -55,13 +58,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its wall time covers the other middleware too
+    'boutique_ado.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # before anything reads the catalogue or orders
+    'boutique_ado.db_router.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # last, so it profiles the view itself
+    'profiling.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'boutique_ado.urls'
@@ -70,7 +79,8 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, with render times for the metrics
+        'BACKEND': 'boutique_ado.metrics.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
             os.path.join(BASE_DIR, 'templates', 'allauth'),
@@ -108,7 +118,9 @@ AUTHENTICATION_BACKENDS = [
 
 SITE_ID = 1  # used by socials for callback
 
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# sends through METRICS_EMAIL_BACKEND, timing each send
+EMAIL_BACKEND = 'boutique_ado.metrics.TimedEmailBackend'
+METRICS_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 ACCOUNT_AUTHENTICATION_METHOD = 'username_email'
 
@@ -142,6 +154,24 @@ else:
         }
     }
 
+# optional read replica for the catalogue and order history
+# (boutique_ado.db_router)
+#   - REPLICA_DATABASE_URL must be a streaming replica of the primary
+#     (e.g. a Postgres hot standby): it is never migrated, and nothing
+#     here copies data into it
+#   - REPLICA_DATABASE_URL=default opens a second connection to the
+#     primary instead, to try the routing locally
+# tests use the primary for both
+if 'REPLICA_DATABASE_URL' in os.environ:
+    if os.environ.get('REPLICA_DATABASE_URL') == 'default':
+        DATABASES['replica'] = dict(DATABASES['default'])
+    else:
+        DATABASES['replica'] = dj_database_url.parse(
+            os.environ.get('REPLICA_DATABASE_URL'))
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['boutique_ado.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -181,9 +211,51 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+# collectstatic writes hashed names plus .gz/.br copies here
+# (.br needs the optional 'brotli' package)
+# boutique_ado.assets.AssetServer serves them from wsgi.py
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'boutique_ado.storage.CompressedManifestStaticFilesStorage'
+# browser cache for files without a hash in their name, in seconds
+ASSET_MAX_AGE = 3600
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# uploads are named by content hash and deduplicated
+DEFAULT_FILE_STORAGE = 'products.storage.ContentHashStorage'
+# 'python manage.py sweep_media' deletes files no product uses,
+# once they are older than this (an upload's product may not be saved yet)
+MEDIA_SWEEP_GRACE_SECONDS = 60 * 60
+
+# widths of the resized product images, used in srcset
+PRODUCT_IMAGE_WIDTHS = (160, 320, 640, 960)
+
+# Cache
+# local memory by default, memcached (pymemcache) if a location is set
+# local memory is per process, so only for a single runserver:
+# the catalogue version cached pages are keyed on is a counter
+# in this cache, and must be shared by every worker
+if 'MEMCACHED_LOCATION' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('MEMCACHED_LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Products listing
+PRODUCTS_PER_PAGE = 24
+# rendered product grid/detail fragments, keyed by catalogue version
+PRODUCTS_PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Profile order history
+ORDER_HISTORY_PER_PAGE = 10
 
 # Stripe
 FREE_DELIVERY_THRESHOLD = 50
@@ -192,9 +264,59 @@ STRIPE_CURRENCY = 'usd'
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_WH_SECRET = os.getenv('STRIPE_WH_SECRET', '')
+
+# all Stripe API calls go through checkout.stripe_gateway
+# use 'checkout.stripe_fake.FakeStripeBackend' to run offline
+STRIPE_BACKEND = os.getenv(
+    'STRIPE_BACKEND', 'checkout.stripe_gateway.StripeSDKBackend')
+# seconds per call, retries on network/5xx/rate limit errors
+STRIPE_TIMEOUT = float(os.getenv('STRIPE_TIMEOUT', '10'))
+STRIPE_MAX_RETRIES = 2
+STRIPE_RETRY_BACKOFF = 0.25
+# open the breaker after this many failed calls in a row,
+# try again after STRIPE_BREAKER_RESET seconds
+STRIPE_BREAKER_THRESHOLD = 5
+STRIPE_BREAKER_RESET = 30
 DEFAULT_FROM_EMAIL = 'boutiqueado@example.com'
 
+# email outbox, sent by 'python manage.py send_outbox'
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# seconds before the first retry, doubled after each failure
+EMAIL_OUTBOX_RETRY_BACKOFF = 60
+# seconds a worker has to send a batch before others retry it
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 300
+
+# request metrics, served at /metrics/ (boutique_ado.metrics)
+# Prometheus sends 'Authorization: Bearer <METRICS_TOKEN>'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# requests over either limit are logged with their slowest SQL
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+METRICS_SLOW_REQUEST_QUERIES = 50
+
+# on-demand profiles for superusers (?_profile=1 or 'X-Profile: 1')
+# only the newest PROFILER_MAX_RUNS are kept on disk
+# (not 'profiles', that's the profiles app)
+PROFILER_DIR = os.getenv(
+    'PROFILER_DIR', os.path.join(BASE_DIR, 'profile_runs'))
+PROFILER_MAX_RUNS = 50
+# seconds between call stack samples
+PROFILER_SAMPLE_INTERVAL = 0.002
+
+# 'python manage.py benchmark_micro --save' writes <commit>.json here
+BENCHMARK_RESULTS_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# models whose reads go to the replica, when there is one
+REPLICA_ROUTED_MODELS = (
+    'products.product', 'products.category',
+    'checkout.order', 'checkout.orderlineitem',
+)
+# seconds a session reads from the primary after it writes one of them
+REPLICA_PIN_SECONDS = 10
+# always served from the primary: the admin and the Stripe webhook
+REPLICA_PRIMARY_PATHS = ('/admin/', '/checkout/wh/')
@@ -0,0 +1,62 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    # optional: without it only .gz variants are made
+    brotli = None
+
+# text formats worth compressing, images and fonts already are
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.ico',
+)
+# smaller files aren't worth the extra request header
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files with content hashes in their names
+    (base.css -> base.3f2a9c1d8e7b.css), plus .gz and .br copies
+    of text files, all made once by collectstatic
+    boutique_ado.assets.AssetServer serves the compressed copy
+    to browsers that accept it
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic hasn't run (tests, or runserver without
+            # DEBUG): use the plain name rather than failing the page
+            # an asset missing from a real manifest still raises
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in list(self.hashed_files.values()):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            if len(content) < MIN_COMPRESS_SIZE:
+                continue
+            for suffix, compressed in self._compress(content):
+                # only keep variants that are actually smaller
+                if len(compressed) < len(content):
+                    variant = name + suffix
+                    if self.exists(variant):
+                        self.delete(variant)
+                    self._save(variant, ContentFile(compressed))
+                    yield name, variant, True
+
+    def _compress(self, content):
+        # mtime=0: the same file always gives the same bytes
+        yield '.gz', gzip.compress(content, compresslevel=9, mtime=0)
+        if brotli is not None:
+            yield '.br', brotli.compress(content, quality=11)
@@ -0,0 +1,310 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from wsgiref.util import FileWrapper, setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+
+from checkout.models import Order
+from products.models import Product
+from profiles.models import UserProfile
+from .assets import AssetServer
+from .db_router import (
+    PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, is_pinned, reset_pin,
+)
+from .metrics import (
+    EXTERNAL_CALL_SECONDS, REQUEST_SECONDS, SQL_QUERIES, TEMPLATE_SECONDS,
+    reset_metrics,
+)
+
+CSS = 'body { color: #222; }\n' * 50
+
+
+class CompressedManifestStorageTest(SimpleTestCase):
+    """
+    collectstatic writes hashed names and gzip copies
+    """
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.static_root)
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'base.css'), 'w') as f:
+            f.write(CSS)
+
+    def test_collectstatic_hashes_and_compresses(self):
+        with override_settings(STATICFILES_DIRS=[self.source],
+                               STATIC_ROOT=self.static_root):
+            call_command('collectstatic', interactive=False,
+                         stdout=StringIO())
+            name = staticfiles_storage.stored_name('css/base.css')
+
+        self.assertRegex(name, r'^css/base\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(self.static_root, name + '.gz')) as f:
+            self.assertEqual(f.read().decode(), CSS)
+
+    def test_uncollected_files_use_plain_names(self):
+        with override_settings(STATIC_ROOT=self.static_root):
+            self.assertEqual(
+                staticfiles_storage.stored_name('css/missing.css'),
+                'css/missing.css')
+
+    def test_missing_asset_in_manifest_raises(self):
+        with override_settings(STATICFILES_DIRS=[self.source],
+                               STATIC_ROOT=self.static_root):
+            call_command('collectstatic', interactive=False,
+                         stdout=StringIO())
+            with self.assertRaises(ValueError):
+                staticfiles_storage.stored_name('css/missing.css')
+
+
+class AssetServerTest(SimpleTestCase):
+    """
+    Files are served before Django, with conditional
+    and range requests
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(self.root, 'app.a1b2c3d4e5f6.js'), 'wb') as f:
+            f.write(self.content)
+        with open(os.path.join(self.root, 'app.a1b2c3d4e5f6.js.gz'), 'wb') as f:
+            f.write(gzip.compress(self.content))
+
+        def django_app(environ, start_response):
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        self.server = AssetServer(
+            django_app, mounts=[('/static/', self.root, True)])
+
+    def request(self, path='/static/app.a1b2c3d4e5f6.js', **headers):
+        environ = {'PATH_INFO': path, 'wsgi.file_wrapper': FileWrapper}
+        environ.update(headers)
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(headers)
+
+        body = self.server(environ, start_response)
+        response['body'] = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return response
+
+    def test_full_file_uses_file_wrapper(self):
+        environ = {'PATH_INFO': '/static/app.a1b2c3d4e5f6.js',
+                   'wsgi.file_wrapper': FileWrapper}
+        setup_testing_defaults(environ)
+        body = self.server(environ, lambda status, headers: None)
+        self.assertIsInstance(body, FileWrapper)
+        body.close()
+
+        response = self.request()
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(response['body'], self.content)
+        self.assertIn('immutable', response['headers']['Cache-Control'])
+
+    def test_etag_gives_304(self):
+        etag = self.request()['headers']['ETag']
+        response = self.request(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['status'], 304)
+        self.assertEqual(response['body'], b'')
+
+    def test_range_request(self):
+        response = self.request(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response['status'], 206)
+        self.assertEqual(response['body'], self.content[10:20])
+        self.assertEqual(response['headers']['Content-Range'],
+                         f'bytes 10-19/{len(self.content)}')
+
+        response = self.request(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response['body'], self.content[-5:])
+
+        response = self.request(HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response['status'], 416)
+
+    def test_precompressed_variant(self):
+        response = self.request(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response['body']), self.content)
+        self.assertNotEqual(response['headers']['ETag'],
+                            self.request()['headers']['ETag'])
+
+    def test_encoding_weights(self):
+        with open(os.path.join(self.root, 'app.a1b2c3d4e5f6.js.br'), 'wb') as f:
+            f.write(b'brotli')
+        for header, expected in (
+                ('gzip, br', 'br'),
+                ('gzip, br;q=0', 'gzip'),
+                ('br;q=0.5, gzip', 'gzip'),
+                ('*', 'br'),
+                ('*;q=0, gzip', 'gzip'),
+                ('x-gzip-foo, identity', None),
+                ('gzip;q=0, br;q=0', None)):
+            with self.subTest(header=header):
+                response = self.request(HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(
+                    response['headers'].get('Content-Encoding'), expected)
+
+    def test_variants_are_not_served_directly(self):
+        response = self.request('/static/app.a1b2c3d4e5f6.js.gz')
+        self.assertEqual(response['body'], b'django')
+
+    def test_other_paths_reach_django(self):
+        for path in ('/static/missing.js', '/static/../etc/passwd', '/products/'):
+            self.assertEqual(self.request(path)['body'], b'django')
+
+
+class MetricsTest(TestCase):
+    """
+    Per-view request metrics and the Prometheus endpoint
+    """
+
+    def setUp(self):
+        # a product, and nothing cached, so the listing queries
+        Product.objects.create(
+            sku='m1', name='Metrics product', description='x', price=5)
+        cache.clear()
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def test_request_is_timed_by_view(self):
+        self.client.get(reverse('products'))
+
+        self.assertEqual(
+            REQUEST_SECONDS.collect()[('all_products',)]['count'], 1)
+        self.assertGreater(SQL_QUERIES.collect()[('all_products',)]['sum'], 0)
+        self.assertGreater(
+            TEMPLATE_SECONDS.collect()[('all_products',)]['sum'], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_needs_token_or_superuser(self):
+        self.client.get(reverse('products'))
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE boutique_request_seconds histogram', body)
+        self.assertIn(
+            'boutique_request_seconds_count{view="all_products"} 1', body)
+        self.assertIn(
+            'boutique_requests_total{view="all_products",status="200"} 1',
+            body)
+
+    @override_settings(METRICS_SLOW_REQUEST_QUERIES=0)
+    def test_slow_request_logged_with_sql(self):
+        with self.assertLogs('boutique_ado.metrics', 'WARNING') as logs:
+            self.client.get(reverse('products'))
+
+        self.assertIn('Slow request GET', logs.output[0])
+        self.assertIn('"top_sql"', logs.output[0])
+
+    @override_settings(
+        EMAIL_BACKEND='boutique_ado.metrics.TimedEmailBackend',
+        METRICS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_email_sends_are_timed(self):
+        mail.send_mail('Hi', 'Body', 'shop@example.com', ['a@example.com'])
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EXTERNAL_CALL_SECONDS.collect()[('smtp',)]['count'], 1)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    Catalogue and order history reads go to the replica,
+    writes and read-your-writes to the primary
+    """
+
+    def setUp(self):
+        # a replica alias, as REPLICA_DATABASE_URL would add
+        patcher = mock.patch.dict(
+            settings.DATABASES, {'replica': settings.DATABASES['default']})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_pin()
+        self.addCleanup(reset_pin)
+        self.router = ReplicaRouter()
+
+    def test_routed_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(self.router.db_for_read(Order), 'replica')
+        # anything else is left to the default
+        self.assertIsNone(self.router.db_for_read(UserProfile))
+
+    def test_write_pins_reads_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+        self.assertTrue(is_pinned())
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_no_replica_changes_nothing(self):
+        del settings.DATABASES['replica']
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'products'))
+        self.assertTrue(self.router.allow_migrate('default', 'products'))
+
+    def test_pin_cookie_after_write(self):
+        def view(request):
+            reads = self.router.db_for_read(Order)
+            if request.method == 'POST':
+                self.router.db_for_write(Order)
+            return HttpResponse(reads)
+
+        middleware = ReplicaPinMiddleware(view)
+        factory = RequestFactory()
+
+        # a write sets the cookie, and is served from the primary
+        response = middleware(factory.post('/checkout/'))
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        # so the next page sees the order
+        request = factory.get('/checkout/checkout_success/1')
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        response = middleware(request)
+        self.assertEqual(response.content, b'default')
+        # reads alone don't extend the pin
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(is_pinned())
+
+        # other sessions read the replica
+        response = middleware(factory.get('/products/'))
+        self.assertEqual(response.content, b'replica')
+        # the webhook always uses the primary
+        response = middleware(factory.get('/checkout/wh/'))
+        self.assertEqual(response.content, b'default')
+
+
+class ReplicaTransactionTest(TestCase):
+
+    def test_reads_in_transaction_stay_on_primary(self):
+        with mock.patch.dict(
+                settings.DATABASES,
+                {'replica': settings.DATABASES['default']}):
+            with transaction.atomic():
+                self.assertEqual(
+                    ReplicaRouter().db_for_read(Product), 'default')
@@ -18,6 +18,9 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from products.views import serve_media
+from .views import metrics
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,4 +30,7 @@ urlpatterns = [
     path('bag/', include('bag.urls')),
     path('checkout/', include('checkout.urls')),
     path('profile/', include('profiles.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('reports/', include('reports.urls')),
+    path('metrics/', metrics, name='metrics'),
+] + static(settings.MEDIA_URL, view=serve_media,
+           document_root=settings.MEDIA_ROOT)
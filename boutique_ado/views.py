@@ -0,0 +1,25 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from checkout.stripe_gateway import get_stripe_gateway
+from .metrics import render_metrics
+
+
+def metrics(request):
+    """
+    Request metrics in the Prometheus text format
+        - scrapers send 'Authorization: Bearer <METRICS_TOKEN>'
+        - superusers can also view it in the browser
+    """
+    token = settings.METRICS_TOKEN
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    authorised = bool(token) and hmac.compare_digest(
+        auth.encode(), f'Bearer {token}'.encode())
+    if not (authorised or request.user.is_superuser):
+        return HttpResponseForbidden('Forbidden\n')
+
+    return HttpResponse(
+        render_metrics(get_stripe_gateway()),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
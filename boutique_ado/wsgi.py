@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from boutique_ado.assets import AssetServer
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'boutique_ado.settings')
 
 application = get_wsgi_application()
+
+# serve static and media files before they reach Django
+application = AssetServer(application)
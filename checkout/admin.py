@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, OrderLineItem
+from .models import Order, OrderLineItem, OutboxEmail
+from .exports import export_orders
 
 
 class OrderLineItemAdminInline(admin.TabularInline):
@@ -31,6 +32,30 @@ class OrderAdmin(admin.ModelAdmin):
 
     ordering = ('-date',)
 
+    actions = ('export_csv', 'export_jsonl')
+
+    # streamed downloads of the selected orders and their line items
+    @admin.action(description='Export selected orders as CSV')
+    def export_csv(self, request, queryset):
+        return export_orders(queryset, 'csv')
+
+    @admin.action(description='Export selected orders as JSONL')
+    def export_jsonl(self, request, queryset):
+        return export_orders(queryset, 'jsonl')
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """
+    Queued emails, to check on delivery and failures
+    """
+    list_display = ('subject', 'recipients', 'status',
+                    'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('dedupe_key', 'created', 'sent_at', 'last_error')
+
+    ordering = ('-created',)
+
 
 # Register Order and OrderAdmin models
 admin.site.register(Order, OrderAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -0,0 +1,33 @@
+from boutique_ado.exports import export_response
+
+# one row per line item, order details repeated on each
+# line items and products are joined in the same query
+# (left join, so orders without items still get a row)
+ORDER_EXPORT_COLUMNS = (
+    ('order_number', 'order_number'),
+    ('date', 'date'),
+    ('full_name', 'full_name'),
+    ('email', 'email'),
+    ('phone_number', 'phone_number'),
+    ('country', 'country'),
+    ('postcode', 'postcode'),
+    ('town_or_city', 'town_or_city'),
+    ('street_address1', 'street_address1'),
+    ('street_address2', 'street_address2'),
+    ('county', 'county'),
+    ('delivery_cost', 'delivery_cost'),
+    ('order_total', 'order_total'),
+    ('grand_total', 'grand_total'),
+    ('stripe_pid', 'stripe_pid'),
+    ('sku', 'lineitems__product__sku'),
+    ('product', 'lineitems__product__name'),
+    ('size', 'lineitems__product_size'),
+    ('quantity', 'lineitems__quantity'),
+    ('lineitem_total', 'lineitems__lineitem_total'),
+)
+
+
+def export_orders(queryset, fmt):
+    return export_response(
+        queryset.order_by('date', 'pk', 'lineitems__pk'),
+        ORDER_EXPORT_COLUMNS, fmt, 'orders')
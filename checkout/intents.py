@@ -0,0 +1,72 @@
+import hashlib
+import json
+
+from django.conf import settings
+
+import stripe
+
+from .models import Order
+from .stripe_gateway import get_stripe_gateway
+
+# where the current checkout's payment intent is kept
+SESSION_KEY = 'payment_intent'
+
+
+def bag_hash(bag):
+    return hashlib.sha256(
+        json.dumps(bag, sort_keys=True).encode()).hexdigest()
+
+
+def get_payment_intent(request, amount, gateway=None):
+    """
+    Payment intent for the current bag
+        - first visit: create an intent, remember it in the session
+        - reload with the same bag: reuse it, no Stripe call
+        - bag changed: only modify the intent if the amount changed
+        - intent already has an order (checkout or the webhook saved
+          one, even if checkout_success was never reached), or can't
+          be modified (e.g. already paid): new intent
+    Returns the session record: id, client_secret, amount, bag_hash
+    """
+    gateway = gateway or get_stripe_gateway()
+    current_hash = bag_hash(request.session.get('bag', {}))
+    stored = request.session.get(SESSION_KEY)
+
+    # stripe_pid is unique, so this is one index lookup
+    if stored and Order.objects.filter(stripe_pid=stored['id']).exists():
+        stored = None
+
+    if stored and stored['bag_hash'] == current_hash \
+            and stored['amount'] == amount:
+        return stored
+
+    if stored:
+        try:
+            if stored['amount'] != amount:
+                gateway.modify_payment_intent(stored['id'], amount=amount)
+            stored = dict(stored, amount=amount, bag_hash=current_hash)
+            request.session[SESSION_KEY] = stored
+            return stored
+        except stripe.error.InvalidRequestError:
+            # paid, cancelled or unknown intent: start again
+            pass
+
+    intent = gateway.create_payment_intent(
+        amount=amount,
+        currency=settings.STRIPE_CURRENCY,
+    )
+    stored = {
+        'id': intent['id'],
+        'client_secret': intent['client_secret'],
+        'amount': amount,
+        'bag_hash': current_hash,
+    }
+    request.session[SESSION_KEY] = stored
+    return stored
+
+
+def clear_payment_intent(request):
+    """
+    Forget the intent once its order is placed
+    """
+    request.session.pop(SESSION_KEY, None)
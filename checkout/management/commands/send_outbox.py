@@ -0,0 +1,66 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from checkout.outbox import send_pending
+
+logger = logging.getLogger(__name__)
+
+# longest wait between tries while the mail server is down (--loop)
+MAX_BACKOFF = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued emails from the outbox in batches, over one '
+        'mail server connection per batch. Use --loop to keep '
+        'running as a worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-attempts', type=int, default=None)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the outbox instead of exiting '
+                 'once it is empty')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait when the outbox is empty (--loop)')
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        outages = 0
+        while True:
+            try:
+                counts = send_pending(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'])
+            except Exception as e:
+                # mail server unreachable, the batch was released
+                if not options['loop']:
+                    raise CommandError(f'Mail server unavailable: {e}')
+                outages += 1
+                delay = min(options['interval'] * 2 ** outages, MAX_BACKOFF)
+                logger.exception(
+                    'Outbox: mail server unavailable, retrying in %ss', delay)
+                time.sleep(delay)
+                continue
+            outages = 0
+            for key, value in counts.items():
+                totals[key] += value
+
+            if any(counts.values()):
+                # full or partial batch: go straight on to the next
+                self.stdout.write(
+                    f"sent {counts['sent']}, retried {counts['retried']}, "
+                    f"failed {counts['failed']}")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox done: sent {totals['sent']}, "
+            f"retried {totals['retried']}, failed {totals['failed']}"))
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.5 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+def blank_pids_to_null(apps, schema_editor):
+    """
+    Orders without a payment intent used '' as the pid,
+    which would clash under a unique constraint
+    """
+    Order = apps.get_model('checkout', 'Order')
+    Order.objects.filter(stripe_pid='').update(stripe_pid=None)
+
+
+def null_pids_to_blank(apps, schema_editor):
+    Order = apps.get_model('checkout', 'Order')
+    Order.objects.filter(stripe_pid=None).update(stripe_pid='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_auto_20210722_1908'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(blank=True, max_length=254, null=True),
+        ),
+        migrations.RunPython(blank_pids_to_null, null_pids_to_blank),
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(blank=True, max_length=254, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-18 19:29
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_item_summary(apps, schema_editor):
+    """
+    Fill item count and summary for existing orders
+    (same format as Order._build_item_summary)
+    """
+    Order = apps.get_model('checkout', 'Order')
+    OrderLineItem = apps.get_model('checkout', 'OrderLineItem')
+    for order in Order.objects.only('pk').iterator(chunk_size=500):
+        lineitems = OrderLineItem.objects.filter(order_id=order.pk)
+        lines = []
+        for name, size, quantity in lineitems.order_by('pk').values_list(
+                'product__name', 'product_size', 'quantity'):
+            if size:
+                lines.append(f'Size {size.upper()} {name} x{quantity}')
+            else:
+                lines.append(f'{name} x{quantity}')
+        Order.objects.filter(pk=order.pk).update(
+            item_count=lineitems.aggregate(Sum('quantity'))['quantity__sum'] or 0,
+            item_summary='\n'.join(lines),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0006_alter_order_order_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_summary',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_item_summary, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_profile', '-date'], name='checkout_order_history_idx'),
+        ),
+    ]
@@ -1,17 +1,44 @@
 import uuid
 
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Prefetch, Sum
 from django.conf import settings
+from django.dispatch import Signal
 
 from django_countries.fields import CountryField
 
 from products.models import Product
 from profiles.models import UserProfile
 
+# sent by Order.update_total once the new totals are saved
+# (e.g. the reports app updates its sales rollups)
+order_total_updated = Signal()
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Order history queries
+    """
+
+    def with_lineitems(self):
+        """
+        Prefetch line items and their products
+        = 2 extra queries, however many orders and items
+        """
+        return self.prefetch_related(Prefetch(
+            'lineitems',
+            queryset=OrderLineItem.objects.select_related('product')))
+
+    def history_for(self, profile):
+        """
+        A customer's orders, newest first
+        """
+        return self.filter(user_profile=profile).order_by('-date', '-pk')
+
 
 class Order(models.Model):
-    order_number = models.CharField(max_length=32, null=False, editable=False)
+    order_number = models.CharField(max_length=32, null=False, editable=False,
+                                    unique=True)
     user_profile = models.ForeignKey(UserProfile, on_delete=models.SET_NULL,
                                      null=True, blank=True, 
                                      related_name='orders')
@@ -32,7 +59,25 @@ class Order(models.Model):
     grand_total = models.DecimalField(max_digits=10, decimal_places=2,
                                       null=False, default=0)
     original_bag = models.TextField(null=False, blank=False, default='')
-    stripe_pid = models.CharField(max_length=254, null=False, blank=False, default='')
+    # unique, indexed payment intent id
+    # the webhook finds orders by this alone
+    # null (not '') for orders without a payment intent
+    stripe_pid = models.CharField(max_length=254, null=True, blank=True,
+                                  unique=True)
+    # denormalised line item details, kept up to date by update_total
+    # order lists can show them without loading line items
+    item_count = models.IntegerField(null=False, default=0, editable=False)
+    item_summary = models.TextField(null=False, blank=True, default='',
+                                    editable=False)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # profile order history, newest first
+            models.Index(fields=['user_profile', '-date'],
+                         name='checkout_order_history_idx'),
+        ]
 
     def _generate_order_number(self):
         """
@@ -52,8 +97,12 @@ class Order(models.Model):
         # set the order total to that
         # 'or 0' prevents error if line item is manually deleted
         #   order total is '0' not 'none'
-        self.order_total = self.lineitems.aggregate(
-            Sum('lineitem_total'))['lineitem_total__sum'] or 0
+        totals = self.lineitems.aggregate(
+            Sum('lineitem_total'), Sum('quantity'))
+        self.order_total = totals['lineitem_total__sum'] or 0
+        self.item_count = totals['quantity__sum'] or 0
+        self.item_summary = self._build_item_summary()
+
         # calculate the delivery cost
         if self.order_total < settings.FREE_DELIVERY_THRESHOLD:
             self.delivery_cost = self.order_total * settings.STANDARD_DELIVERY_PERCENTAGE / 100
@@ -64,6 +113,20 @@ class Order(models.Model):
         # calculate grand total
         self.grand_total = self.order_total + self.delivery_cost
         self.save()
+        order_total_updated.send(sender=Order, order=self)
+
+    def _build_item_summary(self):
+        """
+        One line per line item, e.g. 'Size M Oxford Shirt x2'
+        """
+        lines = []
+        for name, size, quantity in self.lineitems.order_by('pk').values_list(
+                'product__name', 'product_size', 'quantity'):
+            if size:
+                lines.append(f'Size {size.upper()} {name} x{quantity}')
+            else:
+                lines.append(f'{name} x{quantity}')
+        return '\n'.join(lines)
 
     def save(self, *args, **kwargs):
         """
@@ -119,3 +182,48 @@ class OrderLineItem(models.Model):
     def __str__(self):
         # string to return SKU of the product
         return f'SKU {self.product.sku} on order {self.order.order_number}'
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent
+    Webhooks and views only add a row here,
+    the send_outbox command delivers them in batches
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    # e.g. 'order-confirmation-<order number>'
+    # stops webhook redeliveries queueing the same email twice
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True,
+                                  unique=True)
+    subject = models.CharField(max_length=254, null=False, blank=False)
+    body = models.TextField(null=False, blank=False)
+    from_email = models.EmailField(max_length=254, null=False, blank=False)
+    # comma separated
+    recipients = models.TextField(null=False, blank=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.IntegerField(null=False, default=0)
+    # not picked up again before this time (retry backoff,
+    # or a worker's claim on the row while it sends)
+    next_attempt_at = models.DateTimeField(null=False)
+    last_error = models.TextField(null=False, blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's query: pending rows that are due
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='checkout_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {self.recipients} ({self.status})'
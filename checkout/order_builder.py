@@ -0,0 +1,56 @@
+from django.db import transaction
+
+from .models import OrderLineItem
+from .signals import suppress_total_updates
+from products.models import Product
+
+
+def build_lineitems(order, bag):
+    """
+    Turn a session bag into unsaved line items for an order
+        - all products are fetched in one query
+        - lineitem_total is calculated here, as bulk_create
+          doesn't call OrderLineItem.save()
+        - raises Product.DoesNotExist if a product has gone
+    """
+    products = Product.objects.in_bulk(list(bag.keys()))
+    lineitems = []
+
+    for item_id, item_data in bag.items():
+        product = products.get(int(item_id))
+        if product is None:
+            raise Product.DoesNotExist(
+                f'Product {item_id} in the bag was not found')
+
+        if isinstance(item_data, int):
+            # if product value is integer, there are no sizes
+            sizes = {None: item_data}
+        else:
+            # else, product has sizes
+            sizes = item_data['items_by_size']
+
+        for size, quantity in sizes.items():
+            lineitems.append(OrderLineItem(
+                order=order,
+                product=product,
+                quantity=quantity,
+                product_size=size,
+                lineitem_total=product.price * quantity,
+            ))
+
+    return lineitems
+
+
+def create_order_lineitems(order, bag):
+    """
+    Create every line item for an order and update its totals
+        - one product query, one insert, one total update
+        - runs in a single transaction so a missing product
+          leaves no half-built order behind
+    """
+    with transaction.atomic(), suppress_total_updates():
+        lineitems = build_lineitems(order, bag)
+        OrderLineItem.objects.bulk_create(lineitems)
+        order.update_total()
+
+    return lineitems
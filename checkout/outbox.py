@@ -0,0 +1,131 @@
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def enqueue_email(subject, body, recipients, from_email=None,
+                  dedupe_key=None):
+    """
+    Add an email to the outbox, to be sent by the send_outbox command
+    With a dedupe_key, an email already queued under that key
+    is returned instead of queueing another
+    """
+    fields = {
+        'subject': subject,
+        'body': body,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'recipients': ','.join(recipients),
+        'next_attempt_at': timezone.now(),
+    }
+    if dedupe_key is None:
+        return OutboxEmail.objects.create(**fields)
+    email, _ = OutboxEmail.objects.get_or_create(
+        dedupe_key=dedupe_key, defaults=fields)
+    return email
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: base, 2x base, 4x base ... up to an hour
+    """
+    base = settings.EMAIL_OUTBOX_RETRY_BACKOFF
+    return datetime.timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(batch_size):
+    """
+    Take up to batch_size due emails for this worker
+        - the claim pushes next_attempt_at forward, so other
+          workers skip the rows while they are being sent
+        - a worker that dies leaves them due again after
+          EMAIL_OUTBOX_CLAIM_TIMEOUT seconds
+    """
+    now = timezone.now()
+    claimed_until = now + datetime.timedelta(
+        seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+
+    with transaction.atomic():
+        ids = list(due.order_by('next_attempt_at', 'pk').values_list(
+            'pk', flat=True)[:batch_size])
+        # only rows still due are ours, another worker may
+        # have claimed some since they were read
+        due.filter(pk__in=ids).update(next_attempt_at=claimed_until)
+
+    return list(OutboxEmail.objects.filter(
+        pk__in=ids, next_attempt_at=claimed_until).order_by('pk'))
+
+
+def send_pending(batch_size=None, max_attempts=None, connection=None):
+    """
+    Send one batch of due emails over a single connection
+        - each email is sent on its own, so one bad address
+          doesn't fail the rest of the batch
+        - failures are retried with backoff, and marked failed
+          after max_attempts
+        - if the mail server can't be reached, the emails not yet
+          tried are released (due again, no attempt used up) and
+          the error is raised for the caller to back off
+        - all results are saved with one bulk update
+    Returns counts of sent, retried and failed emails
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    emails = claim_batch(batch_size)
+    if not emails:
+        return counts
+
+    connection = connection or get_connection()
+    untried = list(emails)
+    try:
+        connection.open()
+        while untried:
+            email = untried.pop(0)
+            message = EmailMessage(
+                email.subject, email.body, email.from_email,
+                email.recipients.split(','), connection=connection)
+            email.attempts += 1
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = OutboxEmail.FAILED
+                    counts['failed'] += 1
+                else:
+                    email.next_attempt_at = (
+                        timezone.now() + retry_delay(email.attempts))
+                    counts['retried'] += 1
+                # the connection may be broken, start a fresh one
+                # (if that fails, the rest of the batch is released)
+                connection.close()
+                connection.open()
+            else:
+                email.status = OutboxEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                counts['sent'] += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        # released rows are due again, instead of waiting
+        # out the claim timeout
+        now = timezone.now()
+        for email in untried:
+            email.next_attempt_at = now
+        OutboxEmail.objects.bulk_update(emails, [
+            'status', 'attempts', 'next_attempt_at', 'last_error',
+            'sent_at',
+        ])
+
+    return counts
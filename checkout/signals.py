@@ -1,8 +1,33 @@
+import threading
+from contextlib import contextmanager
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from .models import OrderLineItem
 
+# per-thread flag so bulk operations in one request
+# don't affect line items saved by other threads
+_suppressed = threading.local()
+
+
+@contextmanager
+def suppress_total_updates():
+    """
+    Skip the per-lineitem update_total call while building an order
+    in bulk. The caller must call order.update_total() once afterwards.
+    """
+    previous = getattr(_suppressed, 'active', False)
+    _suppressed.active = True
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+def total_updates_suppressed():
+    return getattr(_suppressed, 'active', False)
+
 
 @receiver(post_save, sender=OrderLineItem)
 def update_on_save(sender, instance, created, **kwargs):
@@ -15,6 +40,8 @@ def update_on_save(sender, instance, created, **kwargs):
 
     Update order total on lineitem update/create
     """
+    if total_updates_suppressed():
+        return
     instance.order.update_total()
 
 
@@ -23,4 +50,6 @@ def update_on_delete(sender, instance, **kwargs):
     """
     Update order total on lineitem update/create
     """
+    if total_updates_suppressed():
+        return
     instance.order.update_total()
@@ -0,0 +1,119 @@
+import itertools
+import threading
+import time
+import uuid
+
+from stripe.error import InvalidRequestError
+
+
+class _FakePaymentIntent:
+    """
+    In-memory stand-in for stripe.PaymentIntent
+    """
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, amount, currency, **kwargs):
+        with self._fake.lock:
+            self._fake.calls.append(('PaymentIntent.create', amount))
+            pid = f'pi_fake{next(self._fake.counter)}'
+            intent = {
+                'id': pid,
+                'object': 'payment_intent',
+                'amount': amount,
+                'currency': currency,
+                'client_secret': f'{pid}_secret_{uuid.uuid4().hex[:16]}',
+                'metadata': dict(kwargs.get('metadata') or {}),
+                'status': 'requires_payment_method',
+            }
+            self._fake.intents[pid] = intent
+            return dict(intent)
+
+    def modify(self, pid, **kwargs):
+        with self._fake.lock:
+            self._fake.calls.append(('PaymentIntent.modify', pid))
+            intent = self._get(pid)
+            if intent['status'] == 'succeeded':
+                raise InvalidRequestError(
+                    'This PaymentIntent has already succeeded', 'intent')
+            metadata = kwargs.pop('metadata', None)
+            if metadata:
+                intent['metadata'].update(metadata)
+            intent.update(kwargs)
+            return dict(intent)
+
+    def retrieve(self, pid, **kwargs):
+        with self._fake.lock:
+            self._fake.calls.append(('PaymentIntent.retrieve', pid))
+            return dict(self._get(pid))
+
+    def _get(self, pid):
+        try:
+            return self._fake.intents[pid]
+        except KeyError:
+            raise InvalidRequestError(f'No such payment_intent: {pid}', 'id')
+
+
+class FakeStripe:
+    """
+    Offline Stripe client for tests and benchmarks
+        - same PaymentIntent.create/modify/retrieve calls as
+          the stripe module, no network
+        - records every call in .calls
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.intents = {}
+        self.calls = []
+        self.PaymentIntent = _FakePaymentIntent(self)
+
+    def succeed(self, pid):
+        """
+        Mark an intent as paid, as if the card was confirmed
+        """
+        with self.lock:
+            self.intents[pid]['status'] = 'succeeded'
+
+
+class FakeStripeBackend:
+    """
+    Gateway backend on top of FakeStripe
+    settings.STRIPE_BACKEND = 'checkout.stripe_fake.FakeStripeBackend'
+        - latency: seconds added to every call
+        - fail_next(n, error): the next n calls raise error,
+          to try out retries and the circuit breaker
+    """
+
+    def __init__(self, timeout=None, latency=0):
+        self.stripe = FakeStripe()
+        self.timeout = timeout
+        self.latency = latency
+        self._failures = []
+        self.idempotency_keys = []
+
+    def fail_next(self, count, error):
+        with self.stripe.lock:
+            self._failures.extend([error] * count)
+
+    def _before_call(self, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.stripe.lock:
+            self.idempotency_keys.append(idempotency_key)
+            if self._failures:
+                raise self._failures.pop(0)
+
+    def create_payment_intent(self, params, idempotency_key=None):
+        self._before_call(idempotency_key)
+        return self.stripe.PaymentIntent.create(**params)
+
+    def modify_payment_intent(self, pid, params, idempotency_key=None):
+        self._before_call(idempotency_key)
+        return self.stripe.PaymentIntent.modify(pid, **params)
+
+    def retrieve_payment_intent(self, pid):
+        self._before_call()
+        return self.stripe.PaymentIntent.retrieve(pid)
@@ -0,0 +1,268 @@
+import random
+import threading
+import time
+import uuid
+from urllib.parse import quote_plus
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+import stripe
+
+from boutique_ado.metrics import external_call
+
+# errors worth another try: network trouble, rate limits, 5xx
+RETRYABLE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+class StripeUnavailable(Exception):
+    """
+    Stripe is failing and the circuit breaker is open,
+    so calls fail straight away instead of waiting on timeouts
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling Stripe after repeated failures
+        - closed: calls go through
+        - open: after failure_threshold failures in a row,
+          calls are refused for reset_timeout seconds
+        - half-open: then a single trial call is let through,
+          success closes the breaker, failure opens it again
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self.clock() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.clock() - self._opened_at < self.reset_timeout:
+                return False
+            # half-open: one trial call at a time
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None \
+                    or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+
+
+class CallMetrics:
+    """
+    Per-call latency and error counts, e.g. for
+    'PaymentIntent.create': count, errors, total and max seconds
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            stats = self._calls.setdefault(name, {
+                'count': 0, 'errors': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0,
+            })
+            stats['count'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._calls.items()}
+
+
+class StripeSDKBackend:
+    """
+    Talks to the Stripe API through the stripe library's public calls
+        - api key and http client passed per request, never
+          the library globals (stripe.api_key, default_http_client)
+        - the library's own retries are left off (its default),
+          the gateway retries with one idempotency key per call
+        - each backend has its own requests client and pooled
+          session, so connections are reused between calls
+    """
+
+    def __init__(self, api_key=None, timeout=None):
+        self.api_key = api_key or settings.STRIPE_SECRET_KEY
+        self.client = stripe.http_client.RequestsClient(
+            **({'timeout': timeout} if timeout else {}))
+
+    def _request(self, method, url, params=None, idempotency_key=None):
+        requestor = stripe.api_requestor.APIRequestor(
+            key=self.api_key, client=self.client)
+        headers = {'Idempotency-Key': idempotency_key} \
+            if idempotency_key else None
+        response, api_key = requestor.request(method, url, params, headers)
+        return stripe.util.convert_to_stripe_object(response, api_key)
+
+    def _intent_url(self, pid):
+        return f'{stripe.PaymentIntent.class_url()}/{quote_plus(pid)}'
+
+    def create_payment_intent(self, params, idempotency_key=None):
+        return self._request(
+            'post', stripe.PaymentIntent.class_url(), params, idempotency_key)
+
+    def modify_payment_intent(self, pid, params, idempotency_key=None):
+        return self._request(
+            'post', self._intent_url(pid), params, idempotency_key)
+
+    def retrieve_payment_intent(self, pid):
+        return self._request('get', self._intent_url(pid))
+
+
+class StripeGateway:
+    """
+    The one place the project calls Stripe from
+        - timeouts (STRIPE_TIMEOUT)
+        - retries with exponential backoff and jitter,
+          reusing one idempotency key per logical call
+        - circuit breaker, so checkout fails fast when
+          Stripe is degraded
+        - latency and error metrics for every call
+    """
+
+    def __init__(self, backend, max_retries=2, backoff=0.25,
+                 breaker=None, metrics=None, sleep=time.sleep):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or CallMetrics()
+        self.sleep = sleep
+
+    def _call(self, name, func, idempotent=True):
+        if not self.breaker.allow():
+            raise StripeUnavailable(
+                f'Stripe circuit breaker is open, {name} not attempted')
+
+        # the whole call, retries included, counts as time in Stripe
+        with external_call('stripe'):
+            return self._call_with_retries(name, func, idempotent)
+
+    def _call_with_retries(self, name, func, idempotent):
+        key = uuid.uuid4().hex if idempotent else None
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = func(key)
+            except RETRYABLE_ERRORS:
+                self.metrics.record(name, time.perf_counter() - start, False)
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                # full jitter: 0..backoff * 2^attempt
+                self.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                attempt += 1
+            except stripe.error.StripeError:
+                # bad request, card error etc: Stripe itself is fine
+                self.metrics.record(name, time.perf_counter() - start, False)
+                self.breaker.record_success()
+                raise
+            else:
+                self.metrics.record(name, time.perf_counter() - start, True)
+                self.breaker.record_success()
+                return result
+
+    def create_payment_intent(self, amount, currency, **params):
+        params = dict(params, amount=amount, currency=currency)
+        return self._call(
+            'PaymentIntent.create',
+            lambda key: self.backend.create_payment_intent(
+                params, idempotency_key=key))
+
+    def modify_payment_intent(self, pid, **params):
+        return self._call(
+            'PaymentIntent.modify',
+            lambda key: self.backend.modify_payment_intent(
+                pid, params, idempotency_key=key))
+
+    def retrieve_payment_intent(self, pid):
+        return self._call(
+            'PaymentIntent.retrieve',
+            lambda key: self.backend.retrieve_payment_intent(pid),
+            idempotent=False)
+
+    def construct_event(self, payload, sig_header, secret):
+        """
+        Verify a webhook signature and parse the event
+        Local only - no API call, no global api key
+        """
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_stripe_gateway():
+    """
+    Shared gateway, built from settings on first use
+        - STRIPE_BACKEND: backend class (dotted path)
+        - STRIPE_TIMEOUT: seconds per call
+        - STRIPE_MAX_RETRIES, STRIPE_RETRY_BACKOFF
+        - STRIPE_BREAKER_THRESHOLD, STRIPE_BREAKER_RESET
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            backend_class = import_string(settings.STRIPE_BACKEND)
+            _gateway = StripeGateway(
+                backend_class(timeout=settings.STRIPE_TIMEOUT),
+                max_retries=settings.STRIPE_MAX_RETRIES,
+                backoff=settings.STRIPE_RETRY_BACKOFF,
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.STRIPE_BREAKER_THRESHOLD,
+                    reset_timeout=settings.STRIPE_BREAKER_RESET),
+            )
+        return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    """
+    Rebuild the gateway when tests override Stripe settings
+    """
+    global _gateway
+    if setting.startswith('STRIPE_'):
+        with _gateway_lock:
+            _gateway = None
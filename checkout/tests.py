@@ -1,3 +1,533 @@
-from django.test import TestCase
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import stripe
+
+from benchmarks.utils import payment_intent_succeeded_event, sign_webhook_payload
+
+from products.models import Product
+from .intents import SESSION_KEY
+from .models import Order, OrderLineItem, OutboxEmail
+from .outbox import enqueue_email, send_pending
+from .stripe_fake import FakeStripeBackend
+from .stripe_gateway import (
+    CircuitBreaker, StripeGateway, StripeSDKBackend, StripeUnavailable,
+    get_stripe_gateway,
+)
+from .order_builder import create_order_lineitems
+
+
+def make_order():
+    return Order.objects.create(
+        full_name='Test User', email='test@example.com',
+        phone_number='0123', country='IE', town_or_city='Dublin',
+        street_address1='1 Main St')
+
+
+class OrderBuilderTest(TestCase):
+    """
+    Line items are created in bulk with one total update
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                sku=f'sku{i}', name=f'Product {i}',
+                description='A product', price=Decimal('10.00'))
+            for i in range(20)
+        ]
+
+    def _bag(self, products):
+        bag = {}
+        for i, product in enumerate(products):
+            if i % 2:
+                bag[str(product.id)] = {'items_by_size': {'s': 1, 'm': 2}}
+            else:
+                bag[str(product.id)] = 2
+        return bag
+
+    def _count_queries(self, bag):
+        order = make_order()
+        with CaptureQueriesContext(connection) as queries:
+            create_order_lineitems(order, bag)
+        return order, len(queries)
+
+    def test_query_count_is_constant(self):
+        _, small = self._count_queries(self._bag(self.products[:1]))
+        order, large = self._count_queries(self._bag(self.products))
+        self.assertEqual(small, large)
+        self.assertEqual(order.lineitems.count(), 30)
+
+    def test_totals(self):
+        order, _ = self._count_queries(self._bag(self.products[:2]))
+        order.refresh_from_db()
+
+        # 2 unsized + 3 sized units at $10, free delivery over $50
+        self.assertEqual(order.order_total, Decimal('50.00'))
+        self.assertEqual(order.delivery_cost, 0)
+        self.assertEqual(order.grand_total, Decimal('50.00'))
+
+    def test_missing_product_rolls_back(self):
+        order = make_order()
+        bag = {str(self.products[0].id): 1, '9999': 1}
+        with self.assertRaises(Product.DoesNotExist):
+            create_order_lineitems(order, bag)
+        self.assertFalse(order.lineitems.exists())
+
+    def test_single_lineitem_save_updates_total(self):
+        order = make_order()
+        OrderLineItem.objects.create(
+            order=order, product=self.products[0], quantity=3)
+        order.refresh_from_db()
+        self.assertEqual(order.order_total, Decimal('30.00'))
+
+
+@override_settings(STRIPE_WH_SECRET='whsec_test')
+class WebhookTest(TestCase):
+    """
+    payment_intent.succeeded finds or creates the order by stripe_pid
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            sku='sku1', name='Product', description='A product',
+            price=Decimal('10.00'))
+        cls.bag = {str(cls.product.id): 2}
+
+    def _deliver(self, pid):
+        payload = json.dumps(
+            payment_intent_succeeded_event(pid, self.bag, 2200))
+        return self.client.post(
+            reverse('webhook'), data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign_webhook_payload(payload, 'whsec_test'))
+
+    def test_existing_order_is_found_by_pid(self):
+        order = make_order()
+        order.stripe_pid = 'pi_existing'
+        order.save()
+
+        response = self._deliver('pi_existing')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'already in database', response.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_missing_order_is_created(self):
+        response = self._deliver('pi_new')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Created order in webhook', response.content)
+
+        order = Order.objects.get(stripe_pid='pi_new')
+        self.assertEqual(order.order_total, Decimal('20.00'))
+
+    def test_redelivery_does_not_duplicate(self):
+        self._deliver('pi_new')
+        self._deliver('pi_new')
+        self.assertEqual(Order.objects.filter(stripe_pid='pi_new').count(), 1)
+
+    def test_confirmation_email_is_queued_once(self):
+        self._deliver('pi_new')
+        self._deliver('pi_new')
+        # nothing sent in the webhook response itself
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.recipients, 'customer@example.com')
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+
+
+@override_settings(STRIPE_BACKEND='checkout.stripe_fake.FakeStripeBackend')
+class PaymentIntentReuseTest(TestCase):
+    """
+    Checkout reloads reuse the session's payment intent
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            sku='sku1', name='Product', description='A product',
+            price=Decimal('10.00'), has_sizes=True)
+
+    def setUp(self):
+        self.stripe = get_stripe_gateway().backend.stripe
+        self.stripe.calls.clear()
+
+    def _set_bag(self, sizes):
+        session = self.client.session
+        session['bag'] = {str(self.product.id): {'items_by_size': sizes}}
+        session.save()
+
+    def _calls(self):
+        return [name for name, _ in self.stripe.calls]
+
+    def test_reload_reuses_intent(self):
+        self._set_bag({'m': 1})
+        first = self.client.get(reverse('checkout')).context['client_secret']
+        second = self.client.get(reverse('checkout')).context['client_secret']
+        self.assertEqual(first, second)
+        self.assertEqual(self._calls(), ['PaymentIntent.create'])
+
+    def test_new_total_modifies_intent(self):
+        self._set_bag({'m': 1})
+        first = self.client.get(reverse('checkout')).context['client_secret']
+        self._set_bag({'m': 2})
+        second = self.client.get(reverse('checkout')).context['client_secret']
+        self.assertEqual(first, second)
+        self.assertEqual(
+            self._calls(), ['PaymentIntent.create', 'PaymentIntent.modify'])
+        pid = first.split('_secret')[0]
+        self.assertEqual(self.stripe.intents[pid]['amount'], 2200)
+
+    def test_same_total_needs_no_call(self):
+        self._set_bag({'m': 1})
+        self.client.get(reverse('checkout'))
+        self._set_bag({'s': 1})
+        self.client.get(reverse('checkout'))
+        self.assertEqual(self._calls(), ['PaymentIntent.create'])
+
+    def test_intent_with_an_order_is_not_reused(self):
+        # paid and saved by the webhook, but checkout_success
+        # was never reached
+        self._set_bag({'m': 1})
+        first = self.client.get(reverse('checkout')).context['client_secret']
+        order = make_order()
+        order.stripe_pid = first.split('_secret')[0]
+        order.save()
+        second = self.client.get(reverse('checkout')).context['client_secret']
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            self._calls(), ['PaymentIntent.create', 'PaymentIntent.create'])
+
+    def test_paid_intent_is_replaced(self):
+        self._set_bag({'m': 1})
+        first = self.client.get(reverse('checkout')).context['client_secret']
+        self.stripe.succeed(first.split('_secret')[0])
+        self._set_bag({'m': 2})
+        second = self.client.get(reverse('checkout')).context['client_secret']
+        self.assertNotEqual(first, second)
+
+    def test_placing_the_order_forgets_the_intent(self):
+        self._set_bag({'m': 1})
+        secret = self.client.get(reverse('checkout')).context['client_secret']
+        self.client.post(reverse('checkout'), {
+            'full_name': 'Test User', 'email': 'test@example.com',
+            'phone_number': '0123', 'country': 'IE', 'postcode': '',
+            'town_or_city': 'Dublin', 'street_address1': '1 Main St',
+            'street_address2': '', 'county': '', 'client_secret': secret,
+        })
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+
+class OrderExportTest(TestCase):
+    """
+    Orders stream out with their line items, in a fixed
+    number of queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            sku='sku1', name='Product', description='A product',
+            price=Decimal('10.00'), has_sizes=True)
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def setUp(self):
+        self.client.login(username='admin', password='pass')
+
+    def _export(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('order_export'), params)
+            content = b''.join(response.streaming_content).decode()
+        return content, len(queries)
+
+    def _order_with_items(self, sizes):
+        order = make_order()
+        create_order_lineitems(
+            order, {str(self.product.id): {'items_by_size': sizes}})
+        return order
+
+    def test_csv_has_a_row_per_line_item(self):
+        order = self._order_with_items({'s': 1, 'm': 2})
+        empty = make_order()
+        content, _ = self._export()
+
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            [(r['order_number'], r['size'], r['quantity']) for r in rows[:2]],
+            [(order.order_number, 's', '1'), (order.order_number, 'm', '2')])
+        self.assertEqual(rows[2]['order_number'], empty.order_number)
+        self.assertEqual(rows[2]['sku'], '')
+
+    def test_queries_do_not_grow_with_orders(self):
+        self._order_with_items({'s': 1})
+        _, few = self._export(format='jsonl')
+        for _ in range(20):
+            self._order_with_items({'s': 1, 'm': 1})
+        content, many = self._export(format='jsonl')
+
+        self.assertEqual(few, many)
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(lines), 41)
+        self.assertEqual(lines[-1]['lineitem_total'], '10.00')
+
+    def test_admin_action(self):
+        order = self._order_with_items({'s': 1})
+        response = self.client.post(
+            reverse('admin:checkout_order_changelist'),
+            {'action': 'export_csv', '_selected_action': [order.pk]})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn(order.order_number, content)
+        self.assertIn('attachment; filename="orders-',
+                      response['Content-Disposition'])
+
+
+class FailingEmailBackend(EmailBackend):
+    """
+    locmem backend that rejects one address
+    and counts the connections it opens
+    """
+    opened = 0
+
+    def open(self):
+        FailingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if 'bad@example.com' in messages[0].to:
+            raise ConnectionError('mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='checkout.tests.FailingEmailBackend',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTest(TestCase):
+    """
+    Queued emails are sent in batches and retried with backoff
+    """
+
+    def setUp(self):
+        FailingEmailBackend.opened = 0
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(3):
+            enqueue_email('Subject', 'Body', [f'customer{i}@example.com'])
+        counts = send_pending()
+        self.assertEqual(counts, {'sent': 3, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(FailingEmailBackend.opened, 1)
+        self.assertFalse(
+            OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        # nothing left to send
+        self.assertEqual(send_pending()['sent'], 0)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        enqueue_email('Subject', 'Body', ['bad@example.com'])
+        enqueue_email('Subject', 'Body', ['good@example.com'])
+
+        counts = send_pending()
+        self.assertEqual(counts, {'sent': 1, 'retried': 1, 'failed': 0})
+        email = OutboxEmail.objects.get(recipients='bad@example.com')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('mailbox unavailable', email.last_error)
+
+        # backing off: not due yet
+        self.assertEqual(send_pending()['retried'], 0)
+
+        OutboxEmail.objects.update(next_attempt_at=email.created)
+        self.assertEqual(send_pending()['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+
+
+class UnreachableEmailBackend(EmailBackend):
+    """
+    locmem backend whose server is down
+    """
+
+    def open(self):
+        raise ConnectionRefusedError('connection refused')
+
+
+@override_settings(EMAIL_BACKEND='checkout.tests.UnreachableEmailBackend')
+class OutboxOutageTest(TestCase):
+    """
+    A mail server outage releases the batch, and the
+    worker backs off instead of crashing
+    """
+
+    def setUp(self):
+        for i in range(3):
+            enqueue_email('Subject', 'Body', [f'customer{i}@example.com'])
+
+    def test_batch_is_released(self):
+        with self.assertRaises(ConnectionRefusedError):
+            send_pending()
+        # due again, no attempts used up
+        self.assertEqual(OutboxEmail.objects.filter(
+            status=OutboxEmail.PENDING, attempts=0,
+            next_attempt_at__lte=timezone.now()).count(), 3)
+
+    def test_loop_backs_off_and_carries_on(self):
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                # the server is back
+                with override_settings(
+                        EMAIL_BACKEND='checkout.tests.FailingEmailBackend'):
+                    send_pending()
+                raise KeyboardInterrupt
+
+        with mock.patch('checkout.management.commands.send_outbox.time.sleep',
+                        sleep), \
+                self.assertLogs('checkout.management.commands.send_outbox'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('send_outbox', loop=True, interval=1,
+                             stdout=StringIO())
+        self.assertEqual(sleeps, [2, 4])
+        self.assertEqual(
+            OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 3)
+
+    def test_without_loop_exits_with_error(self):
+        with self.assertRaises(CommandError):
+            call_command('send_outbox', stdout=StringIO())
+
+
+class StripeSDKBackendTest(TestCase):
+    """
+    The real backend only uses the stripe library's public calls
+    """
+
+    def setUp(self):
+        self.backend = StripeSDKBackend(api_key='sk_test_key', timeout=5)
+        self.gateway = StripeGateway(self.backend, sleep=lambda seconds: None)
+
+    def _respond(self, *results):
+        # the backend's own http client, below the library's requestor
+        return mock.patch.object(self.backend.client, 'request', side_effect=[
+            result if isinstance(result, Exception)
+            else (json.dumps(result), 200, {}) for result in results])
+
+    def test_library_globals_are_left_alone(self):
+        default_client = stripe.default_http_client
+        other = StripeSDKBackend(api_key='sk_test_key', timeout=1)
+        self.assertIsNot(other.client, self.backend.client)
+        self.assertIs(stripe.default_http_client, default_client)
+        self.assertEqual(stripe.max_network_retries, 0)
+
+    def test_retry_reuses_idempotency_key(self):
+        intent = {'id': 'pi_1', 'object': 'payment_intent'}
+        with self._respond(
+                stripe.error.APIConnectionError('down'), intent) as request:
+            result = self.gateway.create_payment_intent(
+                amount=1000, currency='usd')
+        self.assertEqual(result.id, 'pi_1')
+        self.assertIsInstance(result, stripe.PaymentIntent)
+
+        first, second = request.call_args_list
+        method, url, headers, body = first.args
+        self.assertEqual((method, url), (
+            'post', 'https://api.stripe.com/v1/payment_intents'))
+        self.assertEqual(headers['Authorization'], 'Bearer sk_test_key')
+        self.assertIn('amount=1000', body)
+        self.assertEqual(headers['Idempotency-Key'],
+                         second.args[2]['Idempotency-Key'])
+
+    def test_modify_and_retrieve(self):
+        intent = {'id': 'pi_1', 'object': 'payment_intent'}
+        with self._respond(intent, intent) as request:
+            self.gateway.modify_payment_intent('pi_1', amount=500)
+            self.gateway.retrieve_payment_intent('pi_1')
+        modify, retrieve = request.call_args_list
+        self.assertEqual(modify.args[:2], (
+            'post', 'https://api.stripe.com/v1/payment_intents/pi_1'))
+        self.assertIn('amount=500', modify.args[3])
+        self.assertEqual(retrieve.args[:2], (
+            'get', 'https://api.stripe.com/v1/payment_intents/pi_1'))
+
+
+class StripeGatewayTest(TestCase):
+    """
+    Retries, idempotency keys and the circuit breaker
+    """
+
+    def setUp(self):
+        self.now = 0
+        self.backend = FakeStripeBackend()
+        self.gateway = StripeGateway(
+            self.backend, max_retries=2, sleep=lambda seconds: None,
+            breaker=CircuitBreaker(
+                failure_threshold=2, reset_timeout=30,
+                clock=lambda: self.now))
+
+    def _create(self):
+        return self.gateway.create_payment_intent(amount=1000, currency='usd')
+
+    def test_retries_with_one_idempotency_key(self):
+        self.backend.fail_next(2, stripe.error.APIConnectionError('down'))
+        intent = self._create()
+        self.assertEqual(intent['amount'], 1000)
+        # three attempts, all for the same logical call
+        self.assertEqual(len(self.backend.idempotency_keys), 3)
+        self.assertEqual(len(set(self.backend.idempotency_keys)), 1)
+        stats = self.gateway.metrics.snapshot()['PaymentIntent.create']
+        self.assertEqual((stats['count'], stats['errors']), (3, 2))
+
+    def test_request_errors_are_not_retried(self):
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            self.gateway.modify_payment_intent('pi_missing', amount=1)
+        self.assertEqual(len(self.backend.idempotency_keys), 1)
+        self.assertEqual(self.gateway.breaker.state, 'closed')
+
+    def test_breaker_opens_and_recovers(self):
+        self.backend.fail_next(6, stripe.error.APIConnectionError('down'))
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                self._create()
+        self.assertEqual(self.gateway.breaker.state, 'open')
+
+        # open: fails fast, Stripe isn't called
+        calls = len(self.backend.idempotency_keys)
+        with self.assertRaises(StripeUnavailable):
+            self._create()
+        self.assertEqual(len(self.backend.idempotency_keys), calls)
+
+        # after the cooldown a trial call closes it again
+        self.now = 31
+        self._create()
+        self.assertEqual(self.gateway.breaker.state, 'closed')
+
+    @override_settings(
+        STRIPE_BACKEND='checkout.stripe_fake.FakeStripeBackend',
+        STRIPE_BREAKER_THRESHOLD=1, STRIPE_MAX_RETRIES=0)
+    def test_checkout_fails_fast_when_stripe_is_down(self):
+        product = Product.objects.create(
+            sku='sku1', name='Product', description='A product',
+            price=Decimal('10.00'))
+        session = self.client.session
+        session['bag'] = {str(product.id): 1}
+        session.save()
+
+        gateway = get_stripe_gateway()
+        gateway.backend.fail_next(1, stripe.error.APIConnectionError('down'))
+        response = self.client.get(reverse('checkout'))
+        self.assertRedirects(response, reverse('view_bag'))
+        self.assertEqual(gateway.breaker.state, 'open')
@@ -1,15 +1,22 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404, HttpResponse
 from django.views.decorators.http import require_POST
+from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
 
 from .forms import OrderForm
-from .models import Order, OrderLineItem
+from .models import Order
+from .exports import export_orders
+from .order_builder import create_order_lineitems
+from .intents import get_payment_intent, clear_payment_intent
+from .stripe_gateway import get_stripe_gateway, StripeUnavailable
 
 from products.models import Product
 from profiles.models import UserProfile
 from profiles.forms import UserProfileForm
-from bag.contexts import bag_contents
+from bag.summary import get_bag_summary
 
 import stripe
 import json
@@ -26,9 +33,9 @@ def cache_checkout_data(request):
         # payment intent id
         pid = request.POST.get('client_secret').split('_secret')[0]
 
-        # stipe keys is used to modify payment intent
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-        stripe.PaymentIntent.modify(pid, metadata={
+        # add the bag to the payment intent, through the gateway
+        # so the call is timed, retried and circuit-broken
+        get_stripe_gateway().modify_payment_intent(pid, metadata={
             'bag': json.dumps(request.session.get('bag', {})),
             'save_info': request.POST.get('save_info'),
             'username': request.user,
@@ -43,7 +50,6 @@ def cache_checkout_data(request):
 
 def checkout(request):
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe_secret_key = settings.STRIPE_SECRET_KEY
 
     if request.method == 'POST':
         # verify form is submitted
@@ -73,40 +79,27 @@ def checkout(request):
             # dump shopping bag in json string
             order.original_bag = json.dumps(bag)
 
-            # save order
-            order.save()
-
-            # get products
-            for item_id, item_data in bag.items():
-                try:
-                    # get product id out of bag
-                    product = Product.objects.get(id=item_id)
-                    if isinstance(item_data, int):
-                        # if product value is integer, there are no sizes
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    else:
-                        # else, if product has size
-                        for size, quantity in item_data['items_by_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-                except Product.DoesNotExist:
-                    # if product is not found
-                    messages.error(request, (
-                        "One of the products in your bag wasn't found in our database."
-                        "Please call us for assistance!")
-                    )
-                    order.delete()
-                    return redirect(reverse('view_bag'))
+            # save order and create line items in bulk
+            # in one transaction, so the webhook never sees
+            # an order without its line items
+            try:
+                with transaction.atomic():
+                    order.save()
+                    create_order_lineitems(order, bag)
+            except Product.DoesNotExist:
+                # if product is not found
+                messages.error(request, (
+                    "One of the products in your bag wasn't found in our database."
+                    "Please call us for assistance!")
+                )
+                return redirect(reverse('view_bag'))
+            except IntegrityError:
+                # stripe_pid is unique: the webhook has already
+                # created the order for this payment intent
+                order = Order.objects.get(stripe_pid=pid)
+
+            # the intent is used up, the next checkout needs a new one
+            clear_payment_intent(request)
 
             # whether user wants to save produle info to session
             request.session['save_info'] = 'save-info' in request.POST
@@ -125,19 +118,23 @@ def checkout(request):
                            "There is nothing in your bag at the moment")
             return redirect(reverse('products'))
 
-        # get bag dictionary (make sure not to override bag)
-        current_bag = bag_contents(request)
-
-        # get bag total key
-        total = current_bag['grand_total']
+        # get bag total from the request's bag summary
+        # shared with the bag context processor, so the template
+        # doesn't repeat the product lookups or arithmetic
+        total = get_bag_summary(request).grand_total
 
         # x100 and rounded to 0.00 (stripe requires interger)
         stripe_total = round(total * 100)
-        stripe.api_key = stripe_secret_key
-        intent = stripe.PaymentIntent.create(
-            amount=stripe_total,
-            currency=settings.STRIPE_CURRENCY,
-        )
+
+        # reuse this session's intent if the bag hasn't changed
+        # Stripe is only called for a new bag or a new total
+        try:
+            intent = get_payment_intent(request, stripe_total)
+        except (StripeUnavailable, stripe.error.StripeError):
+            # Stripe is down or slow: fail fast, keep the bag
+            messages.error(request, 'Sorry, payments are unavailable \
+                right now. Please try again in a few minutes.')
+            return redirect(reverse('view_bag'))
 
         if request.user.is_authenticated:
             try:
@@ -166,7 +163,7 @@ def checkout(request):
     context = {
         'order_form': order_form,
         'stripe_public_key': stripe_public_key,
-        'client_secret': intent.client_secret,
+        'client_secret': intent['client_secret'],
     }
 
     return render(request, template, context)
@@ -180,7 +177,9 @@ def checkout_success(request, order_number):
     save_info = request.session.get('save_info')
 
     # get order to send to template
-    order = get_object_or_404(Order, order_number=order_number)
+    # line items and products prefetched (constant queries)
+    order = get_object_or_404(
+        Order.objects.with_lineitems(), order_number=order_number)
 
     if request.user.is_authenticated:
         profile = UserProfile.objects.get(user=request.user)
@@ -215,9 +214,34 @@ def checkout_success(request, order_number):
     if 'bag' in request.session:
         del request.session['bag']
 
+    # the next checkout needs a new payment intent
+    clear_payment_intent(request)
+
     template = 'checkout/checkout_success.html'
     context = {
         'order': order,
     }
 
     return render(request, template, context)
+
+
+@login_required
+def order_export(request):
+    """
+    Stream orders with their line items as CSV or JSONL (?format=jsonl)
+    Optionally between dates (?since=2021-07-01&until=2021-07-31)
+    """
+    if not request.user.is_superuser:
+        messages.error(request, 'Sorry, only store owners can do that')
+        return redirect(reverse('home'))
+
+    orders = Order.objects.all()
+    since = parse_date(request.GET.get('since', ''))
+    until = parse_date(request.GET.get('until', ''))
+    if since:
+        orders = orders.filter(date__date__gte=since)
+    if until:
+        orders = orders.filter(date__date__lte=until)
+
+    fmt = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    return export_orders(orders, fmt)
@@ -1,14 +1,14 @@
 from django.http import HttpResponse
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import IntegrityError, transaction
 
-from .models import Order, OrderLineItem
-from products.models import Product
+from .models import Order
+from .order_builder import create_order_lineitems
+from .outbox import enqueue_email
 from profiles.models import UserProfile
 
 import json
-import time
 
 
 class StripeWH_Handler:
@@ -19,7 +19,10 @@ class StripeWH_Handler:
 
     def _send_confirmation_email(self, order):
         """
-        Send the user a confirmation email
+        Queue the user's confirmation email
+            - the send_outbox command delivers it, so a slow
+              mail server doesn't hold up the webhook response
+            - one email per order, however often Stripe redelivers
         """
         cust_email = order.email
         subject = render_to_string(
@@ -29,11 +32,12 @@ class StripeWH_Handler:
             'checkout/confirmation_emails/confirmation_email_body.txt',
             {'order': order, 'contact_email': settings.DEFAULT_FROM_EMAIL})
 
-        send_mail(
+        enqueue_email(
             subject,
             body,
-            settings.DEFAULT_FROM_EMAIL,
-            [cust_email]
+            [cust_email],
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            dedupe_key=f'order-confirmation-{order.order_number}',
         )
 
     def handle_event(self, event):
@@ -64,7 +68,6 @@ class StripeWH_Handler:
         # order information to use:
         billing_details = intent.charges.data[0].billing_details
         shipping_details = intent.shipping
-        grand_total = round(intent.charges.data[0].amount / 100, 2)
 
         # Clean data in the shipping details
         # replace empty strings in shipping details with none
@@ -90,56 +93,23 @@ class StripeWH_Handler:
                 profile.save()
 
         # Check if order exists
+        # stripe_pid is unique and indexed, so this is a single
+        # index lookup and no sleep/retry loop is needed
         # if exists - return response
         # if does not - create it in the webhook
-        order_exists = False
-
-        # introduce delay to order creation
-        # for when it isn't found in
-        attempt = 1
-        while attempt <= 5:
-            try: 
-                # get order info from payment intent
-                # iexact lookup field makes sure it is an exact match
-                order = Order.objects.get(
-                    full_name__iexact=shipping_details.name,
-                    email__iexact=billing_details.email,
-                    phone_number__iexact=shipping_details.phone,
-                    country__iexact=shipping_details.address.country,
-                    postcode__iexact=shipping_details.address.postal_code,
-                    town_or_city__iexact=shipping_details.address.city,
-                    street_address1__iexact=shipping_details.address.line1,
-                    street_address2__iexact=shipping_details.address.line2,
-                    county__iexact=shipping_details.address.state,
-                    grand_total=grand_total,
-                    original_bag=bag,
-                    stripe_pid=pid,
-                )
-
-                # if order is found:
-                order_exists = True
-
-                # if the order is found, break the loop
-                break
-
-            except Order.DoesNotExist:
-
-                # increment attempt by 1
-                attempt += 1
-
-                # python time module to sleep for one second
-                # webhook searchs for order five time in five seconds
-                time.sleep(1)
-
-        if order_exists:
+        order = Order.objects.filter(stripe_pid=pid).first()
+        if order:
             self._send_confirmation_email(order)
             return HttpResponse(
                 content=f'Webhook received: {event["type"]} | SUCCESS: Verified order already in database',
                 status=200)
-        else:
-            order = None
-            try:
-                # creates form to save in webhook to create order
+
+        try:
+            # order and line items are created in one transaction
+            # if the checkout view saves the same payment intent first,
+            # the unique stripe_pid makes this insert fail (or wait for
+            # the view's transaction) instead of creating a duplicate
+            with transaction.atomic():
                 # objects.create useing data from payment intent
                 order = Order.objects.create(
                     full_name=shipping_details.name,
@@ -156,31 +126,19 @@ class StripeWH_Handler:
                     stripe_pid=pid,
                 )
                 # load bag from json verious in payment intent
-                for item_id, item_data in json.loads(bag).items():
-                    # get product id out of bag
-                    product = Product.objects.get(id=item_id)
-                    if isinstance(item_data, int):
-                        # if product value is integer, there are no sizes
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    else:
-                        # else, if product has size
-                        for size, quantity in item_data['items_by_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-            except Exception as e:
-                if order:
-                    order.delete()
-                return HttpResponse(content=f'Webhook received: {event["type"]} | Error: {e}',
+                # and create all line items in bulk
+                create_order_lineitems(order, json.loads(bag))
+        except IntegrityError:
+            # checkout view created the order while we were working
+            order = Order.objects.get(stripe_pid=pid)
+            self._send_confirmation_email(order)
+            return HttpResponse(
+                content=f'Webhook received: {event["type"]} | SUCCESS: Verified order already in database',
+                status=200)
+        except Exception as e:
+            # non-2xx response = Stripe redelivers the event later,
+            # so failures are retried without holding this worker
+            return HttpResponse(content=f'Webhook received: {event["type"]} | Error: {e}',
                 status=500)
 
         self._send_confirmation_email(order)
@@ -6,6 +6,7 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
 from checkout.webhook_handler import StripeWH_Handler
+from checkout.stripe_gateway import get_stripe_gateway
 
 import stripe
 
@@ -16,7 +17,6 @@ def webhook(request):
     """Listen for webhooks from Stripe"""
     # Setup
     wh_secret = settings.STRIPE_WH_SECRET
-    stripe.api_key = settings.STRIPE_SECRET_KEY
 
     # Get the webhook data and verify its signature
     payload = request.body
@@ -24,7 +24,7 @@ def webhook(request):
     event = None
 
     try:
-        event = stripe.Webhook.construct_event(
+        event = get_stripe_gateway().construct_event(
             payload, sig_header, wh_secret
         )
     except ValueError as e:
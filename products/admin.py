@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Product, Category
+from .exports import export_products
 
 # Extend built-in model admin class to view on /admin/.
 
@@ -14,11 +15,24 @@ class ProductAdmin(admin.ModelAdmin):
         'image',
     )
 
+    # join category for the list column (no query per row)
+    list_select_related = ('category',)
+
     ordering = ('sku',)
     # sort products by 'sku'
     # reverse it using -'sku'
     # comma needed for tuple
-    
+
+    actions = ('export_csv', 'export_jsonl')
+
+    # streamed downloads of the selected products
+    @admin.action(description='Export selected products as CSV')
+    def export_csv(self, request, queryset):
+        return export_products(queryset, 'csv')
+
+    @admin.action(description='Export selected products as JSONL')
+    def export_jsonl(self, request, queryset):
+        return export_products(queryset, 'jsonl')
 
 
 class CategoryAdmin(admin.ModelAdmin):
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        """
+        Import signals module so product saves and deletes
+        keep the search index up to date
+        """
+        import products.signals
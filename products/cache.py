@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+CATEGORY_CHOICES_KEY = 'products:category_choices'
+
+
+def get_category_choices():
+    """
+    (id, friendly name) pairs for the product form's category field
+    Cached per catalogue version, so a category change in any
+    worker refreshes them everywhere
+    """
+    key = f'{CATEGORY_CHOICES_KEY}:{get_catalogue_version()}'
+    choices = cache.get(key)
+    if choices is None:
+        # list comprehension for loop to get friendly names
+        choices = [(c.id, c.get_friendly_name())
+                   for c in Category.objects.all()]
+        cache.set(key, choices, settings.PRODUCTS_PAGE_CACHE_TIMEOUT)
+    return choices
+
+
+# never expires, see get_catalogue_version
+CATALOGUE_VERSION_KEY = 'products:catalogue_version'
+
+
+def _clock_version():
+    # milliseconds: above any version counted up before
+    # from an earlier start, unless bumped faster than that
+    return int(time.time() * 1000)
+
+
+def get_catalogue_version():
+    """
+    Current catalogue version number
+        - part of every products page cache key
+        - bumped on any product or category change, so
+          stale pages are never served (old keys just expire)
+        - a counter in the shared cache (memcached in production),
+          so reading it is no query and bumping it locks no row;
+          LocMemCache is per process, so for runserver only
+        - if evicted it restarts from the clock, above the
+          versions of any pages still cached
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        version = _clock_version()
+        # add, not set: another worker may have just started it
+        if not cache.add(CATALOGUE_VERSION_KEY, version, None):
+            version = cache.get(CATALOGUE_VERSION_KEY, version)
+    return version
+
+
+def _incr_catalogue_version():
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        # evicted: restarting from the clock moves it on anyway
+        get_catalogue_version()
+
+
+def bump_catalogue_version():
+    """
+    Move the catalogue to a new version
+        - now, so this request's own later reads see the change
+        - again on commit: until then other workers still read
+          the old rows, and may have cached them as the new version
+    """
+    _incr_catalogue_version()
+    transaction.on_commit(_incr_catalogue_version)
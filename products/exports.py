@@ -0,0 +1,20 @@
+from boutique_ado.exports import export_response
+
+# (header, lookup), headers match the import_products fields
+# so an export can be imported again
+PRODUCT_EXPORT_COLUMNS = (
+    ('sku', 'sku'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('category', 'category__name'),
+    ('price', 'price'),
+    ('rating', 'rating'),
+    ('has_sizes', 'has_sizes'),
+    ('image_url', 'image_url'),
+    ('image', 'image'),
+)
+
+
+def export_products(queryset, fmt):
+    return export_response(
+        queryset.order_by('pk'), PRODUCT_EXPORT_COLUMNS, fmt, 'products')
@@ -1,6 +1,7 @@
 from django import forms
 from .widgets import CustomClearableFileInput
-from .models import Product, Category
+from .models import Product
+from .cache import get_category_choices
 
 
 class ProductForm(forms.ModelForm):
@@ -22,9 +23,8 @@ class ProductForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         # get cateogries to show in their friendly name
-        categories = Category.objects.all()
-        # list comprehension for loop to get friendly names
-        friendly_names = [(c.id, c.get_friendly_name()) for c in categories]
+        # cached list, refreshed when categories change
+        friendly_names = get_category_choices()
 
         # use category friendly name instead of id
         self.fields['category'].choices = friendly_names
@@ -0,0 +1,123 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps
+
+# Pillow format name, file extension, save options
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True,
+                             'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def derivative_name(source_name, width, fmt):
+    """
+    e.g. 'derivatives/0900631B8140782DM-320w.webp'
+    """
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return f'derivatives/{stem}-{width}w.{FORMATS[fmt][1]}'
+
+
+def build_derivatives(source_name, storage=None):
+    """
+    Resize one image to each width in settings.PRODUCT_IMAGE_WIDTHS,
+    as JPEG and WebP
+        - never upscaled: widths over the original are skipped,
+          the original width is always included
+        - only touches storage, not the database, so it can
+          run in a worker process
+    Returns the image's dimensions and a list of its derivatives
+    """
+    storage = storage or default_storage
+    with storage.open(source_name) as source_file:
+        image = Image.open(source_file)
+        # camera photos can be stored sideways with an exif flag
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    width, height = image.size
+    widths = sorted({w for w in settings.PRODUCT_IMAGE_WIDTHS if w < width}
+                    | {width})
+
+    sizes = []
+    for target_width in widths:
+        target_height = max(1, round(height * target_width / width))
+        resized = image if target_width == width else image.resize(
+            (target_width, target_height), Image.LANCZOS)
+        for fmt, (pil_format, _, options) in FORMATS.items():
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode != 'RGB':
+                frame = frame.convert('RGB')
+            buffer = BytesIO()
+            frame.save(buffer, pil_format, **options)
+
+            # stored under its content hash, old copies are
+            # left to the sweep_media command
+            name = derivative_name(source_name, target_width, fmt)
+            name = storage.save(name, ContentFile(buffer.getvalue()))
+            sizes.append({
+                'format': fmt,
+                'width': target_width,
+                'height': target_height,
+                'name': name,
+            })
+
+    return {
+        'source': source_name,
+        'width': width,
+        'height': height,
+        'sizes': sizes,
+    }
+
+
+def refresh_product_images(product):
+    """
+    Rebuild a product's derivatives after its image changes
+    Saved with update(), so product save signals don't fire again
+    """
+    # imported here: backfill worker processes load this module
+    # before django.setup(), when models can't be imported yet
+    from .cache import bump_catalogue_version
+    from .models import Product
+
+    data = {}
+    if product.image:
+        data = build_derivatives(product.image.name)
+    Product.objects.filter(pk=product.pk).update(image_derivatives=data)
+    product.image_derivatives = data
+    # pages cached before the derivatives existed use the full image
+    bump_catalogue_version()
+    return data
+
+
+def derivatives_are_current(product):
+    return bool(product.image) and \
+        product.image_derivatives.get('source') == product.image.name
+
+
+def init_worker():
+    """
+    Process pool initializer for the backfill command
+    Needed where workers are spawned rather than forked
+    """
+    import django
+    django.setup()
+
+
+def build_in_worker(source_name):
+    """
+    build_derivatives for a process pool
+    Errors are returned, so one bad file doesn't stop the backfill
+    """
+    try:
+        return source_name, build_derivatives(source_name), None
+    except Exception as e:
+        return source_name, None, f'{type(e).__name__}: {e}'
@@ -0,0 +1,307 @@
+import csv
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .cache import bump_catalogue_version
+from .models import Product, Category
+from .search import get_search_backend
+
+# product fields a feed can set, sku is the key
+IMPORT_FIELDS = (
+    'name', 'description', 'price', 'rating', 'has_sizes',
+    'image_url', 'image', 'category',
+)
+READ_SIZE = 64 * 1024
+# a JSON object still unparsed at this size is taken as malformed,
+# rather than reading the rest of the feed into the buffer
+MAX_RECORD_SIZE = 1024 * 1024
+# row errors kept for the report, the rest are only counted
+MAX_ERRORS = 100
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def iter_json_array(stream):
+    """
+    Yield the objects of a JSON array one at a time,
+    reading the file in blocks instead of loading it whole
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        # skip the array's opening bracket and the commas
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise ValueError('Expected a JSON array')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith(']'):
+            return
+
+        if buffer:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # object cut off at the end of the block
+                if eof or len(buffer) > MAX_RECORD_SIZE:
+                    raise
+            else:
+                yield record
+                buffer = buffer[end:]
+                continue
+
+        if eof:
+            if started:
+                raise ValueError('Unterminated JSON array')
+            return
+        block = stream.read(READ_SIZE)
+        eof = not block
+        buffer += block
+
+
+def iter_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+READERS = {
+    'json': iter_json_array,
+    'jsonl': iter_jsonl,
+    'csv': iter_csv,
+}
+
+
+def detect_format(path):
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension in READERS:
+        return extension
+    raise ValueError(f'Unknown feed format for {path}, use --format')
+
+
+def _none_if_blank(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in ('', None) else value
+
+
+def _decimal(value, field):
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ImportRowError(f'{field} is not a number: {value!r}')
+
+
+def _clean(model, field, value):
+    # the model field's own checks: lengths, digits, urls
+    try:
+        return model._meta.get_field(field).clean(value, None)
+    except ValidationError as e:
+        raise ImportRowError(f"{field}: {' '.join(e.messages)}")
+
+
+def _category(value):
+    # ids come from fixtures as numbers, from csv as digit strings
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if isinstance(value, str):
+        return _clean(Category, 'name', value)
+    return value
+
+
+def normalise_record(record):
+    """
+    Feed record -> (sku, {field: value}) for the fields it has
+    Accepts flat records and loaddata fixture records ('fields')
+    Values are checked against the model fields, so a bad row
+    is skipped instead of failing the batch's bulk write
+    """
+    if 'fields' in record:
+        record = record['fields']
+
+    sku = _none_if_blank(record.get('sku'))
+    if sku is None:
+        raise ImportRowError('sku is required')
+    sku = _clean(Product, 'sku', str(sku))
+
+    values = {}
+    for field in IMPORT_FIELDS:
+        if field not in record:
+            continue
+        value = _none_if_blank(record[field])
+        if field == 'price':
+            if value is None:
+                raise ImportRowError('price is required')
+            value = _decimal(value, field)
+        elif field == 'rating' and value is not None:
+            value = _decimal(value, field)
+        elif field == 'has_sizes':
+            if isinstance(value, str):
+                value = value.lower() in ('1', 'true', 'yes', 'y')
+            else:
+                value = bool(value)
+        elif field in ('name', 'description') and value is None:
+            raise ImportRowError(f'{field} is required')
+        if field == 'category':
+            value = _category(value)
+        elif value is not None:
+            value = _clean(Product, field, value)
+        values[field] = value
+    return sku, values
+
+
+class ProductImporter:
+    """
+    Upsert products from a feed, keyed on sku
+        - records are read as a stream and handled in batches,
+          so memory use doesn't grow with the feed
+        - each batch: one query for existing skus, then one
+          bulk_create and one bulk_update, in a transaction
+        - unchanged products aren't written
+        - categories are matched by name (numbers are ids),
+          unknown names are created
+        - bulk writes skip the product signals, so the search
+          index and page cache are refreshed once at the end
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0,
+                       'skipped': 0}
+        self.errors = []
+        self.rows = 0
+        self.elapsed = 0
+        self._categories = dict(
+            Category.objects.values_list('name', 'id'))
+        self._category_ids = set(self._categories.values())
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def _category_id(self, value):
+        if value is None:
+            return None
+        if isinstance(value, int):
+            if value not in self._category_ids:
+                raise ImportRowError(f'no category with id {value}')
+            return value
+        if value not in self._categories:
+            category = Category.objects.create(
+                name=value,
+                friendly_name=value.replace('_', ' ').title())
+            self._categories[value] = category.id
+            self._category_ids.add(category.id)
+        return self._categories[value]
+
+    def _skip(self, error):
+        self.counts['skipped'] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(error)
+
+    def _current(self, product, field):
+        value = getattr(product, field)
+        if field == 'image':
+            # compare the stored file name, '' and None alike
+            return value.name or None
+        return value
+
+    def run(self, records, progress=None):
+        start = time.perf_counter()
+        records = iter(records)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch)
+            self.elapsed = time.perf_counter() - start
+            if progress:
+                progress(self)
+
+        # bulk writes skip the product signals
+        get_search_backend().rebuild()
+        bump_catalogue_version()
+        self.elapsed = time.perf_counter() - start
+        return self.counts
+
+    def _import_batch(self, batch):
+        # last record wins if a sku appears twice in a batch
+        rows = {}
+        for record in batch:
+            self.rows += 1
+            try:
+                sku, values = normalise_record(record)
+                if 'category' in values:
+                    values['category_id'] = self._category_id(
+                        values.pop('category'))
+            except (ImportRowError, AttributeError, TypeError) as e:
+                self._skip(f'row {self.rows}: {e}')
+                continue
+            rows[sku] = values
+
+        with transaction.atomic():
+            existing = Product.objects.in_bulk(
+                list(rows), field_name='sku')
+            to_create = []
+            to_update = []
+            update_fields = set()
+            for sku, values in rows.items():
+                product = existing.get(sku)
+                if product is None:
+                    if 'name' not in values or 'price' not in values:
+                        self._skip(
+                            f'sku {sku}: new products need a name and price')
+                        continue
+                    values.setdefault('description', '')
+                    to_create.append(Product(sku=sku, **values))
+                    continue
+
+                changed = [field for field, value in values.items()
+                           if self._current(product, field) != value]
+                if not changed:
+                    self.counts['unchanged'] += 1
+                    continue
+                for field in changed:
+                    setattr(product, field, values[field])
+                update_fields.update(changed)
+                to_update.append(product)
+
+            Product.objects.bulk_create(to_create)
+            if to_update:
+                Product.objects.bulk_update(
+                    to_update, sorted(update_fields))
+
+        self.counts['created'] += len(to_create)
+        self.counts['updated'] += len(to_update)
+
+
+def open_feed(path):
+    """
+    Text stream for a feed path, '-' for stdin
+    """
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, encoding='utf-8', newline='')
@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.cache import bump_catalogue_version
+from products.images import (
+    build_in_worker, derivatives_are_current, init_worker,
+)
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Make the resized JPEG/WebP copies of product images that '
+        'are missing or out of date, in parallel worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Worker processes (default: one per CPU)')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild every image, not only missing ones')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(
+            image__isnull=True).only('pk', 'image', 'image_derivatives')
+
+        # products sharing an image file only need it resized once
+        by_image = {}
+        for product in products.iterator():
+            if options['force'] or not derivatives_are_current(product):
+                by_image.setdefault(product.image.name, []).append(product)
+
+        if not by_image:
+            self.stdout.write(self.style.SUCCESS(
+                'All product images are up to date'))
+            return
+
+        # forked workers must not share the parent's db connection
+        connections.close_all()
+
+        start = time.perf_counter()
+        updated = []
+        errors = []
+        workers = max(1, options['workers'])
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=init_worker) as executor:
+            chunksize = max(1, len(by_image) // (workers * 4))
+            for name, data, error in executor.map(
+                    build_in_worker, list(by_image), chunksize=chunksize):
+                if error:
+                    errors.append(f'{name}: {error}')
+                    continue
+                for product in by_image[name]:
+                    product.image_derivatives = data
+                    updated.append(product)
+        elapsed = time.perf_counter() - start
+
+        # one bulk update, then one catalogue bump for the cached pages
+        Product.objects.bulk_update(
+            updated, ['image_derivatives'], batch_size=500)
+        bump_catalogue_version()
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resized {len(by_image) - len(errors)} images for '
+            f'{len(updated)} products in {elapsed:.1f}s '
+            f'({len(by_image) / elapsed:.1f} images/s, {workers} workers), '
+            f'{len(errors)} failed'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import (
+    READERS, ProductImporter, detect_format, open_feed,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a JSON array, JSONL or CSV feed, '
+        'creating or updating them by sku. Category names are '
+        'matched (and created if new). Run build_image_derivatives '
+        'afterwards for new images.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' for stdin")
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Feed format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            fmt = options['format'] or detect_format(options['path'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        importer = ProductImporter(batch_size=options['batch_size'])
+        verbose = options['verbosity'] > 1
+
+        def progress(importer):
+            if verbose:
+                self.stdout.write(
+                    f'{importer.rows} rows, {importer.rate:.0f} rows/s')
+
+        try:
+            with open_feed(options['path']) as stream:
+                counts = importer.run(READERS[fmt](stream), progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Import stopped after {importer.rows} rows: {e}')
+
+        for error in importer.errors[:20]:
+            self.stderr.write(error)
+        if counts['skipped'] > 20:
+            self.stderr.write(f"... and {counts['skipped'] - 20} more")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.rows} rows in {importer.elapsed:.1f}s "
+            f"({importer.rate:.0f} rows/s): {counts['created']} created, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+            f"{counts['skipped']} skipped"))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from products.storage import sweep_unused_media
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete uploaded images and resized copies that no product '
+        'uses any more. Run it periodically, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Keep files stored or reused in the last GRACE seconds '
+                 '(default MEDIA_SWEEP_GRACE_SECONDS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List the files without deleting them')
+
+    def handle(self, *args, **options):
+        grace = options['grace']
+        if grace is None:
+            grace = settings.MEDIA_SWEEP_GRACE_SECONDS
+        deleted = sweep_unused_media(
+            default_storage, grace, dry_run=options['dry_run'])
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(deleted)} unused media files'))
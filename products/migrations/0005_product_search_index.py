@@ -0,0 +1,48 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:00
+
+from django.db import migrations
+
+# kept in step with products.search.POSTGRES_SEARCH_VECTOR
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Full-text index for the database in use
+        - postgres: GIN index on the weighted tsvector
+        - sqlite: FTS5 table filled from existing products
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX products_product_search_gin ON products_product '
+            f'USING gin (({POSTGRES_SEARCH_VECTOR}))')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE products_product_fts USING fts5('
+            "name, description, tokenize = 'porter unicode61')")
+        schema_editor.execute(
+            'INSERT INTO products_product_fts (rowid, name, description) '
+            'SELECT id, name, description FROM products_product')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS products_product_search_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_auto_20261018_1924'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
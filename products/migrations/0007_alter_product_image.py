@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.5 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    """
+    The single row products.cache bumps
+    """
+    CatalogueVersion = apps.get_model('products', 'CatalogueVersion')
+    CatalogueVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
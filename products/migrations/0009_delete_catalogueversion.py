@@ -0,0 +1,16 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_catalogueversion'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CatalogueVersion',
+        ),
+    ]
@@ -7,7 +7,8 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
         # Change name in /admin/ page from Django default
 
-    name = models.CharField(max_length=254)
+    # unique + indexed, used by the ?category= filter
+    name = models.CharField(max_length=254, unique=True)
     friendly_name = models.CharField(max_length=254, null=True, blank=True)
 
     def __str__(self):
@@ -20,14 +21,23 @@ class Category(models.Model):
 
 class Product(models.Model):
     category = models.ForeignKey('Category', null=True, blank=True, on_delete=models.SET_NULL)
-    sku = models.CharField(max_length=254, null=True, blank=True)
+    # unique + indexed, used for admin ordering
+    # null (no sku) is allowed for any number of products
+    sku = models.CharField(max_length=254, null=True, blank=True, unique=True)
     name = models.CharField(max_length=254)
     description = models.TextField()
     has_sizes = models.BooleanField(default=False, null=True, blank=True)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     rating = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     image_url = models.URLField(max_length=1024, null=True, blank=True)
-    image = models.ImageField(null=True, blank=True)
+    # indexed: deduplicated files are shared, so products
+    # are looked up by file name
+    image = models.ImageField(null=True, blank=True, db_index=True)
+    # resized JPEG/WebP copies of image and their dimensions,
+    # made by products.images when the image is uploaded
+    image_derivatives = models.JSONField(default=dict, blank=True,
+                                         editable=False)
 
     def __str__(self):
         return self.name
+
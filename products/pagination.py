@@ -0,0 +1,258 @@
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+
+# GET parameters that hold page cursors
+CURSOR_PARAMS = ('after', 'before')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_url(request, keep=None, **cursor):
+    """
+    Url for another page of the current listing,
+    e.g. page_url(request, after=page.next_cursor)
+    None if there is no such page
+    keep limits the other GET parameters carried over
+    """
+    name, value = next(iter(cursor.items()))
+    if value is None:
+        return None
+    params = request.GET.copy()
+    for key in list(params):
+        if key in CURSOR_PARAMS or (keep is not None and key not in keep):
+            del params[key]
+    params[name] = value
+    return f'{request.path}?{params.urlencode()}'
+
+
+def _jsonable(value):
+    # decimals and dates go as strings, the ORM parses them back
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """
+    Pack the sort values of a row into a url-safe string
+    """
+    data = json.dumps([_jsonable(v) for v in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields=None):
+    """
+    Sort values from a cursor
+    With the model fields they sort on, the values are checked
+    against them, so a tampered cursor is an InvalidCursor
+    rather than a database error
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    if fields is None:
+        return values
+    if len(values) != len(fields):
+        raise InvalidCursor(cursor)
+    try:
+        return [_to_python(field, value)
+                for field, value in zip(fields, values)]
+    except (ValidationError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def _to_python(field, value):
+    if value is None:
+        return None
+    # encode_cursor only ever writes numbers, strings and booleans
+    if isinstance(value, (list, dict)):
+        raise TypeError(value)
+    return field.to_python(value)
+
+
+def _sort_field(queryset, path):
+    """
+    The model field (or annotation's output field)
+    a 'category__name' style ordering path sorts on
+    """
+    if path in queryset.query.annotations:
+        return queryset.query.annotations[path].output_field
+    model = queryset.model
+    *related, name = path.split('__')
+    for attr in related:
+        model = model._meta.get_field(attr).related_model
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def _value(obj, field):
+    # follow 'category__name' style paths through related objects
+    for attr in field.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, attr)
+    return obj
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) pagination
+        - pages start after/before the sort values of a row,
+          so deep pages don't need OFFSET scans
+        - ordering is a list of (field, descending) pairs,
+          'pk' is always added as the tie-breaker
+        - NULLs sort last in both directions, on every database
+        - count is a separate query, cached if given a cache key
+    """
+
+    def __init__(self, queryset, ordering, per_page,
+                 count_cache_key=None, count_timeout=300):
+        self.queryset = queryset
+        self.ordering = [o for o in ordering if o[0] != 'pk']
+        # tie-breaker follows the direction of the last sort key
+        last_desc = ordering[-1][1] if ordering else False
+        self.ordering.append(('pk', last_desc))
+        self.per_page = per_page
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return self.queryset.order_by().count()
+        return cache.get_or_set(
+            self.count_cache_key,
+            lambda: self.queryset.order_by().count(),
+            self.count_timeout)
+
+    def _order_by(self, reverse):
+        expressions = []
+        for field, desc in self.ordering:
+            if desc != reverse:
+                expressions.append(F(field).desc(
+                    nulls_last=not reverse, nulls_first=reverse))
+            else:
+                expressions.append(F(field).asc(
+                    nulls_last=not reverse, nulls_first=reverse))
+        return expressions
+
+    def _seek(self, values, reverse):
+        """
+        Filter for rows after the cursor values
+        (before them, if reverse)
+        """
+        condition = Q()
+        equal = Q()
+        for (field, desc), value in zip(self.ordering, values):
+            if value is None:
+                # NULLs are last: nothing comes after a NULL,
+                # every non-NULL value comes before one
+                if reverse:
+                    condition |= equal & Q(**{f'{field}__isnull': False})
+                equal &= Q(**{f'{field}__isnull': True})
+            else:
+                lookup = 'lt' if desc != reverse else 'gt'
+                beyond = Q(**{f'{field}__{lookup}': value})
+                if not reverse:
+                    beyond |= Q(**{f'{field}__isnull': True})
+                condition |= equal & beyond
+                equal &= Q(**{field: value})
+        return condition
+
+    def page(self, after=None, before=None):
+        """
+        Return the page after (or before) the given cursor
+        An invalid cursor gives the first page
+        """
+        reverse = before is not None and after is None
+        cursor = before if reverse else after
+        queryset = self.queryset
+        if cursor:
+            try:
+                fields = [_sort_field(queryset, field)
+                          for field, _ in self.ordering]
+                queryset = queryset.filter(
+                    self._seek(decode_cursor(cursor, fields), reverse))
+            except InvalidCursor:
+                cursor = None
+                reverse = False
+        queryset = queryset.order_by(*self._order_by(reverse))
+        return KeysetPage(self, queryset, cursor, reverse)
+
+
+class KeysetPage:
+    """
+    One page of results
+    Rows are only fetched when the page is first read
+    """
+
+    def __init__(self, paginator, queryset, cursor, reverse):
+        self.paginator = paginator
+        self.queryset = queryset
+        self.cursor = cursor
+        self.reverse = reverse
+
+    @cached_property
+    def _rows(self):
+        # one extra row tells us if there is a further page
+        rows = list(self.queryset[:self.paginator.per_page + 1])
+        more = len(rows) > self.paginator.per_page
+        rows = rows[:self.paginator.per_page]
+        if self.reverse:
+            rows.reverse()
+        return rows, more
+
+    @property
+    def object_list(self):
+        return self._rows[0]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        if self.reverse:
+            return self.cursor is not None
+        return self._rows[1]
+
+    @property
+    def has_previous(self):
+        if self.reverse:
+            return self._rows[1]
+        return self.cursor is not None
+
+    def _cursor_for(self, obj):
+        return encode_cursor(
+            [_value(obj, field) for field, _ in self.paginator.ordering])
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return self._cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return self._cursor_for(self.object_list[0])
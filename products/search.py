@@ -0,0 +1,258 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+# weighted document used by the postgres backend
+# the GIN index in migration 0005 is built on this exact expression
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({table}name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({table}description, '')), 'B')"
+)
+
+SQLITE_FTS_TABLE = 'products_product_fts'
+
+# name matches count for more than description matches
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class BaseSearchBackend:
+    """
+    Full-text search over product name and description
+        - search() filters a product queryset to the matches
+          and annotates it with 'search_rank' (higher = better)
+        - index_product()/remove_product() keep the index in sync,
+          called from the product save/delete signals
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def no_results(self, queryset):
+        # still annotated, so callers can order by search_rank
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())).none()
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Postgres tsvector search, served by a GIN expression index
+    The index is on the table itself, so no syncing is needed
+    """
+
+    def search(self, queryset, query):
+        vector = POSTGRES_SEARCH_VECTOR.format(table='"products_product".')
+        tsquery = "plainto_tsquery('english', %s)"
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"ts_rank({vector}, {tsquery})", [query],
+                output_field=FloatField()),
+        ).filter(
+            id__in=RawSQL(
+                f'SELECT "products_product"."id" FROM "products_product" '
+                f'WHERE ({vector}) @@ {tsquery}', [query]),
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 search
+        - products are copied into an FTS5 virtual table
+          (rowid = product id), created in migration 0005
+        - bm25 ranking, with name weighted over description
+    """
+
+    def _match_expression(self, query):
+        # quote every term so user input can't use FTS syntax
+        # trailing * = prefix match ('jean' finds 'jeans')
+        terms = tokenize(query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        match = self._match_expression(query)
+        if not match:
+            return self.no_results(queryset)
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({SQLITE_FTS_TABLE}, %s, %s) '
+                f'FROM {SQLITE_FTS_TABLE} '
+                f'WHERE {SQLITE_FTS_TABLE} MATCH %s '
+                f'AND rowid = "products_product"."id"',
+                [NAME_WEIGHT, DESCRIPTION_WEIGHT, match],
+                output_field=FloatField()),
+        ).filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+                f'WHERE {SQLITE_FTS_TABLE} MATCH %s', [match]),
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s',
+                [product.pk])
+            cursor.execute(
+                f'INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, description) '
+                f'VALUES (%s, %s, %s)',
+                [product.pk, product.name, product.description])
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s',
+                [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, description) '
+                f'SELECT id, name, description FROM products_product')
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    Pure-Python inverted index, for tests and other databases
+        - built from the database on first search
+        - every query term must match (prefix match on tokens)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._documents = {}
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._postings is None:
+                self._postings = {}
+                self._documents = {}
+                for product_id, name, description in Product.objects.values_list(
+                        'id', 'name', 'description').iterator():
+                    self._add(product_id, name, description)
+                self._tokens = sorted(self._postings)
+
+    def _add(self, product_id, name, description):
+        weights = {}
+        for token in tokenize(name):
+            weights[token] = weights.get(token, 0) + NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        self._documents[product_id] = weights
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[product_id] = weight
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, {}):
+            postings = self._postings.get(token, {})
+            postings.pop(product_id, None)
+            if not postings:
+                self._postings.pop(token, None)
+
+    def _matches(self, term):
+        # every indexed token starting with term
+        scores = {}
+        start = bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            for product_id, weight in self._postings.get(token, {}).items():
+                scores[product_id] = scores.get(product_id, 0) + weight
+        return scores
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return self.no_results(queryset)
+
+        self._ensure_built()
+        with self._lock:
+            scores = None
+            for term in terms:
+                matches = self._matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        product_id: score + matches[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in matches
+                    }
+
+        if not scores:
+            return self.no_results(queryset)
+        return queryset.filter(id__in=scores.keys()).annotate(
+            search_rank=Case(
+                *[When(id=product_id, then=Value(float(score)))
+                  for product_id, score in scores.items()],
+                output_field=FloatField()),
+        )
+
+    def index_product(self, product):
+        if self._postings is None:
+            return
+        with self._lock:
+            self._remove(product.pk)
+            self._add(product.pk, product.name, product.description)
+            self._tokens = sorted(self._postings)
+
+    def remove_product(self, product_id):
+        if self._postings is None:
+            return
+        with self._lock:
+            self._remove(product_id)
+            self._tokens = sorted(self._postings)
+
+    def rebuild(self):
+        with self._lock:
+            self._postings = None
+        self._ensure_built()
+
+
+DEFAULT_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSBackend,
+}
+
+_backends = {}
+
+
+def get_search_backend():
+    """
+    Return the product search backend
+        - settings.PRODUCT_SEARCH_BACKEND (dotted path) if set
+        - otherwise picked from the database in use
+    """
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    key = path or connection.vendor
+    if key not in _backends:
+        if path:
+            backend_class = import_string(path)
+        else:
+            backend_class = DEFAULT_BACKENDS.get(
+                connection.vendor, InvertedIndexSearchBackend)
+        _backends[key] = backend_class()
+    return _backends[key]
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category
+from .search import get_search_backend
+from .cache import bump_catalogue_version
+
+
+@receiver(post_save, sender=Product)
+def index_on_save(sender, instance, **kwargs):
+    """
+    Keep the product search index in step with product edits
+    """
+    get_search_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_on_delete(sender, instance, **kwargs):
+    """
+    Remove deleted products from the search index
+    """
+    get_search_backend().remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalogue_on_change(sender, **kwargs):
+    """
+    Any product or category change (views, admin, shell)
+    moves cached product pages and category choices
+    to a new version
+    """
+    bump_catalogue_version()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import posixpath
+import re
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# a file named by the sha256 of its content, e.g. 'derivatives/3fa1...9c.webp'
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+
+# content-hashed files never change, so browsers and CDNs
+# can keep them for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# a file is renamed to this while sweep_unused_media checks it
+SWEEP_SUFFIX = '.sweep'
+
+
+def is_content_hashed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Media storage that names files by the sha256 of their content
+        - 'shirt.jpg' is saved as '<sha256>.jpg' in the same folder
+        - uploading the same file again reuses the stored copy
+        - a name always has the same content, so it can be
+          served with immutable cache headers
+    Files no product uses are deleted later, by sweep_unused_media
+    (the sweep_media command), never while an upload may reuse them
+    """
+
+    def hashed_name(self, name, content):
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        content.seek(0)
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, sha.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+
+        # same content already stored: nothing to write, but mark
+        # it as just used, so the sweep leaves it alone
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # renamed aside by the sweep: store it again
+                pass
+        return self._save(name, content)
+
+
+def referenced_media():
+    """
+    Names of every file a product uses, images and their derivatives
+    """
+    from .models import Product
+
+    names = set()
+    for image, derivatives in Product.objects.values_list(
+            'image', 'image_derivatives').iterator():
+        if image:
+            names.add(image)
+        names.update(size['name']
+                     for size in (derivatives or {}).get('sizes', []))
+    return names
+
+
+def sweep_unused_media(storage, grace_seconds, dry_run=False):
+    """
+    Delete content-hashed files in storage that no product uses
+        - files stored or reused in the last grace_seconds are
+          kept, their product may not be saved yet
+        - each file is renamed aside before its last check, so a
+          concurrent upload can't reuse it while it is deleted
+          (ContentHashStorage.save stores it again instead)
+    Returns the names deleted (or that would be, with dry_run)
+    """
+    used = referenced_media()
+    cutoff = time.time() - grace_seconds
+    deleted = []
+    for directory, _, files in os.walk(storage.location):
+        for file_name in files:
+            path = os.path.join(directory, file_name)
+            name = os.path.relpath(path, storage.location).replace(
+                os.sep, '/')
+            if not is_content_hashed(name) or name in used:
+                continue
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                if dry_run:
+                    deleted.append(name)
+                    continue
+                os.rename(path, path + SWEEP_SUFFIX)
+            except FileNotFoundError:
+                continue
+            # reused between the checks above and the rename
+            if os.stat(path + SWEEP_SUFFIX).st_mtime > cutoff:
+                os.replace(path + SWEEP_SUFFIX, path)
+                continue
+            os.remove(path + SWEEP_SUFFIX)
+            deleted.append(name)
+    return deleted
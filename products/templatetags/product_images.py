@@ -0,0 +1,57 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# register decorator registers functions as template tags
+register = template.Library()
+
+# image widths for the products grid and the product detail page
+LISTING_SIZES = ('(min-width: 1200px) 25vw, (min-width: 992px) 33vw, '
+                 '(min-width: 576px) 50vw, 100vw')
+DETAIL_SIZES = '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+
+def _current_derivatives(product):
+    # derivatives made from an older image are ignored
+    data = product.image_derivatives or {}
+    if not product.image or data.get('source') != product.image.name:
+        return {}
+    return data
+
+
+@register.simple_tag
+def srcset(product, fmt='jpeg'):
+    """
+    srcset value for a product image, e.g.
+    '/media/derivatives/x-160w.jpg 160w, /media/derivatives/x-320w.jpg 320w'
+    Empty if the image has no derivatives yet
+    """
+    return ', '.join(
+        f"{default_storage.url(size['name'])} {size['width']}w"
+        for size in _current_derivatives(product).get('sizes', [])
+        if size['format'] == fmt)
+
+
+@register.inclusion_tag('products/includes/product_image.html')
+def product_image(product, sizes=LISTING_SIZES, loading='lazy',
+                  css_class='card-img-top img-fluid'):
+    """
+    <picture> with WebP and JPEG srcsets, width and height
+        - falls back to the original image until derivatives exist
+        - falls back to noimage.png if there is no image
+    Use sizes='detail' loading='eager' on the product detail page
+    """
+    if sizes == 'detail':
+        sizes = DETAIL_SIZES
+    data = _current_derivatives(product)
+    return {
+        'product': product,
+        'css_class': css_class,
+        'sizes': sizes,
+        'loading': loading,
+        'webp_srcset': srcset(product, 'webp'),
+        'jpeg_srcset': srcset(product, 'jpeg'),
+        'width': data.get('width'),
+        'height': data.get('height'),
+        'MEDIA_URL': settings.MEDIA_URL,
+    }
@@ -1,3 +1,661 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cache import (
+    CATALOGUE_VERSION_KEY, bump_catalogue_version, get_catalogue_version,
+)
+from .forms import ProductForm
+from .images import build_derivatives, refresh_product_images
+from .importer import ProductImporter, iter_csv, iter_json_array
+from .models import Product, Category
+from .pagination import encode_cursor
+from .search import (
+    InvertedIndexSearchBackend, SQLiteFTSBackend, get_search_backend,
+)
+from .storage import IMMUTABLE_CACHE_CONTROL
+from .templatetags.product_images import srcset
+from .views import serve_media
+
+from PIL import Image
+
+
+def make_product(name, description='A product', **kwargs):
+    kwargs.setdefault('price', Decimal('10.00'))
+    return Product.objects.create(
+        name=name, description=description, **kwargs)
+
+
+class SearchBackendTests:
+    """
+    Shared checks run against every search backend
+    """
+    backend_class = None
+
+    def setUp(self):
+        self.backend = self.backend_class()
+        self.jeans = make_product(
+            'Bootcut Jeans', 'Comfortable denim in our original fit.')
+        self.shirt = make_product(
+            'Oxford Shirt', 'Pairs well with jeans or chinos.')
+        self.mug = make_product('Coffee Mug', 'Ceramic, dishwasher safe.')
+        self.backend.rebuild()
+
+    def search(self, query):
+        return list(self.backend.search(Product.objects.all(), query)
+                    .order_by('-search_rank', 'pk'))
+
+    def test_matches_name_and_description(self):
+        self.assertEqual(self.search('jeans'), [self.jeans, self.shirt])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('coff'), [self.mug])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('denim fit'), [self.jeans])
+        self.assertEqual(self.search('denim mug'), [])
+
+    def test_blank_query(self):
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.mug.name = 'Tea Cup'
+        self.mug.save()
+        self.backend.index_product(self.mug)
+        self.assertEqual(self.search('coffee'), [])
+        self.assertEqual(self.search('tea'), [self.mug])
+
+        mug_id = self.mug.pk
+        self.mug.delete()
+        self.backend.remove_product(mug_id)
+        self.assertEqual(self.search('tea'), [])
+
+
+class SQLiteFTSBackendTest(SearchBackendTests, TestCase):
+    backend_class = SQLiteFTSBackend
+
+
+class InvertedIndexSearchBackendTest(SearchBackendTests, TestCase):
+    backend_class = InvertedIndexSearchBackend
+
+
+class ProductSearchViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_results_are_ranked(self):
+        jeans = make_product('Bootcut Jeans')
+        shirt = make_product('Oxford Shirt', 'Goes with jeans.')
+
+        # signals keep the default backend's index up to date
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+        response = self.client.get(reverse('products'), {'q': 'jeans'})
+        self.assertEqual(list(response.context['products']), [jeans, shirt])
+
+    @override_settings(
+        PRODUCT_SEARCH_BACKEND='products.search.InvertedIndexSearchBackend')
+    def test_backend_setting(self):
+        self.assertIsInstance(
+            get_search_backend(), InvertedIndexSearchBackend)
+
+
+@override_settings(PRODUCTS_PER_PAGE=4)
+class KeysetPaginationTest(TestCase):
+    """
+    Walking the listing page by page gives every product once,
+    in order, for every sort key and direction
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name=name, friendly_name=name.title())
+            for name in ('jeans', 'shirts')
+        ]
+        for i in range(11):
+            make_product(
+                f'Product {i % 5} {chr(65 + i)}',
+                price=Decimal(10 + i % 3),
+                rating=None if i % 4 == 0 else Decimal(i % 5),
+                category=None if i % 5 == 0 else categories[i % 2],
+            )
+
+    def _expected(self, sort, direction):
+        # nulls last, then value, then pk - all in the sort direction
+        values = {
+            'price': lambda p: p.price,
+            'rating': lambda p: p.rating,
+            'name': lambda p: p.name.lower(),
+            'category': lambda p: p.category.name if p.category else None,
+        }[sort]
+        products = list(Product.objects.all())
+        with_value = [p for p in products if values(p) is not None]
+        without = [p for p in products if values(p) is None]
+        desc = direction == 'desc'
+        with_value.sort(key=lambda p: (values(p), p.pk), reverse=desc)
+        without.sort(key=lambda p: p.pk, reverse=desc)
+        return [p.pk for p in with_value + without]
+
+    def _walk(self, params):
+        url = reverse('products')
+        seen, pages = [], []
+        response = self.client.get(url, params)
+        while True:
+            page = [p.pk for p in response.context['products']]
+            pages.append(page)
+            seen.extend(page)
+            next_url = response.context['next_page_url']()
+            if not next_url:
+                return seen, pages, response
+            response = self.client.get(next_url)
+
+    def test_every_sort_walks_forwards_and_back(self):
+        for sort in ('price', 'rating', 'name', 'category'):
+            for direction in ('asc', 'desc'):
+                with self.subTest(sort=sort, direction=direction):
+                    params = {'sort': sort, 'direction': direction}
+                    seen, pages, last = self._walk(params)
+                    self.assertEqual(seen, self._expected(sort, direction))
+                    self.assertEqual(len(pages), 3)
+                    self.assertEqual(last.context['product_total'](), 11)
+
+                    # back from the last page
+                    back = []
+                    response = last
+                    while response.context['previous_page_url']():
+                        response = self.client.get(
+                            response.context['previous_page_url']())
+                        back.insert(0, [p.pk for p in response.context['products']])
+                    self.assertEqual(back, pages[:-1])
+
+    def test_nulls_sort_last(self):
+        seen, _, _ = self._walk({'sort': 'rating', 'direction': 'desc'})
+        ratings = [Product.objects.get(pk=pk).rating for pk in seen]
+        self.assertEqual(ratings[-3:], [None, None, None])
+
+    def test_bad_cursor_gives_first_page(self):
+        response = self.client.get(reverse('products'), {'after': 'nonsense'})
+        self.assertEqual(len(response.context['products']), 4)
+
+    def test_tampered_cursor_gives_first_page(self):
+        # valid json, but not values of the sort fields
+        for values in (['abc', 1], [{'a': 1}, 2], ['5.00'], [1, 2, 3],
+                       ['5.00', 'abc'], ['5.00', [1]]):
+            with self.subTest(values=values):
+                response = self.client.get(reverse('products'), {
+                    'sort': 'price', 'after': encode_cursor(values)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['products']), 4)
+                self.assertFalse(response.context['previous_page_url']())
+
+
+class CategoryQueryTest(TestCase):
+    """
+    Category data is joined or cached, never queried per product
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(
+            name='jeans', friendly_name='Jeans')
+        cls.superuser = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+
+    def _add_products(self, count):
+        for i in range(count):
+            make_product(f'Product {i}', category=self.category)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_listing_queries_are_constant(self):
+        self._add_products(2)
+        few = self._count_queries(reverse('products'))
+        self._add_products(20)
+        cache.clear()
+        many = self._count_queries(reverse('products'))
+        self.assertEqual(few, many)
+
+    def test_product_detail_joins_category(self):
+        product = make_product('Product', category=self.category)
+        url = reverse('product_detail', args=[product.id])
+        # session-less anonymous request: just the product
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        # then cached with the page, until the catalogue changes
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'Jeans')
+        self.category.friendly_name = 'Denim'
+        self.category.save()
+        self.assertContains(self.client.get(url), 'Denim')
+
+    def test_admin_changelist_queries_are_constant(self):
+        self.client.force_login(self.superuser)
+        url = reverse('admin:products_product_changelist')
+        self._add_products(2)
+        few = self._count_queries(url)
+        self._add_products(20)
+        many = self._count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_form_category_choices_are_cached(self):
+        ProductForm()
+        with self.assertNumQueries(0):
+            form = ProductForm()
+        self.assertEqual(
+            form.fields['category'].choices, [(self.category.id, 'Jeans')])
+
+        # saving a category refreshes the choices
+        shirts = Category.objects.create(name='shirts', friendly_name='Shirts')
+        form = ProductForm()
+        self.assertIn((shirts.id, 'Shirts'), form.fields['category'].choices)
+
+
+class ProductPageCacheTest(TestCase):
+    """
+    Product pages are served from cache until the catalogue changes
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.product = make_product('Bootcut Jeans')
+
+    def test_listing_is_cached_until_catalogue_changes(self):
+        url = reverse('products')
+        self.client.get(url)
+
+        # cached grid: no product or count queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any(
+            'products_product' in q['sql'] for q in queries))
+        self.assertContains(response, 'Bootcut Jeans')
+
+        self.product.name = 'Flared Jeans'
+        self.product.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Flared Jeans')
+        self.assertContains(response, '1 Products')
+
+        make_product('Oxford Shirt')
+        self.assertContains(self.client.get(url), '2 Products')
+
+    def test_category_change_invalidates(self):
+        version = get_catalogue_version()
+        Category.objects.create(name='jeans', friendly_name='Jeans')
+        self.assertGreater(get_catalogue_version(), version)
+
+    def test_version_is_a_cache_counter(self):
+        version = get_catalogue_version()
+        with self.assertNumQueries(0):
+            bump_catalogue_version()
+            self.assertEqual(get_catalogue_version(), version + 1)
+
+        # bumped again once the edit is visible to other workers
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_catalogue_version()
+        self.assertEqual(get_catalogue_version(), version + 3)
+
+    def test_evicted_version_restarts_higher(self):
+        url = reverse('products')
+        self.client.get(url)
+        version = get_catalogue_version()
+
+        cache.delete(CATALOGUE_VERSION_KEY)
+        # a second later on the clock
+        with mock.patch('products.cache.time.time',
+                        return_value=version / 1000 + 1):
+            self.assertGreater(get_catalogue_version(), version)
+        Product.objects.filter(pk=self.product.pk).update(name='Edited')
+        self.assertContains(self.client.get(url), 'Edited')
+
+    def test_unrelated_params_share_the_cached_grid(self):
+        url = reverse('products')
+        self.client.get(url, {'sort': 'price', 'utm_source': 'mail'})
+        Product.objects.filter(pk=self.product.pk).update(name='Stale')
+
+        response = self.client.get(url, {'sort': 'price', 'utm_source': 'x'})
+        self.assertContains(response, 'Bootcut Jeans')
+        self.assertEqual(
+            response.context['page_cache_key'],
+            self.client.get(url, {'sort': 'price'}).context['page_cache_key'])
+        # a different listing isn't served the cached grid
+        self.assertContains(
+            self.client.get(url, {'sort': 'price', 'direction': 'desc'}),
+            'Stale')
+
+    def test_bag_badge_stays_dynamic(self):
+        url = reverse('products')
+        self.client.get(url)
+
+        session = self.client.session
+        session['bag'] = {str(self.product.id): 1}
+        session.save()
+        self.assertContains(self.client.get(url), '$11.00')
+
+    def test_product_detail_is_cached(self):
+        url = reverse('product_detail', args=[self.product.id])
+        self.client.get(url)
+        Product.objects.filter(pk=self.product.pk).update(name='Stale')
+        self.assertContains(self.client.get(url), 'Bootcut Jeans')
+
+        # saving through the model bumps the version
+        self.product.name = 'Fresh'
+        self.product.save()
+        self.assertContains(self.client.get(url), 'Fresh')
+
+
+def make_image(size=(800, 400), fmt='PNG', mode='RGBA'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class ProductImageDerivativeTest(TestCase):
+    """
+    Product images get resized JPEG and WebP copies for srcset
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PRODUCT_IMAGE_WIDTHS=(160, 320, 640, 960))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sizes_up_to_original_width(self):
+        name = default_storage.save('shirt.png', BytesIO(make_image()))
+        data = build_derivatives(name)
+
+        self.assertEqual((data['width'], data['height']), (800, 400))
+        widths = sorted({size['width'] for size in data['sizes']})
+        # never upscaled past the original 800px
+        self.assertEqual(widths, [160, 320, 640, 800])
+        for size in data['sizes']:
+            with Image.open(default_storage.open(size['name'])) as image:
+                self.assertEqual(image.size, (size['width'], size['height']))
+                self.assertEqual(image.format, size['format'].upper())
+
+    def test_add_product_builds_derivatives(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.login(username='admin', password='pass')
+        response = self.client.post(reverse('add_product'), {
+            'name': 'Shirt', 'description': 'A shirt', 'price': '10.00',
+            'image': SimpleUploadedFile(
+                'shirt.jpg', make_image(fmt='JPEG', mode='RGB'),
+                content_type='image/jpeg'),
+        })
+        product = Product.objects.get()
+        self.assertRedirects(
+            response, reverse('product_detail', args=[product.id]),
+            fetch_redirect_response=False)
+        self.assertEqual(product.image_derivatives['source'],
+                         product.image.name)
+
+        response = self.client.get(reverse('products'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, srcset(product, 'webp'))
+        self.assertContains(response, 'width="800" height="400"')
+
+    def test_stale_derivatives_are_ignored(self):
+        name = default_storage.save('shirt.png', BytesIO(make_image()))
+        product = make_product(
+            'Shirt', image=name, image_derivatives=build_derivatives(name))
+        self.assertIn('160w', srcset(product))
+
+        product.image = 'other.png'
+        self.assertEqual(srcset(product), '')
+
+    def test_backfill_command(self):
+        name = default_storage.save('shirt.png', BytesIO(make_image()))
+        product = make_product('Shirt', image=name)
+        version = get_catalogue_version()
+
+        call_command('build_image_derivatives', workers=1, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.image_derivatives['source'], name)
+        self.assertNotEqual(get_catalogue_version(), version)
+
+
+class ContentHashStorageTest(TestCase):
+    """
+    Uploads are stored once per content, and swept
+    once no product uses them
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _upload(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('shirt.JPG', buffer.getvalue())
+
+    def _product(self, upload):
+        product = make_product('Shirt', image=upload)
+        refresh_product_images(product)
+        return product
+
+    def test_identical_uploads_share_one_file(self):
+        first = default_storage.save('shirt.jpg', self._upload())
+        second = default_storage.save('copy.jpg', self._upload())
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^[0-9a-f]{64}\.jpg$')
+        self.assertEqual(default_storage.listdir('')[1], [first])
+
+    def test_hashed_media_is_immutable(self):
+        name = default_storage.save('shirt.jpg', self._upload())
+        response = serve_media(
+            RequestFactory().get('/media/' + name), name,
+            document_root=self.media_root)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def _sweep(self, grace=0):
+        return call_command('sweep_media', grace=grace, stdout=StringIO())
+
+    def _age(self, name, seconds=7200):
+        then = time.time() - seconds
+        os.utime(default_storage.path(name), (then, then))
+
+    def test_replaced_image_is_swept(self):
+        product = self._product(self._upload('red'))
+        old_files = [product.image.name] + [
+            size['name'] for size in product.image_derivatives['sizes']]
+
+        product.image = self._upload('blue')
+        product.save()
+        refresh_product_images(product)
+        # nothing is deleted while saving
+        for name in old_files:
+            self.assertTrue(default_storage.exists(name))
+
+        self._sweep()
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(product.image.name))
+        for size in product.image_derivatives['sizes']:
+            self.assertTrue(default_storage.exists(size['name']))
+
+    def test_shared_image_kept_until_last_product_deleted(self):
+        first = self._product(self._upload())
+        second = self._product(self._upload())
+        self.assertEqual(first.image.name, second.image.name)
+
+        first.delete()
+        self._sweep()
+        self.assertTrue(default_storage.exists(second.image.name))
+
+        second.delete()
+        self._sweep()
+        self.assertFalse(default_storage.exists(second.image.name))
+
+    def test_reused_file_survives_sweep(self):
+        # an orphan, about to be reused by an upload whose
+        # product isn't saved yet
+        name = default_storage.save('shirt.jpg', self._upload())
+        self._age(name)
+        self.assertEqual(default_storage.save('copy.jpg', self._upload()), name)
+
+        self._sweep(grace=3600)
+        self.assertTrue(default_storage.exists(name))
+
+        self._age(name)
+        self._sweep(grace=3600)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_upload_during_sweep_is_stored_again(self):
+        name = default_storage.save('shirt.jpg', self._upload())
+        # renamed aside by the sweep after the exists() check
+        with mock.patch('products.storage.os.utime',
+                        side_effect=FileNotFoundError):
+            os.rename(default_storage.path(name),
+                      default_storage.path(name) + '.sweep')
+            with mock.patch.object(default_storage, 'exists',
+                                   return_value=True):
+                self.assertEqual(
+                    default_storage.save('copy.jpg', self._upload()), name)
+        self.assertTrue(os.path.exists(default_storage.path(name)))
+
+
+class ProductImportTest(TestCase):
+    """
+    Feeds are streamed in and upserted by sku in batches
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_json_array_is_read_in_blocks(self):
+        records = [{'sku': f'sku{i}', 'name': 'Caf\u00e9 [1], {x}'}
+                   for i in range(20)]
+        with mock.patch('products.importer.READ_SIZE', 7):
+            parsed = list(iter_json_array(StringIO(json.dumps(records))))
+        self.assertEqual(parsed, records)
+        self.assertEqual(list(iter_json_array(StringIO(' [ ] '))), [])
+
+    def test_fixture_import_is_idempotent(self):
+        call_command('loaddata', 'categories', verbosity=0)
+        out = StringIO()
+        call_command('import_products', 'products/fixtures/products.json',
+                     stdout=out)
+        total = Product.objects.count()
+        self.assertEqual(total, 172)
+        self.assertIn(f'{total} created', out.getvalue())
+
+        call_command('import_products', 'products/fixtures/products.json',
+                     stdout=out)
+        self.assertIn(f'0 created, 0 updated, {total} unchanged',
+                      out.getvalue())
+        # bulk writes skip signals, the index is rebuilt after
+        self.assertTrue(get_search_backend().search(
+            Product.objects.all(), 'bootcut').exists())
+
+    def test_csv_upsert(self):
+        make_product('Old name', sku='sku0', price=Decimal('5.00'))
+        rows = ['sku,name,price,category,has_sizes']
+        rows += [f'sku{i},Product {i},{i}.50,new_things,yes'
+                 for i in range(200)]
+        rows.append(',No sku,1.00,,')
+        importer = ProductImporter(batch_size=100)
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = importer.run(iter_csv(StringIO('\n'.join(rows))))
+        # per batch, not per row
+        self.assertLess(len(queries), 20)
+        self.assertEqual(counts, {'created': 199, 'updated': 1,
+                                  'unchanged': 0, 'skipped': 1})
+
+        product = Product.objects.select_related('category').get(sku='sku0')
+        self.assertEqual(product.name, 'Product 0')
+        self.assertEqual(product.price, Decimal('0.50'))
+        self.assertEqual(product.category.name, 'new_things')
+        self.assertTrue(product.has_sizes)
+
+
+    def test_rows_are_checked_against_the_model(self):
+        category = Category.objects.create(name='jeans')
+        rows = ['sku,name,price,category']
+        rows += [f'sku{i},Product {i},1.00,jeans' for i in range(3)]
+        rows += [
+            'big,Too dear,12345.00,jeans',
+            f"long,{'x' * 255},1.00,jeans",
+            f'byid,By id,1.00,{category.id}',
+            'noid,No id,1.00,999',
+        ]
+        importer = ProductImporter()
+        counts = importer.run(iter_csv(StringIO('\n'.join(rows))))
+
+        self.assertEqual(counts['created'], 4)
+        self.assertEqual(counts['skipped'], 3)
+        self.assertIn('price', importer.errors[0])
+        self.assertIn('name', importer.errors[1])
+        self.assertIn('999', importer.errors[2])
+        # a numeric category is an id, not a new category name
+        self.assertEqual(
+            Product.objects.get(sku='byid').category, category)
+        self.assertEqual(Category.objects.count(), 1)
+
+    def test_malformed_json_stops_the_read(self):
+        feed = StringIO('[{"sku": "a", ' + ' ' * 100)
+        stream = mock.Mock(wraps=feed)
+        with mock.patch('products.importer.READ_SIZE', 10), \
+                mock.patch('products.importer.MAX_RECORD_SIZE', 30):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(stream))
+        # gave up before reaching the end of the feed
+        self.assertLess(stream.read.call_count, 10)
+
+
+class ProductExportTest(TestCase):
+    """
+    The catalogue export streams rows that import_products reads back
+    """
+
+    def test_export_round_trips_through_import(self):
+        category = Category.objects.create(name='jeans', friendly_name='Jeans')
+        for i in range(5):
+            make_product(f'Product {i}', sku=f'sku{i}', category=category,
+                         rating=Decimal('4.50'), has_sizes=bool(i % 2))
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.login(username='admin', password='pass')
+
+        response = self.client.get(
+            reverse('product_export'), {'category': 'jeans'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+
+        counts = ProductImporter().run(iter_csv(StringIO(content)))
+        self.assertEqual(counts['unchanged'], 5)
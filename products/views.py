@@ -1,22 +1,67 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models.functions import Lower
-from django.db.models import Q
-# Q returns 'or' logic for queries
-# Allows search for name AND description
+from django.views.static import serve
 
 from .models import Product, Category
 from .forms import ProductForm
+from .search import get_search_backend
+from .pagination import KeysetPaginator, page_url
+from .cache import get_catalogue_version
+from .images import refresh_product_images
+from .exports import export_products
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_hashed
 
+# sort keys the products page accepts
+SORT_FIELDS = ('price', 'rating', 'lower_name', 'category__name')
 
-def all_products(request):
+
+# GET parameters that change the listing (besides the page cursor)
+LISTING_PARAMS = ('sort', 'direction', 'category', 'q')
+
+
+def _params_digest(params, keys):
+    # other parameters (tracking tags, cache busters) are ignored
+    return hashlib.md5(urlencode(sorted(
+        (key, value) for key, value in params.items() if key in keys
+    )).encode()).hexdigest()
+
+
+def _count_cache_key(request, catalogue_version):
     """
-        A view to show all products,
-        including sorting and search queries
+    Cache key for the product count of a filtered listing
+    Sorting and cursors don't change the count
     """
+    digest = _params_digest(request.GET, ('category', 'q'))
+    return f'products:count:{catalogue_version}:{digest}'
+
+
+def _page_cache_key(request, page):
+    """
+    What the cached product grid varies on: the listing
+    parameters and the page's cursor (None if it was invalid)
+    """
+    direction = 'before' if page.reverse else 'after'
+    return f'{_params_digest(request.GET, LISTING_PARAMS)}:' \
+           f'{direction}:{page.cursor}'
 
-    products = Product.objects.all()
+
+def product_listing(params):
+    """
+    Products queryset for the listing's GET parameters
+    (sort, direction, category, q), with everything the page shows
+    about them: (products, ordering, categories, sort, direction, query)
+    ordering is the (field, descending) pairs for the paginator
+    """
+
+    # category joined in, for the name/friendly name on each card
+    products = Product.objects.select_related('category')
 
     # set to default (none)
     query = None
@@ -24,54 +69,88 @@ def all_products(request):
     sort = None
     direction = None
 
-    if request.GET:
-        if 'sort' in request.GET:
-            sortkey = request.GET['sort']
-            sort = sortkey
-
-            # sortkey preserves original field 'name'
-            if sortkey == 'name':
-                # if user is sorting by name
-                sortkey = 'lower_name'
-                products = products.annotate(lower_name=Lower('name'))
-
-            if sortkey == 'category':
-                # if user is sorting by category
-                sortkey = 'category__name'
-
-            if 'direction' in request.GET:
-                # if user is sorting in decending
-                direction = request.GET['direction']
-
-                # decending = '-'
-                if direction == 'desc':
-                    sortkey = f'-{sortkey}'
-
-            # actually sort the product
-            products = products.order_by(sortkey)
-
-        if 'category' in request.GET:
-            categories = request.GET['category'].split(',')
-            products = products.filter(category__name__in=categories)
-            categories = Category.objects.filter(name__in=categories)
-
-        if 'q' in request.GET:
-            query = request.GET['q']
-            if not query:
-                messages.error(
-                    request, "You didn't enter any search criteria!")
-                return redirect(reverse('products'))
-
-            # 'or' logic for search query
-            # 'icontains' specific class contains query
-            queries = Q(name__icontains=query) | Q(description__icontains=query)
-            products = products.filter(queries)
+    # product id is the default order and the tie-breaker
+    ordering = []
+
+    if 'sort' in params:
+        sortkey = params['sort']
+        sort = sortkey
+
+        # sortkey preserves original field 'name'
+        if sortkey == 'name':
+            # if user is sorting by name
+            sortkey = 'lower_name'
+            products = products.annotate(lower_name=Lower('name'))
+
+        if sortkey == 'category':
+            # if user is sorting by category
+            sortkey = 'category__name'
+
+        if 'direction' in params:
+            # if user is sorting in decending
+            direction = params['direction']
+
+        # only known sort keys can be used for cursors
+        if sortkey in SORT_FIELDS:
+            ordering = [(sortkey, direction == 'desc')]
+
+    if 'category' in params:
+        categories = params['category'].split(',')
+        products = products.filter(category__name__in=categories)
+        categories = Category.objects.filter(name__in=categories)
+
+    if params.get('q'):
+        query = params['q']
+
+        # full-text search over name and description
+        # backend depends on the database (see products/search.py)
+        products = get_search_backend().search(products, query)
+
+        # best matches first, unless the user picked a sort
+        if not ordering:
+            ordering = [('search_rank', True)]
+
+    return products, ordering, categories, sort, direction, query
+
+
+def all_products(request):
+    """
+        A view to show all products,
+        including sorting and search queries
+        Results are paginated with keyset cursors
+    """
+
+    if 'q' in request.GET and not request.GET['q']:
+        messages.error(
+            request, "You didn't enter any search criteria!")
+        return redirect(reverse('products'))
+
+    products, ordering, categories, sort, direction, query = \
+        product_listing(request.GET)
+
+    # count is cached per filter, separate from the page query
+    catalogue_version = get_catalogue_version()
+    paginator = KeysetPaginator(
+        products, ordering, settings.PRODUCTS_PER_PAGE,
+        count_cache_key=_count_cache_key(request, catalogue_version))
+    page = paginator.page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
 
     # return current sorting method to template
     current_sorting = f'{sort}_{direction}'
 
+    # page, count and page links are only worked out if the template
+    # renders them - a cached product grid skips all product queries
     context = {
-        'products': products,
+        'products': page,
+        'product_total': lambda: paginator.count,
+        'next_page_url': lambda: page_url(
+            request, LISTING_PARAMS, after=page.next_cursor),
+        'previous_page_url': lambda: page_url(
+            request, LISTING_PARAMS, before=page.previous_cursor),
+        'catalogue_version': catalogue_version,
+        'page_cache_key': _page_cache_key(request, page),
+        'page_cache_timeout': settings.PRODUCTS_PAGE_CACHE_TIMEOUT,
         'search_term': query,
         'current_categories': categories,
         'current_sorting': current_sorting,
@@ -86,10 +165,20 @@ def product_detail(request, product_id):
         A view to show individual product details
     """
 
-    product = get_object_or_404(Product, pk=product_id)
+    catalogue_version = get_catalogue_version()
+    # the product (and its category) under the catalogue version,
+    # so a cached page needs no query and an edit is seen at once
+    key = f'products:detail:{catalogue_version}:{product_id}'
+    product = cache.get(key)
+    if product is None:
+        product = get_object_or_404(
+            Product.objects.select_related('category'), pk=product_id)
+        cache.set(key, product, settings.PRODUCTS_PAGE_CACHE_TIMEOUT)
 
     context = {
         'product': product,
+        'catalogue_version': catalogue_version,
+        'page_cache_timeout': settings.PRODUCTS_PAGE_CACHE_TIMEOUT,
     }
 
     return render(request, 'products/product_details.html', context)
@@ -112,6 +201,8 @@ def add_product(request):
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
             product = form.save()
+            # resized copies for srcset
+            refresh_product_images(product)
             messages.success(request, 'Successfully added product!')
             return redirect(reverse('product_detail', args=[product.id]))
         else:
@@ -147,6 +238,9 @@ def edit_product(request, product_id):
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
             form.save()
+            # new or cleared image: rebuild the resized copies
+            if 'image' in form.changed_data:
+                refresh_product_images(product)
             messages.success(request, 'Successfully updated product')
             return redirect(reverse('product_detail', args=[product.id]))
         else:
@@ -181,3 +275,33 @@ def delete_product(request, product_id):
     product.delete()
     messages.success(request, 'Product Deleted!')
     return redirect(reverse('products'))
+
+
+@login_required
+def product_export(request):
+    """
+    Stream the catalogue as CSV or JSONL (?format=jsonl)
+    Optionally for some categories (?category=jeans,shirts)
+    """
+    if not request.user.is_superuser:
+        messages.error(request, 'Sorry, only store owners can do that')
+        return redirect(reverse('home'))
+
+    products = Product.objects.all()
+    if 'category' in request.GET:
+        products = products.filter(
+            category__name__in=request.GET['category'].split(','))
+
+    fmt = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    return export_products(products, fmt)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve uploaded media (development server)
+    Content-hashed files get far-future immutable cache headers
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if is_content_hashed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
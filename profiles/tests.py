@@ -1,3 +1,89 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from checkout.models import Order
+from checkout.order_builder import create_order_lineitems
+from products.models import Product
+
+
+@override_settings(ORDER_HISTORY_PER_PAGE=5)
+class OrderHistoryQueryTest(TestCase):
+    """
+    Profile and order pages load in constant queries
+    however many orders and line items a customer has
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'customer', 'customer@example.com', 'password')
+        cls.profile = cls.user.userprofile
+        cls.products = [
+            Product.objects.create(
+                sku=f'sku{i}', name=f'Product {i}', description='A product',
+                price=Decimal('10.00'))
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _add_orders(self, count, lines=2):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(
+                user_profile=self.profile, full_name='Customer',
+                email='customer@example.com', phone_number='0123',
+                country='IE', town_or_city='Dublin',
+                street_address1='1 Main St')
+            bag = {str(p.id): {'items_by_size': {'m': 1}}
+                   for p in self.products[:lines]}
+            create_order_lineitems(order, bag)
+            orders.append(order)
+        return orders
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_profile_queries_are_constant(self):
+        self._add_orders(1, lines=1)
+        few, _ = self._count_queries(reverse('profile'))
+        self._add_orders(10, lines=10)
+        many, response = self._count_queries(reverse('profile'))
+        self.assertEqual(few, many)
+        self.assertContains(response, 'Size M Product 9 x1')
+
+    def test_profile_pages_by_date(self):
+        orders = self._add_orders(12)
+        seen = []
+        url = reverse('profile')
+        while url:
+            response = self.client.get(url)
+            seen.extend(o.pk for o in response.context['orders'])
+            url = response.context['next_page_url']
+        self.assertEqual(seen, [o.pk for o in reversed(orders)])
+
+    def test_order_history_queries_are_constant(self):
+        small = self._add_orders(1, lines=1)[0]
+        large = self._add_orders(1, lines=10)[0]
+        few, _ = self._count_queries(
+            reverse('order_history', args=[small.order_number]))
+        many, _ = self._count_queries(
+            reverse('order_history', args=[large.order_number]))
+        self.assertEqual(few, many)
+
+    def test_item_count_and_summary(self):
+        order = self._add_orders(1, lines=2)[0]
+        order.refresh_from_db()
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(
+            order.item_summary,
+            'Size M Product 0 x1\nSize M Product 1 x1')
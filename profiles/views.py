@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -6,6 +7,7 @@ from .models import UserProfile
 from .forms import UserProfileForm
 
 from checkout.models import Order
+from products.pagination import KeysetPaginator, page_url
 
 
 @login_required
@@ -28,12 +30,21 @@ def profile(request):
     else:
         form = UserProfileForm(instance=profile)
 
-    orders = profile.orders.all()
+    # newest orders first, a page at a time (keyset on date)
+    # each order's item summary is stored on the order,
+    # so no line items or products are loaded here
+    orders = Order.objects.history_for(profile)
+    paginator = KeysetPaginator(
+        orders, [('date', True)], settings.ORDER_HISTORY_PER_PAGE)
+    page = paginator.page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
 
     template = 'profiles/profile.html'
     context = {
         'form': form,
-        'orders': orders,
+        'orders': page,
+        'next_page_url': page_url(request, after=page.next_cursor),
+        'previous_page_url': page_url(request, before=page.previous_cursor),
         'on_profile_page': True,
     }
 
@@ -42,7 +53,9 @@ def profile(request):
 
 def order_history(request, order_number):
     # get past orders
-    order = get_object_or_404(Order, order_number=order_number)
+    # line items and products prefetched (constant queries)
+    order = get_object_or_404(
+        Order.objects.with_lineitems(), order_number=order_number)
 
     # informative message on previous orders
     messages.info(request, (
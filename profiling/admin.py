@@ -0,0 +1,75 @@
+import os
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfileRun
+
+
+class ProfileRunAdmin(admin.ModelAdmin):
+    """
+    Profiled requests, newest first, with the pstats
+    summary and the files to download
+    """
+    list_display = ('created', 'method', 'path', 'view', 'status_code',
+                    'wall_ms', 'sql_count', 'user')
+    list_filter = ('view',)
+    search_fields = ('path',)
+    fields = ('created', 'user', 'method', 'path', 'view', 'status_code',
+              'wall_ms', 'sql_count', 'sql_ms', 'samples', 'downloads',
+              'summary_display')
+    readonly_fields = fields
+
+    ordering = ('-created',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Files')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">{}</a> (pstats: snakeviz, python -m pstats)<br>'
+            '<a href="{}">{}</a> (collapsed stacks: flamegraph.pl, '
+            'speedscope)',
+            reverse('admin:profiling_download', args=[obj.pk, 'stats']),
+            obj.stats_file,
+            reverse('admin:profiling_download', args=[obj.pk, 'stacks']),
+            obj.stacks_file)
+
+    @admin.display(description='Summary')
+    def summary_display(self, obj):
+        return format_html('<pre>{}</pre>', obj.summary)
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/',
+                 self.admin_site.admin_view(self.download),
+                 name='profiling_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        """
+        Send a profile file, superusers only
+        """
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        run = get_object_or_404(ProfileRun, pk=pk)
+        names = {'stats': run.stats_file, 'stacks': run.stacks_file}
+        if kind not in names:
+            raise Http404
+        try:
+            f = open(os.path.join(settings.PROFILER_DIR, names[kind]), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(f, as_attachment=True, filename=names[kind])
+
+
+admin.site.register(ProfileRun, ProfileRunAdmin)
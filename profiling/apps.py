@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ProfilingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'profiling'
+
+    def ready(self):
+        """
+        Import signals module so deleted profiles
+        take their files with them
+        """
+        import profiling.signals
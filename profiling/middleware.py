@@ -0,0 +1,27 @@
+from .profiler import profile_view, wants_profile
+
+
+class ProfilerMiddleware:
+    """
+    Profile a single request on demand, for superusers only
+        - add ?_profile=1 to the URL, or send 'X-Profile: 1'
+        - the view runs under cProfile and a stack sampler
+        - the run is listed in the admin under Profile runs,
+          and its id is sent back in an X-Profile-Id header
+    Goes last in MIDDLEWARE, so the profile covers the view
+    (and its template rendering) rather than the middleware
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not wants_profile(request):
+            return None
+        response, run = profile_view(
+            request, view_func, view_args, view_kwargs)
+        response['X-Profile-Id'] = str(run.pk) if run else 'busy'
+        return response
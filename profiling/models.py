@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import models
+
+
+class ProfileRun(models.Model):
+    """
+    One profiled request: where its time went, with the
+    pstats and collapsed stack files saved in PROFILER_DIR
+    Only the newest PROFILER_MAX_RUNS are kept
+    """
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                             null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    view = models.CharField(max_length=200)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    wall_ms = models.FloatField()
+    sql_count = models.IntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    # stack samples taken, for the collapsed stack file
+    samples = models.IntegerField(default=0)
+    # file names within PROFILER_DIR
+    stats_file = models.CharField(max_length=255)
+    stacks_file = models.CharField(max_length=255)
+    # top functions by cumulative time, as printed by pstats
+    summary = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.wall_ms:.0f} ms)'
@@ -0,0 +1,170 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+from boutique_ado.metrics import current_timings
+from .models import ProfileRun
+
+# functions listed in each run's summary
+SUMMARY_LINES = 40
+
+# one profiled request at a time per process
+_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+class StackSampler:
+    """
+    Samples one thread's call stack every interval seconds
+    and counts identical stacks, for flamegraph.pl / speedscope
+    """
+
+    def __init__(self, thread_id, interval=0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                # collapsed stacks go root first
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """
+        'root;caller;callee count' lines
+        """
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in sorted(self.stacks.items()))
+
+
+def wants_profile(request):
+    """
+    Superusers ask for a profile with ?_profile=1
+    or an 'X-Profile: 1' header
+    """
+    flag = request.GET.get('_profile') or request.META.get('HTTP_X_PROFILE')
+    return (flag not in (None, '', '0')
+            and request.user.is_authenticated
+            and request.user.is_superuser)
+
+
+def profile_view(request, view_func, args, kwargs):
+    """
+    Call a view under cProfile and the stack sampler, then save
+    the run. Returns the response (or raises the view's error)
+    and the ProfileRun, which is None if another request was
+    being profiled
+    """
+    if not _lock.acquire(blocking=False):
+        return view_func(request, *args, **kwargs), None
+
+    try:
+        timings = current_timings()
+        sql_before = (timings.sql_count, timings.sql_seconds) \
+            if timings else (0, 0.0)
+        sampler = StackSampler(threading.get_ident(),
+                               settings.PROFILER_SAMPLE_INTERVAL)
+        profile = cProfile.Profile()
+
+        response = None
+        sampler.start()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            response = view_func(request, *args, **kwargs)
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - start
+            sampler.stop()
+            sql_count, sql_seconds = (
+                timings.sql_count - sql_before[0],
+                timings.sql_seconds - sql_before[1]) if timings else (0, 0.0)
+            run = save_run(
+                request, view_func, profile, sampler, wall,
+                response.status_code if response is not None else None,
+                sql_count, sql_seconds)
+        return response, run
+    finally:
+        _lock.release()
+
+
+def save_run(request, view_func, profile, sampler, wall, status_code,
+             sql_count=0, sql_seconds=0.0):
+    """
+    Write the profile files and record the run, then drop the
+    oldest runs past PROFILER_MAX_RUNS
+    """
+    directory = settings.PROFILER_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    stats_file = f'{name}.prof'
+    stacks_file = f'{name}.collapsed'
+
+    profile.dump_stats(os.path.join(directory, stats_file))
+    with open(os.path.join(directory, stacks_file), 'w') as f:
+        f.write(sampler.collapsed())
+
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats(
+        'cumulative').print_stats(SUMMARY_LINES)
+
+    run = ProfileRun.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        view=f'{view_func.__module__}.{view_func.__name__}',
+        status_code=status_code,
+        wall_ms=round(wall * 1000, 2),
+        sql_count=sql_count,
+        sql_ms=round(sql_seconds * 1000, 2),
+        samples=sampler.samples,
+        stats_file=stats_file,
+        stacks_file=stacks_file,
+        summary=summary.getvalue(),
+    )
+    trim_runs()
+    return run
+
+
+def trim_runs(max_runs=None):
+    """
+    Keep the newest max_runs profiles, the files of the
+    rest are removed by the post_delete signal
+    """
+    max_runs = settings.PROFILER_MAX_RUNS if max_runs is None else max_runs
+    stale = list(ProfileRun.objects.order_by('-created', '-pk').values_list(
+        'pk', flat=True)[max_runs:])
+    if stale:
+        ProfileRun.objects.filter(pk__in=stale).delete()
@@ -0,0 +1,25 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ProfileRun
+
+
+def _remove_files(names):
+    for name in names:
+        try:
+            os.remove(os.path.join(settings.PROFILER_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+@receiver(post_delete, sender=ProfileRun)
+def remove_profile_files(sender, instance, **kwargs):
+    """
+    Delete a profile's files once its row is gone for good
+    """
+    names = [instance.stats_file, instance.stacks_file]
+    transaction.on_commit(lambda: _remove_files(names))
@@ -0,0 +1,74 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Product
+from .models import ProfileRun
+from .profiler import trim_runs
+
+
+class ProfilerTest(TestCase):
+    """
+    Superusers can profile a request; runs are capped on disk
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(
+            PROFILER_DIR=self.directory, PROFILER_MAX_RUNS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        Product.objects.create(
+            sku='p1', name='Profiled shirt', description='x', price=5)
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def test_superuser_request_is_profiled(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('products'),
+                                   {'q': 'shirt', '_profile': '1'})
+
+        run = ProfileRun.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(run.pk))
+        self.assertEqual(run.view, 'products.views.all_products')
+        self.assertEqual(run.status_code, 200)
+        self.assertIn('all_products', run.summary)
+        # the pstats file loads, the collapsed file exists
+        stats = pstats.Stats(os.path.join(self.directory, run.stats_file))
+        self.assertTrue(stats.total_calls)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, run.stacks_file)))
+
+        response = self.client.get(reverse(
+            'admin:profiling_download', args=[run.pk, 'stats']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_header_and_non_superusers(self):
+        User.objects.create_user('shopper', password='password')
+        self.client.login(username='shopper', password='password')
+        response = self.client.get(reverse('products'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('products'), HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile-Id', response)
+        self.assertEqual(ProfileRun.objects.count(), 1)
+
+    def test_oldest_runs_and_files_are_dropped(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.client.get(reverse('products'), {'_profile': '1'})
+
+        self.assertEqual(ProfileRun.objects.count(), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trim_runs(max_runs=0)
+        self.assertEqual(os.listdir(self.directory), [])
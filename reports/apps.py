@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class ReportsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reports'
+
+    def ready(self):
+        """
+        Import signals module so order total updates
+        keep the sales rollups up to date
+        """
+        import reports.signals
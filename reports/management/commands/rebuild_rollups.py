@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reports.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the sales rollup tables from all orders, in chunks. '
+        'Pause order writes while it runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        verbose = options['verbosity'] > 1
+
+        def progress(done):
+            if verbose:
+                self.stdout.write(f'{done} orders')
+
+        orders = rebuild_rollups(options['chunk_size'], progress)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups from {orders} orders in {elapsed:.1f}s'))
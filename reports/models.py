@@ -0,0 +1,76 @@
+from django.db import models
+
+from products.models import Product, Category
+
+
+class DailyRevenue(models.Model):
+    """
+    Sales totals per day: the order's date in TIME_ZONE
+    (see reports.rollups.order_day), as the dashboard reads it
+    """
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(null=False, default=0)
+    units = models.IntegerField(null=False, default=0)
+    order_total = models.DecimalField(max_digits=14, decimal_places=2,
+                                      null=False, default=0)
+    delivery = models.DecimalField(max_digits=14, decimal_places=2,
+                                   null=False, default=0)
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2,
+                                      null=False, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily revenue'
+
+    def __str__(self):
+        return f'{self.date}: {self.grand_total}'
+
+
+class ProductSales(models.Model):
+    """
+    Units sold and revenue per product, all time
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE,
+                                   related_name='sales')
+    units = models.IntegerField(null=False, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2,
+                                  null=False, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Product sales'
+
+    def __str__(self):
+        return f'{self.product}: {self.units}'
+
+
+class CategorySales(models.Model):
+    """
+    Units sold and revenue per category, all time
+    (products without a category are only in the other rollups)
+    """
+    category = models.OneToOneField(Category, on_delete=models.CASCADE,
+                                    related_name='sales')
+    units = models.IntegerField(null=False, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2,
+                                  null=False, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Category sales'
+
+    def __str__(self):
+        return f'{self.category}: {self.units}'
+
+
+class OrderContribution(models.Model):
+    """
+    What one order currently adds to the rollups
+    When the order changes, only the difference from this
+    snapshot is applied, so no totals are ever re-aggregated
+    """
+    # not a foreign key: the snapshot must still be readable
+    # while its order is being deleted
+    order_id = models.BigIntegerField(primary_key=True)
+    date = models.DateField()
+    # {'units', 'order_total', 'delivery', 'grand_total',
+    #  'products': {id: [units, revenue]},
+    #  'categories': {id: [units, revenue]}}
+    snapshot = models.JSONField(default=dict)
@@ -0,0 +1,232 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, DecimalField, F, IntegerField, Sum, Value, When,
+)
+from django.utils import timezone
+
+from checkout.models import Order, OrderLineItem
+from .models import CategorySales, DailyRevenue, OrderContribution, ProductSales
+
+# rollup table -> key field
+TABLES = {
+    'daily': (DailyRevenue, 'date'),
+    'product': (ProductSales, 'product_id'),
+    'category': (CategorySales, 'category_id'),
+}
+
+
+def order_day(order_date):
+    """
+    The DailyRevenue date an order counts on: its date in the
+    site's TIME_ZONE, the same days the dashboard asks for
+    """
+    return timezone.localtime(order_date).date()
+
+
+def build_snapshot(order_total, delivery, grand_total, lines):
+    """
+    An order's contribution, in the OrderContribution.snapshot format
+    lines: (product_id, category_id, units, revenue) per product
+    """
+    products = {}
+    categories = {}
+    units = 0
+    for product_id, category_id, line_units, revenue in lines:
+        units += line_units
+        products[str(product_id)] = [line_units, str(revenue)]
+        if category_id is not None:
+            entry = categories.setdefault(str(category_id), [0, '0'])
+            entry[0] += line_units
+            entry[1] = str(Decimal(entry[1]) + revenue)
+    return {
+        'units': units,
+        'order_total': str(order_total),
+        'delivery': str(delivery),
+        'grand_total': str(grand_total),
+        'products': products,
+        'categories': categories,
+    }
+
+
+def _contributions(date, snapshot):
+    """
+    Snapshot -> {(table, key): {field: amount}}
+    """
+    if snapshot is None:
+        return {}
+    contributions = {
+        ('daily', date): {
+            'orders': 1,
+            'units': snapshot['units'],
+            'order_total': Decimal(snapshot['order_total']),
+            'delivery': Decimal(snapshot['delivery']),
+            'grand_total': Decimal(snapshot['grand_total']),
+        },
+    }
+    for key, (units, revenue) in snapshot['products'].items():
+        contributions[('product', int(key))] = {
+            'units': units, 'revenue': Decimal(revenue)}
+    for key, (units, revenue) in snapshot['categories'].items():
+        contributions[('category', int(key))] = {
+            'units': units, 'revenue': Decimal(revenue)}
+    return contributions
+
+
+def _delta(old, new):
+    """
+    new - old for every (table, key) and field, zeros left out
+    """
+    deltas = defaultdict(dict)
+    for key in set(old) | set(new):
+        before = old.get(key, {})
+        after = new.get(key, {})
+        for field in set(before) | set(after):
+            change = after.get(field, 0) - before.get(field, 0)
+            if change:
+                deltas[key][field] = change
+    return deltas
+
+
+def _increment(model, key_field, deltas):
+    """
+    Add deltas to a rollup table in a fixed number of queries
+        - one insert for missing rows (only where something is added:
+          rows are never created for products being deleted)
+        - one UPDATE ... SET x = x + CASE key WHEN ... for the rest
+    """
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(**{key_field: key}) for key, fields in deltas.items()
+         if any(value > 0 for value in fields.values())],
+        ignore_conflicts=True)
+
+    updates = {}
+    for field in {field for fields in deltas.values() for field in fields}:
+        if isinstance(model._meta.get_field(field), DecimalField):
+            output = DecimalField(max_digits=14, decimal_places=2)
+            zero = Decimal('0')
+        else:
+            output = IntegerField()
+            zero = 0
+        updates[field] = F(field) + Case(
+            *[When(**{key_field: key}, then=Value(fields[field]))
+              for key, fields in deltas.items() if field in fields],
+            default=Value(zero), output_field=output)
+    model.objects.filter(**{f'{key_field}__in': list(deltas)}).update(
+        **updates)
+
+
+def apply_deltas(deltas):
+    by_table = defaultdict(dict)
+    for (table, key), fields in deltas.items():
+        by_table[table][key] = fields
+    for table, table_deltas in by_table.items():
+        model, key_field = TABLES[table]
+        _increment(model, key_field, table_deltas)
+
+
+def order_lines(order):
+    return order.lineitems.values_list(
+        'product_id', 'product__category_id').annotate(
+        units=Sum('quantity'), revenue=Sum('lineitem_total')).order_by()
+
+
+def record_order(order):
+    """
+    Bring the rollups in line with an order's current totals
+    Called whenever Order.update_total runs; only the change
+    since the order's last snapshot is written
+    """
+    date = order_day(order.date)
+    snapshot = build_snapshot(
+        order.order_total, order.delivery_cost, order.grand_total,
+        order_lines(order))
+
+    with transaction.atomic():
+        previous = OrderContribution.objects.select_for_update().filter(
+            order_id=order.pk).first()
+        old = _contributions(previous.date, previous.snapshot) \
+            if previous else {}
+        apply_deltas(_delta(old, _contributions(date, snapshot)))
+        OrderContribution.objects.update_or_create(
+            order_id=order.pk,
+            defaults={'date': date, 'snapshot': snapshot})
+
+
+def remove_order(order_id):
+    """
+    Take a deleted order back out of the rollups
+    """
+    with transaction.atomic():
+        previous = OrderContribution.objects.select_for_update().filter(
+            order_id=order_id).first()
+        if previous is None:
+            return
+        apply_deltas(_delta(
+            _contributions(previous.date, previous.snapshot), {}))
+        previous.delete()
+
+
+def rebuild_rollups(chunk_size=1000, progress=None):
+    """
+    Recompute every rollup from the orders, chunk by chunk
+        - orders are read in primary key ranges, with one
+          aggregate query for each chunk's line items
+        - totals are collected in memory (one entry per day,
+          product and category), then written in bulk
+    Run with order writes paused: orders saved during the
+    rebuild may be missed or counted twice
+    """
+    with transaction.atomic():
+        for model in (OrderContribution, DailyRevenue,
+                      ProductSales, CategorySales):
+            model.objects.all().delete()
+
+    totals = {}
+    last_pk = 0
+    orders_done = 0
+    while True:
+        orders = list(Order.objects.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', 'date', 'order_total', 'delivery_cost',
+                              'grand_total')[:chunk_size])
+        if not orders:
+            break
+        first_pk, last_pk = orders[0][0], orders[-1][0]
+
+        lines = defaultdict(list)
+        for order_id, *line in OrderLineItem.objects.filter(
+                order_id__gte=first_pk, order_id__lte=last_pk).values_list(
+                'order_id', 'product_id', 'product__category_id').annotate(
+                units=Sum('quantity'),
+                revenue=Sum('lineitem_total')).order_by():
+            lines[order_id].append(line)
+
+        snapshots = []
+        for pk, date, order_total, delivery, grand_total in orders:
+            date = order_day(date)
+            snapshot = build_snapshot(
+                order_total, delivery, grand_total, lines[pk])
+            snapshots.append(OrderContribution(
+                order_id=pk, date=date, snapshot=snapshot))
+            for key, fields in _contributions(date, snapshot).items():
+                entry = totals.setdefault(key, defaultdict(int))
+                for field, value in fields.items():
+                    entry[field] += value
+        OrderContribution.objects.bulk_create(snapshots)
+
+        orders_done += len(orders)
+        if progress:
+            progress(orders_done)
+
+    with transaction.atomic():
+        for table, (model, key_field) in TABLES.items():
+            model.objects.bulk_create([
+                model(**{key_field: key}, **fields)
+                for (row_table, key), fields in totals.items()
+                if row_table == table
+            ], batch_size=1000)
+    return orders_done
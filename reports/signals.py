@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from checkout.models import Order, order_total_updated
+from .rollups import record_order, remove_order
+
+
+@receiver(order_total_updated, sender=Order)
+def update_rollups(sender, order, **kwargs):
+    """
+    Apply the change in an order's totals to the sales rollups
+    """
+    record_order(order)
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_rollups(sender, instance, **kwargs):
+    """
+    Deleted orders no longer count towards the rollups
+    """
+    remove_order(instance.pk)
@@ -0,0 +1,156 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from checkout.models import Order
+from checkout.order_builder import create_order_lineitems
+from products.models import Product, Category
+from .models import CategorySales, DailyRevenue, OrderContribution, ProductSales
+from .rollups import order_day, rebuild_rollups
+
+
+def make_order(bag):
+    order = Order.objects.create(
+        full_name='Test User', email='test@example.com',
+        phone_number='0123', country='IE', town_or_city='Dublin',
+        street_address1='1 Main St')
+    create_order_lineitems(order, bag)
+    return order
+
+
+class RollupTest(TestCase):
+    """
+    Rollups follow order changes without re-aggregating
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jeans = Category.objects.create(name='jeans', friendly_name='Jeans')
+        cls.product = Product.objects.create(
+            sku='sku1', name='Jeans', description='A product',
+            price=Decimal('10.00'), category=cls.jeans)
+        cls.other = Product.objects.create(
+            sku='sku2', name='Mug', description='A product',
+            price=Decimal('2.50'))
+
+    def rollups(self):
+        return {
+            'daily': list(DailyRevenue.objects.values_list(
+                'date', 'orders', 'units', 'order_total', 'delivery',
+                'grand_total').order_by('date')),
+            'products': sorted(ProductSales.objects.filter(
+                units__gt=0).values_list('product_id', 'units', 'revenue')),
+            'categories': sorted(CategorySales.objects.filter(
+                units__gt=0).values_list('category_id', 'units', 'revenue')),
+        }
+
+    def test_new_order_is_added(self):
+        make_order({str(self.product.id): 2, str(self.other.id): 1})
+        today = timezone.localdate()
+        # $22.50 is under the free delivery threshold: 10% delivery
+        self.assertEqual(self.rollups(), {
+            'daily': [(today, 1, 3, Decimal('22.50'), Decimal('2.25'),
+                       Decimal('24.75'))],
+            'products': [(self.product.id, 2, Decimal('20.00')),
+                         (self.other.id, 1, Decimal('2.50'))],
+            'categories': [(self.jeans.id, 2, Decimal('20.00'))],
+        })
+
+    def test_changes_apply_only_the_difference(self):
+        order = make_order({str(self.product.id): 2})
+        make_order({str(self.product.id): 1})
+
+        lineitem = order.lineitems.get()
+        lineitem.quantity = 5
+        lineitem.save()
+        self.assertEqual(ProductSales.objects.get().units, 6)
+        self.assertEqual(DailyRevenue.objects.get().orders, 2)
+
+        order.delete()
+        self.assertEqual(ProductSales.objects.get().units, 1)
+        self.assertEqual(DailyRevenue.objects.get().orders, 1)
+        self.assertEqual(OrderContribution.objects.count(), 1)
+
+    def test_update_queries_do_not_grow_with_lines(self):
+        products = [
+            Product.objects.create(
+                sku=f'bulk{i}', name=f'Product {i}', description='A product',
+                price=Decimal('1.00'), category=self.jeans)
+            for i in range(20)]
+        with CaptureQueriesContext(connection) as small:
+            make_order({str(products[0].id): 1})
+        with CaptureQueriesContext(connection) as large:
+            make_order({str(p.id): 1 for p in products})
+        self.assertEqual(len(small), len(large))
+
+    def test_rebuild_matches_incremental(self):
+        make_order({str(self.product.id): 2, str(self.other.id): 1})
+        order = make_order({str(self.other.id): 4})
+        order.lineitems.get().delete()
+        make_order({str(self.product.id): 1})
+        incremental = self.rollups()
+
+        self.assertEqual(rebuild_rollups(chunk_size=2), 3)
+        self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(OrderContribution.objects.count(), 3)
+
+
+    @override_settings(TIME_ZONE='Europe/Dublin')
+    def test_days_are_in_the_site_time_zone(self):
+        late = datetime.datetime(2026, 7, 1, 23, 30,
+                                 tzinfo=datetime.timezone.utc)
+        # 00:30 on the 2nd in Dublin (summer time)
+        self.assertEqual(order_day(late), datetime.date(2026, 7, 2))
+
+
+class DashboardTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            sku='sku1', name='Jeans', description='A product',
+            price=Decimal('10.00'))
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def setUp(self):
+        self.client.login(username='admin', password='pass')
+
+    def _get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_orders(self):
+        make_order({str(self.product.id): 1})
+        _, few = self._get()
+        for _ in range(10):
+            make_order({str(self.product.id): 1})
+        response, many = self._get()
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['period']['orders'], 11)
+        self.assertEqual(response.context['period']['grand_total'],
+                         Decimal('121.00'))
+
+    def test_superuser_only(self):
+        User.objects.create_user('shopper', password='pass')
+        self.client.login(username='shopper', password='pass')
+        response = self.client.get(reverse('sales_dashboard'))
+        self.assertRedirects(response, reverse('home'))
+
+    def test_link_shown_to_superusers_only(self):
+        dashboard = reverse('sales_dashboard')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, dashboard)
+
+        User.objects.create_user('shopper', password='pass')
+        self.client.login(username='shopper', password='pass')
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, dashboard)
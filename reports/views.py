@@ -0,0 +1,48 @@
+import datetime
+
+from django.shortcuts import render, redirect, reverse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+
+from .models import CategorySales, DailyRevenue, ProductSales
+
+
+@login_required
+def dashboard(request):
+    """
+    Sales dashboard for store owners
+    Reads only the rollup tables, so it costs the same
+    however many orders there are
+    """
+    if not request.user.is_superuser:
+        messages.error(request, 'Sorry, only store owners can do that')
+        return redirect(reverse('home'))
+
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+
+    daily = list(DailyRevenue.objects.filter(
+        date__gte=since).order_by('-date'))
+    # at most one row per day, summed here
+    period = {
+        field: sum(getattr(day, field) for day in daily)
+        for field in ('orders', 'units', 'order_total', 'delivery',
+                      'grand_total')
+    }
+
+    template = 'reports/dashboard.html'
+    context = {
+        'days': days,
+        'daily': daily,
+        'period': period,
+        'top_products': ProductSales.objects.select_related(
+            'product').filter(units__gt=0).order_by('-units', '-revenue')[:20],
+        'categories': CategorySales.objects.select_related(
+            'category').filter(units__gt=0).order_by('-revenue'),
+    }
+
+    return render(request, template, context)